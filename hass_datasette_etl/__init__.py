@@ -3,18 +3,24 @@ Dagster project for extracting data from Home Assistant Datasette endpoint.
 """
 
 from dagster import Definitions
-from .assets import statistics_assets, statistics_schedules, events_assets, events_schedules
+from .assets import statistics_assets, statistics_schedules, statistics_jobs, events_assets, events_schedules, events_jobs, states_assets, states_schedules, states_jobs
 from .resources import snowflake_resource
-from .io_managers import clickhouse_io_manager, snowflake_io_manager
+from .io_managers import clickhouse_io_manager, snowflake_io_manager, snowflake_stage_io_manager, warehouse_io_manager
+from .maintenance import maintenance_jobs, maintenance_schedules
+from .reconciliation import reconciliation_jobs, reconciliation_schedules, reconciliation_sensors
 from .hass_dbt.definitions import dbt_defs
 
 hass_defs = Definitions(
-    assets=statistics_assets+events_assets,
-    schedules=statistics_schedules+events_schedules,
+    assets=statistics_assets+events_assets+states_assets,
+    schedules=statistics_schedules+events_schedules+states_schedules+maintenance_schedules+reconciliation_schedules,
+    jobs=statistics_jobs+events_jobs+states_jobs+maintenance_jobs+reconciliation_jobs,
+    sensors=reconciliation_sensors,
     resources={
         "snowflake": snowflake_resource,
         "snowflake_io_manager": snowflake_io_manager,
+        "snowflake_stage_io_manager": snowflake_stage_io_manager,
         "clickhouse_io_manager": clickhouse_io_manager,
+        "warehouse_io_manager": warehouse_io_manager,
     },
 )
 
@@ -1,2 +1,3 @@
-from .statistics import statistics_assets, statistics_schedules
-from .events import events_assets, events_schedules
\ No newline at end of file
+from .statistics import statistics_assets, statistics_schedules, statistics_jobs
+from .events import events_assets, events_schedules, events_jobs
+from .states import states_assets, states_schedules, states_jobs
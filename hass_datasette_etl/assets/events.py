@@ -2,30 +2,31 @@
 State assets from Home Assistant Datasette
 """
 
-from .utils import fetch_datasette_data
+from .utils import build_partitions_def, fetch_datasette_data, fingerprint_partition, iter_parallel_chunks, probe_datasette_table, source_unchanged
+from .lookups import enrich_chunks
+from .landing import REPLAY_TAG, iter_landing, land_chunks, read_landing_fingerprint, replay_requested
+from ..profiling import profiled
+from ..streaming import ChunkStream
 from datetime import datetime
-from dagster import asset, AssetExecutionContext, DailyPartitionsDefinition, MetadataValue, ScheduleDefinition, define_asset_job, build_schedule_from_partitioned_job
+from dagster import asset, AssetExecutionContext, DataVersion, MetadataValue, Output, ScheduleDefinition, define_asset_job, build_schedule_from_partitioned_job
 
 
-# Define daily partitions starting from 2025-06-07
+# Define daily (or hourly, see HASS_PARTITION_GRAIN) partitions starting from 2025-06-07
 start_date = datetime(2025, 6, 7)
-daily_partitions = DailyPartitionsDefinition(
-    start_date=start_date,
-    timezone='America/Los_Angeles',
-    hour_offset=0,
-    minute_offset=15
-)
+partitions = build_partitions_def(start_date)
 
 
 @asset(
     name="events",
     group_name="hass",
     key_prefix="hass",
-    partitions_def=daily_partitions,
+    partitions_def=partitions,
     required_resource_keys={"clickhouse_io_manager"},
-    io_manager_key="clickhouse_io_manager",
+    io_manager_key="warehouse_io_manager",
     metadata={"schema": "raw", "table": "events", "partition_expr": "time_fired_ts"},
+    output_required=False,
 )
+@profiled
 def events(context: AssetExecutionContext):
     """
     Asset that extracts event data from Home Assistant Datasette endpoint
@@ -34,25 +35,60 @@ def events(context: AssetExecutionContext):
     partition_date = context.partition_key
     context.log.info(f"Extracting events data for {partition_date}")
 
-    # Fetch data from Datasette
-    df = fetch_datasette_data(
-        "events",
-        partition_date=partition_date,
-        partition_col="time_fired_ts",
-        context=context
-    )
-
-    # Log metadata about the extraction
+    # Fetch statistics are filled in while the IO manager consumes the stream
+    fetch_metadata = {}
+
+    if replay_requested(context):
+        # Reload from the local landing zone without touching Datasette
+        fingerprint = read_landing_fingerprint("events", partition_date)
+        chunks = iter_landing("events", partition_date, context=context)
+    else:
+        # Past days are immutable, skip them if the content fingerprint is unchanged
+        fingerprint = fingerprint_partition(
+            "events",
+            pk="event_id",
+            partition_col="time_fired_ts",
+            partition_date=partition_date,
+            context=context
+        )
+        if source_unchanged(context, fingerprint):
+            return
+
+        # Stream chunks of parallel sub-range fetches, keeping a local copy for replays
+        chunks = land_chunks(
+            iter_parallel_chunks(
+                "events",
+                partition_date=partition_date,
+                partition_col="time_fired_ts",
+                metadata=fetch_metadata,
+                context=context
+            ),
+            "events",
+            partition_date,
+            fingerprint=fingerprint,
+            context=context
+        )
+
+    # Denormalize dimension columns into the rows while they stream, if enabled
+    chunks = enrich_chunks(chunks, "events", metadata=fetch_metadata, context=context)
+
+    # Log metadata about the extraction, row counts and preview are added by the IO manager
     context.add_output_metadata(
         metadata={
-            "num_rows": len(df),
-            "preview": MetadataValue.md(df.head().to_markdown() if not df.empty else "No data"),
             "partition_date": partition_date,
             "destination": "raw.events in Clickhouse",
+            **fingerprint,
         }
     )
 
-    return df
+    # Failed writes are retried from the landed copy, enriched again like the fetched chunks
+    def replay():
+        return enrich_chunks(iter_landing("events", partition_date), "events", context=context)
+
+    yield Output(
+        ChunkStream(chunks, metadata=fetch_metadata, replay=replay),
+        data_version=DataVersion(fingerprint["data_version"]) if fingerprint else None
+    )
 
 
 @asset(
@@ -60,18 +96,28 @@ def events(context: AssetExecutionContext):
     group_name="hass",
     key_prefix="hass",
     required_resource_keys={"clickhouse_io_manager"},
-    io_manager_key="clickhouse_io_manager",
+    io_manager_key="warehouse_io_manager",
     metadata={"schema": "raw", "table": "event_data"},
+    output_required=False,
 )
+@profiled
 def event_data(context: AssetExecutionContext):
     """
     Asset that extracts event data from Home Assistant Datasette endpoint
-    and writes it to Clickhouse.
+    and writes it to Clickhouse. Skipped when the row count / max id probe
+    matches the last materialization.
     """
+    probe = probe_datasette_table("event_data", "data_id", context=context)
+    if source_unchanged(context, probe):
+        return
+
+    # Page statistics of the fetch, added to the output metadata
+    fetch_metadata = {}
 
     # Fetch data from Datasette
     df = fetch_datasette_data(
         "event_data",
+        metadata=fetch_metadata,
         context=context
     )
 
@@ -81,10 +127,12 @@ def event_data(context: AssetExecutionContext):
             "num_rows": len(df),
             "preview": MetadataValue.md(df.head().to_markdown() if not df.empty else "No data"),
             "destination": "raw.event_data in Clickhouse",
+            **probe,
+            **fetch_metadata,
         }
     )
 
-    return df
+    yield Output(df)
 
 
 @asset(
@@ -92,18 +140,28 @@ def event_data(context: AssetExecutionContext):
     group_name="hass",
     key_prefix="hass",
     required_resource_keys={"clickhouse_io_manager"},
-    io_manager_key="clickhouse_io_manager",
+    io_manager_key="warehouse_io_manager",
     metadata={"schema": "raw", "table": "event_types"},
+    output_required=False,
 )
+@profiled
 def event_types(context: AssetExecutionContext):
     """
     Asset that extracts event types from Home Assistant Datasette endpoint
-    and writes it to Clickhouse.
+    and writes it to Clickhouse. Skipped when the row count / max id probe
+    matches the last materialization.
     """
+    probe = probe_datasette_table("event_types", "event_type_id", context=context)
+    if source_unchanged(context, probe):
+        return
+
+    # Page statistics of the fetch, added to the output metadata
+    fetch_metadata = {}
 
     # Fetch data from Datasette
     df = fetch_datasette_data(
         "event_types",
+        metadata=fetch_metadata,
         context=context
     )
 
@@ -113,10 +171,12 @@ def event_types(context: AssetExecutionContext):
             "num_rows": len(df),
             "preview": MetadataValue.md(df.head().to_markdown() if not df.empty else "No data"),
             "destination": "raw.event_types in Clickhouse",
+            **probe,
+            **fetch_metadata,
         }
     )
 
-    return df
+    yield Output(df)
 
 
 ##### events asset job and schedule
@@ -131,6 +191,14 @@ events_schedule = build_schedule_from_partitioned_job(
     description="Daily schedule for events asset"
 )
 
+##### events replay job, backfill it to reload partitions from the landing zone
+events_replay_job = define_asset_job(
+    name="events_replay_job",
+    selection=[events],
+    tags={REPLAY_TAG: "true"},
+    description="Reloads events partitions into Clickhouse from the local landing zone"
+)
+
 ##### event_data asset job and schedule
 event_data_job = define_asset_job(
     name="event_data_job",
@@ -162,3 +230,4 @@ event_types_schedule = ScheduleDefinition(
 # Group assets and schedules for export
 events_assets = [events, event_data, event_types]
 events_schedules = [events_schedule, event_data_schedule, event_types_schedule]
+events_jobs = [events_replay_job]
@@ -0,0 +1,160 @@
+"""
+Local Parquet landing zone for fetched partitions.
+
+Every partition fetched from Datasette is also written, chunk by chunk, to
+`<LANDING_ZONE_DIR>/<table>/date=<partition>/` as a zstd compressed Parquet
+file, next to the fingerprint it was fetched with. Runs tagged
+`hass/replay=true` reload ClickHouse from there without touching Datasette.
+"""
+
+import os
+import json
+import shutil
+import time
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pathlib import Path
+from typing import Iterable, Iterator
+from dagster import AssetExecutionContext, Failure
+
+# Landing zone lives on the Dagster volume by default
+LANDING_ZONE_DIR = Path(
+    os.environ.get("LANDING_ZONE_DIR", Path(os.environ.get("DAGSTER_HOME", "/app/dagster_home")) / "landing")
+)
+
+# Partitions landed longer ago than this are removed, 0 keeps everything
+LANDING_RETENTION_DAYS = int(os.environ.get("LANDING_RETENTION_DAYS", "90"))
+
+# Run tag that reloads partitions from the landing zone instead of Datasette
+REPLAY_TAG = "hass/replay"
+
+DATA_FILE = "part-0.parquet"
+FINGERPRINT_FILE = "_fingerprint.json"
+
+
+def landing_path(table_name: str, partition_date: str) -> Path:
+    """
+    Directory holding one landed partition.
+    """
+    return LANDING_ZONE_DIR / table_name / f"date={partition_date}"
+
+
+def replay_requested(context: AssetExecutionContext) -> bool:
+    """
+    Whether the current run should read from the landing zone.
+    """
+    return context.run.tags.get(REPLAY_TAG) == "true"
+
+
+def land_chunks(chunks: Iterable[pd.DataFrame], table_name: str, partition_date: str, fingerprint: dict | None = None, context=None) -> Iterator[pd.DataFrame]:
+    """
+    Pass chunks through while appending them to the partition's Parquet file.
+
+    The file only replaces a previous copy once the stream is exhausted, so an
+    interrupted fetch never leaves a partial partition behind.
+
+    Args:
+        chunks: Normalized chunks, as written to ClickHouse
+        table_name: Name of the source table
+        partition_date: Partition the data belongs to
+        fingerprint: Optional fingerprint the partition was fetched with
+        context: Optional AssetExecutionContext for logging
+
+    Yields:
+        The input chunks, unchanged
+    """
+    path = landing_path(table_name, partition_date)
+    path.mkdir(parents=True, exist_ok=True)
+    tmp_file = path / f".{DATA_FILE}.tmp"
+
+    writer = None
+    rows = 0
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_file, table.schema, compression="zstd")
+            writer.write_table(table)
+            rows += len(chunk)
+            yield chunk
+    except BaseException:
+        if writer is not None:
+            writer.close()
+        tmp_file.unlink(missing_ok=True)
+        raise
+
+    if writer is None:
+        # Empty partition, land an empty file so replays reproduce it
+        pd.DataFrame().to_parquet(tmp_file, compression="zstd", index=False)
+    else:
+        writer.close()
+    os.replace(tmp_file, path / DATA_FILE)
+    (path / FINGERPRINT_FILE).write_text(json.dumps(fingerprint or {}))
+
+    if context:
+        context.log.info(f"Landed {rows} rows of {table_name} {partition_date} in {path}")
+
+    prune_landing(table_name, context=context)
+
+
+def read_landing_fingerprint(table_name: str, partition_date: str) -> dict:
+    """
+    Fingerprint a landed partition was fetched with, raising if it was never landed.
+    """
+    path = landing_path(table_name, partition_date)
+    if not (path / DATA_FILE).exists():
+        raise Failure(
+            description=f"No landed data for {table_name} {partition_date} in {path}, run it without {REPLAY_TAG} first"
+        )
+
+    fingerprint_file = path / FINGERPRINT_FILE
+    return json.loads(fingerprint_file.read_text()) if fingerprint_file.exists() else {}
+
+
+def iter_landing(table_name: str, partition_date: str, chunk_size: int = 50000, context=None) -> Iterator[pd.DataFrame]:
+    """
+    Read a landed partition back in chunks.
+
+    Args:
+        table_name: Name of the source table
+        partition_date: Partition to read
+        chunk_size: Number of rows per yielded chunk
+        context: Optional AssetExecutionContext for logging
+
+    Yields:
+        DataFrames of at most `chunk_size` rows
+    """
+    path = landing_path(table_name, partition_date) / DATA_FILE
+    if context:
+        context.log.info(f"Replaying {table_name} {partition_date} from {path}")
+
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+        yield batch.to_pandas()
+
+
+def prune_landing(table_name: str, retention_days: int = LANDING_RETENTION_DAYS, context=None) -> int:
+    """
+    Remove partitions of a table that were landed more than `retention_days` ago.
+
+    Age is measured from when the partition was landed, not the partition date,
+    so freshly backfilled history is kept for the full retention period.
+
+    Returns:
+        Number of partitions removed
+    """
+    table_path = LANDING_ZONE_DIR / table_name
+    if retention_days <= 0 or not table_path.exists():
+        return 0
+
+    cutoff = time.time() - retention_days * 86400
+    removed = 0
+    for path in table_path.glob("date=*"):
+        data_file = path / DATA_FILE
+        if data_file.exists() and data_file.stat().st_mtime < cutoff:
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+
+    if context and removed:
+        context.log.info(f"Pruned {removed} landed partitions of {table_name} older than {retention_days} days")
+    return removed
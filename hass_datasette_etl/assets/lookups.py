@@ -0,0 +1,209 @@
+"""
+Ingestion-time denormalization of fact rows.
+
+With HASS_ENRICH_FACTS=true, `statistics` rows are written with `entity_id`
+and `uom`, and `events` rows with `event_type`, looked up while the chunks
+stream to ClickHouse. The marts use these columns and only fall back to the
+dimension dictionaries for rows loaded before enrichment was turned on.
+
+Lookups go through an LRU cache per dimension. The cache is loaded once per
+run from the deduplicated raw tables in ClickHouse. Ids it doesn't know yet,
+e.g. a sensor added since the dimension assets last ran, are fetched from
+Datasette in batches.
+"""
+
+import os
+from collections import OrderedDict
+from typing import Iterable, Iterator
+
+import pandas as pd
+
+from .utils import query_datasette
+from ..io_managers import get_clickhouse_client, get_clickhouse_config
+
+# Enrich fact rows at extraction time
+HASS_ENRICH_FACTS = os.environ.get("HASS_ENRICH_FACTS", "false").lower() == "true"
+
+# Entries kept per dimension, the least recently used ones are evicted first
+DIMENSION_CACHE_SIZE = int(os.environ.get("DIMENSION_CACHE_SIZE", "100000"))
+
+# Ids per Datasette query when looking up cache misses
+DATASETTE_LOOKUP_BATCH = 500
+
+# Dimension tables: primary key and the columns cached
+DIMENSIONS = {
+    "statistics_meta": {"pk": "id", "columns": ["statistic_id", "unit_of_measurement"]},
+    "event_types": {"pk": "event_type_id", "columns": ["event_type"]},
+}
+
+# Fact tables: foreign key column, dimension and fact column -> dimension column
+ENRICHMENTS = {
+    "statistics": {
+        "column": "metadata_id",
+        "dimension": "statistics_meta",
+        "fields": {"entity_id": "statistic_id", "uom": "unit_of_measurement"},
+    },
+    "events": {
+        "column": "event_type_id",
+        "dimension": "event_types",
+        "fields": {"event_type": "event_type"},
+    },
+}
+
+
+class DimensionCache:
+    """
+    LRU cache of one dimension table, id -> dict of the cached columns.
+
+    Ids that are unknown to Datasette as well are cached as None, so a
+    dangling foreign key is only looked up once.
+
+    Args:
+        dimension: Dimension table name, a key of DIMENSIONS
+        max_size: Maximum number of cached ids
+    """
+
+    def __init__(self, dimension: str, max_size: int = DIMENSION_CACHE_SIZE):
+        self.dimension = dimension
+        self.pk = DIMENSIONS[dimension]["pk"]
+        self.columns = DIMENSIONS[dimension]["columns"]
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self.stats = {"loaded": 0, "hits": 0, "misses": 0, "datasette_queries": 0, "evictions": 0}
+
+    def _put(self, key: int, value: dict | None) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def load(self, context=None) -> None:
+        """
+        Fill the cache from the raw table in ClickHouse, newest ids first.
+        """
+        client = get_clickhouse_client(get_clickhouse_config())
+        try:
+            rows = client.execute(
+                f"""
+                select toUInt64OrZero({self.pk}) as key, {', '.join(self.columns)}
+                from raw.{self.dimension} final
+                order by key desc
+                limit {self.max_size}
+                """
+            )
+        except Exception as e:
+            if context:
+                context.log.warning(f"Could not load {self.dimension} from ClickHouse, using Datasette only: {e}")
+            return
+        finally:
+            client.disconnect()
+
+        # Oldest first, so the newest ids are the most recently used
+        for row in reversed(rows):
+            self._put(int(row[0]), dict(zip(self.columns, row[1:])))
+        self.stats["loaded"] = len(rows)
+        if context:
+            context.log.info(f"Loaded {len(rows)} {self.dimension} rows from ClickHouse into the lookup cache")
+
+    def lookup(self, ids: Iterable[int], context=None) -> dict[int, dict | None]:
+        """
+        Cached columns of each id, fetching the misses from Datasette.
+        """
+        found, missing = {}, []
+        for key in set(ids):
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                found[key] = self._entries[key]
+                self.stats["hits"] += 1
+            else:
+                missing.append(key)
+                self.stats["misses"] += 1
+
+        for i in range(0, len(missing), DATASETTE_LOOKUP_BATCH):
+            batch = missing[i:i + DATASETTE_LOOKUP_BATCH]
+            df = query_datasette(
+                f"select {self.pk}, {', '.join(self.columns)} from {self.dimension} "
+                f"where {self.pk} in ({', '.join(str(key) for key in batch)})",
+                context=context,
+            )
+            self.stats["datasette_queries"] += 1
+            rows = {
+                int(row[self.pk]): {column: "" if pd.isna(row[column]) else str(row[column]) for column in self.columns}
+                for row in df.to_dict("records")
+            }
+            for key in batch:
+                self._put(key, rows.get(key))
+                found[key] = rows.get(key)
+        return found
+
+
+# Caches of the current run, rebuilt when a process executes another run
+_caches: dict[str, DimensionCache] = {}
+_caches_run_id = None
+
+
+def get_dimension_cache(dimension: str, context) -> DimensionCache:
+    """
+    The run's cache of a dimension, loaded from ClickHouse on first use.
+    """
+    global _caches_run_id
+    if _caches_run_id != context.run_id:
+        _caches.clear()
+        _caches_run_id = context.run_id
+    if dimension not in _caches:
+        cache = DimensionCache(dimension)
+        cache.load(context)
+        _caches[dimension] = cache
+    return _caches[dimension]
+
+
+def label_ids(values: pd.Series) -> pd.Series:
+    """
+    Numeric ids of a normalized foreign key column, `{"value": 12, "label": ...}` or a plain `12`.
+    """
+    extracted = values.str.extract(r'^\{"value":\s*(\d+)', expand=False).fillna(values)
+    return pd.to_numeric(extracted, errors="coerce")
+
+
+def enrich_chunk(chunk: pd.DataFrame, table_name: str, cache: DimensionCache, context=None) -> pd.DataFrame:
+    """
+    Add (or fill where empty) the denormalized columns of one chunk.
+    """
+    spec = ENRICHMENTS[table_name]
+    ids = label_ids(chunk[spec["column"]])
+    entries = cache.lookup((int(key) for key in ids.dropna().unique()), context=context)
+
+    for field, column in spec["fields"].items():
+        values = ids.map({key: (entry or {}).get(column, "") for key, entry in entries.items()}).fillna("")
+        if field in chunk.columns:
+            chunk[field] = chunk[field].where(chunk[field] != "", values)
+        else:
+            chunk[field] = values
+    return chunk
+
+
+def enrich_chunks(chunks: Iterable[pd.DataFrame], table_name: str, metadata: dict | None = None, context=None) -> Iterator[pd.DataFrame]:
+    """
+    Enrich a stream of chunks, unchanged unless HASS_ENRICH_FACTS is set.
+
+    Args:
+        chunks: Normalized chunks of a fact table in ENRICHMENTS
+        table_name: Fact table name
+        metadata: Optional dict receiving the cache statistics once exhausted
+        context: AssetExecutionContext, the cache lives for its run
+    """
+    if not HASS_ENRICH_FACTS:
+        yield from chunks
+        return
+
+    cache = get_dimension_cache(ENRICHMENTS[table_name]["dimension"], context)
+    before = dict(cache.stats)
+    for chunk in chunks:
+        yield enrich_chunk(chunk, table_name, cache, context=context)
+
+    if metadata is not None:
+        metadata.update({
+            f"lookup/{key}": value - before[key] if key != "loaded" else value
+            for key, value in cache.stats.items()
+        })
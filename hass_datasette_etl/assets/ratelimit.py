@@ -0,0 +1,137 @@
+"""
+Shared, adaptive rate limit for requests to Datasette.
+
+Every Dagster run process goes through the same token bucket, stored as a small
+JSON file on the Dagster volume and guarded by a file lock, so concurrent runs
+and backfills share one budget against the single Datasette instance (and the
+Home Assistant recorder database behind it).
+
+The refill rate adapts like TCP congestion control (AIMD): it grows by a small
+step while responses stay under the target latency, is cut when latency goes
+above it, and is halved on 429/5xx responses, which also pause every process
+for the server's `Retry-After`. Throughput therefore settles just below the
+point where Datasette starts slowing down.
+"""
+
+import os
+import json
+import time
+from pathlib import Path
+from filelock import FileLock
+
+# Bucket state shared by all run processes of this Dagster instance
+RATE_LIMIT_FILE = Path(
+    os.environ.get(
+        "DATASETTE_RATE_LIMIT_FILE",
+        Path(os.environ.get("DAGSTER_HOME", "/app/dagster_home")) / "datasette_ratelimit.json",
+    )
+)
+
+# Requests per second bounds, and the latency the rate is tuned towards
+DATASETTE_MIN_RPS = float(os.environ.get("DATASETTE_MIN_RPS", "0.2"))
+DATASETTE_MAX_RPS = float(os.environ.get("DATASETTE_MAX_RPS", "5"))
+DATASETTE_TARGET_LATENCY = float(os.environ.get("DATASETTE_TARGET_LATENCY", "1.5"))
+
+# Status codes meaning the server is overloaded
+BACKOFF_STATUSES = {429, 500, 502, 503, 504}
+
+
+class DatasetteRateLimiter:
+    """
+    File-backed token bucket with an adaptive refill rate.
+
+    Args:
+        path: JSON file holding the shared bucket state
+        min_rate: Lowest refill rate, in requests per second
+        max_rate: Highest refill rate, in requests per second
+        target_latency: Response time in seconds above which the rate is reduced
+        burst: Maximum number of tokens the bucket can hold
+        increase: Requests per second added after each fast response
+        decrease: Factor applied to the rate after a slow response
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        min_rate: float = DATASETTE_MIN_RPS,
+        max_rate: float = DATASETTE_MAX_RPS,
+        target_latency: float = DATASETTE_TARGET_LATENCY,
+        burst: float = 2.0,
+        increase: float = 0.1,
+        decrease: float = 0.8,
+    ):
+        self.path = Path(path)
+        self.lock = FileLock(f"{self.path}.lock")
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.target_latency = target_latency
+        self.burst = burst
+        self.increase = increase
+        self.decrease = decrease
+
+    def _read(self, now: float) -> dict:
+        try:
+            state = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            state = {}
+        rate = min(max(float(state.get("rate", self.max_rate / 2)), self.min_rate), self.max_rate)
+        updated = float(state.get("updated", now))
+        tokens = min(self.burst, float(state.get("tokens", self.burst)) + max(0.0, now - updated) * rate)
+        return {"rate": rate, "tokens": tokens, "updated": now, "paused_until": float(state.get("paused_until", 0))}
+
+    def _write(self, state: dict) -> None:
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(state))
+        os.replace(tmp_path, self.path)
+
+    def acquire(self) -> float:
+        """
+        Block until a request may be sent.
+
+        Returns:
+            Seconds spent waiting
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        start = time.monotonic()
+        while True:
+            with self.lock:
+                now = time.time()
+                state = self._read(now)
+                if now >= state["paused_until"] and state["tokens"] >= 1:
+                    state["tokens"] -= 1
+                    self._write(state)
+                    return time.monotonic() - start
+                self._write(state)
+                wait = max(state["paused_until"] - now, (1 - state["tokens"]) / state["rate"])
+            # Sleep outside the lock so other processes can take their turn
+            time.sleep(min(max(wait, 0.01), 5.0))
+
+    def record(self, latency: float, status: int | None = None, retry_after: float | None = None) -> float:
+        """
+        Adapt the shared rate to the outcome of one request.
+
+        Args:
+            latency: Response time in seconds
+            status: HTTP status code, None if the request failed without one
+            retry_after: Seconds the server asked clients to wait, if any
+
+        Returns:
+            The new rate in requests per second
+        """
+        with self.lock:
+            now = time.time()
+            state = self._read(now)
+            if status is None or status in BACKOFF_STATUSES:
+                state["rate"] = max(self.min_rate, state["rate"] / 2)
+                state["tokens"] = min(state["tokens"], 0.0)
+                pause = retry_after if retry_after is not None else 1 / state["rate"]
+                state["paused_until"] = max(state["paused_until"], now + pause)
+            elif latency > self.target_latency:
+                state["rate"] = max(self.min_rate, state["rate"] * self.decrease)
+            else:
+                state["rate"] = min(self.max_rate, state["rate"] + self.increase)
+            self._write(state)
+            return state["rate"]
+
+
+datasette_rate_limiter = DatasetteRateLimiter(RATE_LIMIT_FILE)
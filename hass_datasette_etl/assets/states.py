@@ -0,0 +1,246 @@
+"""
+State assets from Home Assistant Datasette
+
+`states` and `state_attributes` are by far the largest recorder tables, so
+they're fetched differently from the other assets: `states` partitions are
+split into sub-ranges of `last_updated_ts` fetched in parallel, and
+`state_attributes` (deduplicated by Home Assistant on `attributes_id`) is
+loaded incrementally above a high-water mark.
+"""
+
+from .utils import (
+    FORCE_REFRESH_TAG,
+    build_partitions_def,
+    fetch_datasette_data,
+    fingerprint_partition,
+    iter_datasette_chunks,
+    iter_parallel_chunks,
+    probe_datasette_table,
+    source_unchanged,
+)
+from .landing import REPLAY_TAG, iter_landing, land_chunks, read_landing_fingerprint, replay_requested
+from ..profiling import profiled
+from ..streaming import ChunkStream
+from datetime import datetime
+from dagster import asset, AssetExecutionContext, DataVersion, MetadataValue, Output, ScheduleDefinition, define_asset_job, build_schedule_from_partitioned_job
+
+
+# Define daily (or hourly, see HASS_PARTITION_GRAIN) partitions starting from 2025-06-07
+start_date = datetime(2025, 6, 7)
+partitions = build_partitions_def(start_date)
+
+
+@asset(
+    name="states",
+    group_name="hass",
+    key_prefix="hass",
+    partitions_def=partitions,
+    required_resource_keys={"clickhouse_io_manager"},
+    io_manager_key="warehouse_io_manager",
+    metadata={"schema": "raw", "table": "states", "partition_expr": "last_updated_ts"},
+    output_required=False,
+)
+@profiled
+def states(context: AssetExecutionContext):
+    """
+    Asset that extracts state changes from Home Assistant Datasette endpoint
+    and writes them to Clickhouse, fetching sub-ranges of the day in parallel.
+    """
+    partition_date = context.partition_key
+    context.log.info(f"Extracting states data for {partition_date}")
+
+    # Fetch statistics are filled in while the IO manager consumes the stream
+    fetch_metadata = {}
+
+    if replay_requested(context):
+        # Reload from the local landing zone without touching Datasette
+        fingerprint = read_landing_fingerprint("states", partition_date)
+        chunks = iter_landing("states", partition_date, context=context)
+    else:
+        # Past days are immutable, skip them if the content fingerprint is unchanged
+        fingerprint = fingerprint_partition(
+            "states",
+            pk="state_id",
+            partition_col="last_updated_ts",
+            partition_date=partition_date,
+            context=context
+        )
+        if source_unchanged(context, fingerprint):
+            return
+
+        # Stream chunks of parallel sub-range fetches, keeping a local copy for replays
+        chunks = land_chunks(
+            iter_parallel_chunks(
+                "states",
+                partition_date=partition_date,
+                partition_col="last_updated_ts",
+                metadata=fetch_metadata,
+                context=context
+            ),
+            "states",
+            partition_date,
+            fingerprint=fingerprint,
+            context=context
+        )
+
+    # Log metadata about the extraction, row counts and preview are added by the IO manager
+    context.add_output_metadata(
+        metadata={
+            "partition_date": partition_date,
+            "destination": "raw.states in Clickhouse",
+            **fingerprint,
+        }
+    )
+
+    # Failed writes are retried from the landed copy
+    yield Output(
+        ChunkStream(chunks, metadata=fetch_metadata, replay=lambda: iter_landing("states", partition_date)),
+        data_version=DataVersion(fingerprint["data_version"]) if fingerprint else None
+    )
+
+
+def _last_high_water_mark(context: AssetExecutionContext) -> int:
+    """
+    Highest id loaded by the asset's last materialization, 0 to reload everything.
+    """
+    if context.run.tags.get(FORCE_REFRESH_TAG) == "true":
+        return 0
+    event = context.instance.get_latest_materialization_event(context.asset_key)
+    if event is None or event.asset_materialization is None:
+        return 0
+    value = event.asset_materialization.metadata.get("high_water_mark")
+    return int(value.value) if value is not None and value.value is not None else 0
+
+
+@asset(
+    name="state_attributes",
+    group_name="hass",
+    key_prefix="hass",
+    required_resource_keys={"clickhouse_io_manager"},
+    io_manager_key="warehouse_io_manager",
+    metadata={"schema": "raw", "table": "state_attributes"},
+    output_required=False,
+)
+@profiled
+def state_attributes(context: AssetExecutionContext):
+    """
+    Asset that extracts state attributes from Home Assistant Datasette endpoint
+    and appends the ones added since the last run to Clickhouse.
+
+    Home Assistant shares one row per distinct attribute set and only ever adds
+    rows with a higher `attributes_id`, so everything up to the last run's
+    high-water mark is already loaded. Rows that are fetched twice are merged
+    by the ReplacingMergeTree table.
+    """
+    high_water_mark = _last_high_water_mark(context)
+    probe = probe_datasette_table("state_attributes", "attributes_id", context=context)
+    if probe["max_id"] is None or probe["max_id"] <= high_water_mark:
+        context.log.info(f"No state_attributes above attributes_id {high_water_mark}, skipping fetch")
+        return
+
+    # Page statistics of the fetch, added to the output metadata
+    fetch_metadata = {}
+
+    # Bounded by the probe so the next run picks up exactly where this one stopped
+    chunks = iter_datasette_chunks(
+        "state_attributes",
+        filters={"attributes_id__gt": high_water_mark, "attributes_id__lte": probe["max_id"]},
+        metadata=fetch_metadata,
+        context=context
+    )
+
+    # Log metadata about the extraction, row counts and preview are added by the IO manager
+    context.add_output_metadata(
+        metadata={
+            "destination": "raw.state_attributes in Clickhouse",
+            "previous_high_water_mark": high_water_mark,
+            "high_water_mark": probe["max_id"],
+            **probe,
+        }
+    )
+
+    yield Output(ChunkStream(chunks, metadata=fetch_metadata))
+
+
+@asset(
+    name="states_meta",
+    group_name="hass",
+    key_prefix="hass",
+    required_resource_keys={"clickhouse_io_manager"},
+    io_manager_key="warehouse_io_manager",
+    metadata={"schema": "raw", "table": "states_meta"},
+    output_required=False,
+)
+@profiled
+def states_meta(context: AssetExecutionContext):
+    """
+    Asset that extracts the entity ids of states from Home Assistant Datasette
+    endpoint and writes it to Clickhouse. Skipped when the row count / max id
+    probe matches the last materialization.
+    """
+    probe = probe_datasette_table("states_meta", "metadata_id", context=context)
+    if source_unchanged(context, probe):
+        return
+
+    # Page statistics of the fetch, added to the output metadata
+    fetch_metadata = {}
+
+    # Fetch data from Datasette
+    df = fetch_datasette_data(
+        "states_meta",
+        metadata=fetch_metadata,
+        context=context
+    )
+
+    # Log metadata about the extraction
+    context.add_output_metadata(
+        metadata={
+            "num_rows": len(df),
+            "preview": MetadataValue.md(df.head().to_markdown() if not df.empty else "No data"),
+            "destination": "raw.states_meta in Clickhouse",
+            **probe,
+            **fetch_metadata,
+        }
+    )
+
+    yield Output(df)
+
+
+##### states asset job and schedule
+states_job = define_asset_job(
+    name="states_job",
+    selection=[states],
+    description="Job that materializes the states asset"
+)
+states_schedule = build_schedule_from_partitioned_job(
+    name="daily_states_schedule",
+    job=states_job,
+    description="Daily schedule for states asset"
+)
+
+##### states replay job, backfill it to reload partitions from the landing zone
+states_replay_job = define_asset_job(
+    name="states_replay_job",
+    selection=[states],
+    tags={REPLAY_TAG: "true"},
+    description="Reloads states partitions into Clickhouse from the local landing zone"
+)
+
+##### state_attributes and states_meta asset job and schedule
+states_dimensions_job = define_asset_job(
+    name="states_dimensions_job",
+    selection=[state_attributes, states_meta],
+    description="Job that materializes the state_attributes and states_meta assets"
+)
+states_dimensions_schedule = ScheduleDefinition(
+    name="daily_states_dimensions_schedule",
+    cron_schedule="20 0 * * *",
+    job=states_dimensions_job,
+    execution_timezone="America/Los_Angeles",
+    description="Daily schedule for state_attributes and states_meta assets"
+)
+
+# Group assets and schedules for export
+states_assets = [states, state_attributes, states_meta]
+states_schedules = [states_schedule, states_dimensions_schedule]
+states_jobs = [states_replay_job]
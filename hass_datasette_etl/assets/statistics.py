@@ -2,31 +2,32 @@
 Statistics assets from Home Assistant Datasette
 """
 
-from .utils import fetch_datasette_data
+from .utils import build_partitions_def, fetch_datasette_data, fingerprint_partition, iter_parallel_chunks, probe_datasette_table, source_unchanged
+from .lookups import enrich_chunks
+from .landing import REPLAY_TAG, iter_landing, land_chunks, read_landing_fingerprint, replay_requested
+from ..profiling import profiled
+from ..streaming import ChunkStream
 
 from datetime import datetime
-from dagster import asset, AssetExecutionContext, DailyPartitionsDefinition, MetadataValue, ScheduleDefinition, define_asset_job, build_schedule_from_partitioned_job
+from dagster import asset, AssetExecutionContext, DataVersion, MetadataValue, Output, ScheduleDefinition, define_asset_job, build_schedule_from_partitioned_job
 
 
-# Define daily partitions starting from 2023-01-01
+# Define daily (or hourly, see HASS_PARTITION_GRAIN) partitions starting from 2023-01-01
 start_date = datetime(2023, 1, 1)
-daily_partitions = DailyPartitionsDefinition(
-    start_date=start_date,
-    timezone='America/Los_Angeles',
-    hour_offset=0,
-    minute_offset=15
-)
+partitions = build_partitions_def(start_date)
 
 
 @asset(
     name="statistics",
     group_name="hass",
     key_prefix="hass",
-    partitions_def=daily_partitions,
+    partitions_def=partitions,
     required_resource_keys={"clickhouse_io_manager"},
-    io_manager_key="clickhouse_io_manager",
+    io_manager_key="warehouse_io_manager",
     metadata={"schema": "raw", "table": "statistics", "partition_expr": "created_ts"},
+    output_required=False,
 )
+@profiled
 def statistics(context: AssetExecutionContext):
     """
     Asset that extracts statistics data from Home Assistant Datasette endpoint
@@ -35,25 +36,60 @@ def statistics(context: AssetExecutionContext):
     partition_date = context.partition_key
     context.log.info(f"Extracting statistics data for {partition_date}")
 
-    # Fetch data from Datasette
-    df = fetch_datasette_data(
-        "statistics",
-        partition_date=partition_date,
-        partition_col="created_ts",
-        context=context
-    )
-
-    # Log metadata about the extraction
+    # Fetch statistics are filled in while the IO manager consumes the stream
+    fetch_metadata = {}
+
+    if replay_requested(context):
+        # Reload from the local landing zone without touching Datasette
+        fingerprint = read_landing_fingerprint("statistics", partition_date)
+        chunks = iter_landing("statistics", partition_date, context=context)
+    else:
+        # Past days are immutable, skip them if the content fingerprint is unchanged
+        fingerprint = fingerprint_partition(
+            "statistics",
+            pk="id",
+            partition_col="created_ts",
+            partition_date=partition_date,
+            context=context
+        )
+        if source_unchanged(context, fingerprint):
+            return
+
+        # Stream chunks of parallel sub-range fetches, keeping a local copy for replays
+        chunks = land_chunks(
+            iter_parallel_chunks(
+                "statistics",
+                partition_date=partition_date,
+                partition_col="created_ts",
+                metadata=fetch_metadata,
+                context=context
+            ),
+            "statistics",
+            partition_date,
+            fingerprint=fingerprint,
+            context=context
+        )
+
+    # Denormalize dimension columns into the rows while they stream, if enabled
+    chunks = enrich_chunks(chunks, "statistics", metadata=fetch_metadata, context=context)
+
+    # Log metadata about the extraction, row counts and preview are added by the IO manager
     context.add_output_metadata(
         metadata={
-            "num_rows": len(df),
-            "preview": MetadataValue.md(df.head().to_markdown() if not df.empty else "No data"),
             "partition_date": partition_date,
             "destination": "raw.statistics in Clickhouse",
+            **fingerprint,
         }
     )
 
-    return df
+    # Failed writes are retried from the landed copy, enriched again like the fetched chunks
+    def replay():
+        return enrich_chunks(iter_landing("statistics", partition_date), "statistics", context=context)
+
+    yield Output(
+        ChunkStream(chunks, metadata=fetch_metadata, replay=replay),
+        data_version=DataVersion(fingerprint["data_version"]) if fingerprint else None
+    )
 
 
 @asset(
@@ -61,18 +97,31 @@ def statistics(context: AssetExecutionContext):
     group_name="hass",
     key_prefix="hass",
     metadata={"schema": "raw", "table": "statistics_meta"},
-    io_manager_key="clickhouse_io_manager",
+    io_manager_key="warehouse_io_manager",
+    output_required=False,
 )
+@profiled
 def statistics_meta(context: AssetExecutionContext):
     """
     Asset that extracts statistics metadata from Home Assistant Datasette endpoint
     and appends it to Clickhouse table without truncating previous data.
+
+    Only changes when a sensor is added, so a row count / max id probe is compared
+    with the last materialization first and the load is skipped if it matches.
     """
     context.log.info(f"Extracting statistics metadata")
 
+    probe = probe_datasette_table("statistics_meta", "id", context=context)
+    if source_unchanged(context, probe):
+        return
+
+    # Page statistics of the fetch, added to the output metadata
+    fetch_metadata = {}
+
     # Fetch all metadata data from Datasette
     df = fetch_datasette_data(
         "statistics_meta",
+        metadata=fetch_metadata,
         context=context
     )
 
@@ -82,11 +131,13 @@ def statistics_meta(context: AssetExecutionContext):
             "num_rows": len(df),
             "preview": MetadataValue.md(df.head().to_markdown() if not df.empty else "No data"),
             "destination": "raw.statistics_meta in Clickhouse. Truncating previous data if any.",
-            "extraction_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            "extraction_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            **probe,
+            **fetch_metadata,
         }
     )
 
-    return df
+    yield Output(df)
 
 ##### statistics asset job and schedule
 statistics_job = define_asset_job(
@@ -100,6 +151,14 @@ statistics_schedule = build_schedule_from_partitioned_job(
     description="Daily schedule for statistics asset"
 )
 
+##### statistics replay job, backfill it to reload partitions from the landing zone
+statistics_replay_job = define_asset_job(
+    name="statistics_replay_job",
+    selection=[statistics],
+    tags={REPLAY_TAG: "true"},
+    description="Reloads statistics partitions into Clickhouse from the local landing zone"
+)
+
 ##### statistics_meta asset job and schedule
 statistics_meta_job = define_asset_job(
     name="statistics_meta_job",
@@ -117,3 +176,4 @@ statistics_meta_schedule = ScheduleDefinition(
 # Group assets and schedules for export
 statistics_assets = [statistics, statistics_meta]
 statistics_schedules = [statistics_schedule, statistics_meta_schedule]
+statistics_jobs = [statistics_replay_job]
@@ -1,62 +1,649 @@
 import os
 import json
+import time
+import queue
+import hashlib
 import requests
+import tempfile
+import threading
+import multiprocessing
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 from datetime import date, datetime, timedelta, UTC
 import numpy as np
-from typing import Any
+from typing import Any, Iterator
+from dagster import AssetExecutionContext, AssetObservation, AssetRecordsFilter, DailyPartitionsDefinition, HourlyPartitionsDefinition
+
+from .ratelimit import BACKOFF_STATUSES, datasette_rate_limiter
 
 # Base URL for the Datasette endpoint
 DATASETTE_BASE_URL = os.environ.get("DATASETTE_BASE_URL", "http://192.168.1.138:8001")
 
+# Canned/arbitrary SQL endpoint of the same database (`/<db>.json?sql=`)
+DATASETTE_QUERY_URL = f"{DATASETTE_BASE_URL.rstrip('/')}.json"
+
+# Rows per chunk handed to the IO manager when streaming a partition
+DATASETTE_CHUNK_ROWS = int(os.environ.get("DATASETTE_CHUNK_ROWS", "50000"))
+
+# Sub-ranges of a partition fetched concurrently by the high-volume assets
+DATASETTE_PARALLEL_RANGES = int(os.environ.get("DATASETTE_PARALLEL_RANGES", "4"))
+
+# Worker processes per partition fetch, 0 fetches sub-ranges with threads in the op process
+DATASETTE_EXTRACT_PROCESSES = int(os.environ.get("DATASETTE_EXTRACT_PROCESSES", "0"))
+
+# "table" pages through the table endpoint with `_labels=on`, "sql" pushes a
+# keyset-paginated query down to SQLite through the SQL endpoint
+DATASETTE_EXTRACT_MODE = os.environ.get("DATASETTE_EXTRACT_MODE", "table")
+
+# Whether SQL mode joins the label columns of foreign keys, those stay plain ids otherwise
+DATASETTE_PUSHDOWN_JOINS = os.environ.get("DATASETTE_PUSHDOWN_JOINS", "true").lower() == "true"
+
+# Tables SQL mode can fetch: primary key to paginate on and the foreign keys
+# stored as `_labels=on` objects, column -> (table, key, label column). The label
+# columns are the ones Datasette picks for the recorder schema (a `name`/`title`
+# column, or the other column of an (id, label) table). None means it finds none
+# and labels every id with the id as text, a join isn't needed then.
+PUSHDOWN_TABLES = {
+    "statistics": {"pk": "id", "labels": {"metadata_id": ("statistics_meta", "id", "name")}},
+    "statistics_meta": {"pk": "id", "labels": {}},
+    "events": {
+        "pk": "event_id",
+        "labels": {
+            "event_type_id": ("event_types", "event_type_id", None),
+            "data_id": ("event_data", "data_id", None),
+        },
+    },
+    "event_data": {"pk": "data_id", "labels": {}},
+    "event_types": {"pk": "event_type_id", "labels": {}},
+    "states": {
+        "pk": "state_id",
+        "labels": {
+            "old_state_id": ("states", "state_id", None),
+            "attributes_id": ("state_attributes", "attributes_id", None),
+            "metadata_id": ("states_meta", "metadata_id", None),
+        },
+    },
+    "state_attributes": {"pk": "attributes_id", "labels": {}},
+    "states_meta": {"pk": "metadata_id", "labels": {}},
+}
+
+# Datasette filter suffixes SQL mode translates, e.g. {"attributes_id__gt": 100}
+PUSHDOWN_FILTER_OPS = {"gt": ">", "gte": ">=", "lt": "<", "lte": "<=", "exact": "="}
+
+# Partition grain of the time-partitioned assets, "daily" or "hourly"
+HASS_PARTITION_GRAIN = os.environ.get("HASS_PARTITION_GRAIN", "daily")
+HOURLY_KEY_FORMAT = "%Y-%m-%d-%H:%M"
+
+# Page size bounds and targets, the size adapts per table between them
+DATASETTE_MIN_PAGE_ROWS = int(os.environ.get("DATASETTE_MIN_PAGE_ROWS", "100"))
+DATASETTE_PAGE_SECONDS = float(os.environ.get("DATASETTE_PAGE_SECONDS", "1.0"))
+DATASETTE_PAGE_BYTES = int(os.environ.get("DATASETTE_PAGE_BYTES", str(8 * 1024 * 1024)))
+
+# Page sizes learned by previous runs, so a run starts close to the right size
+PAGE_SIZE_FILE = Path(os.environ.get("DAGSTER_HOME", "/app/dagster_home")) / "datasette_page_sizes.json"
+
+# Attempts per request when Datasette answers 429/5xx or the connection fails
+DATASETTE_MAX_ATTEMPTS = int(os.environ.get("DATASETTE_MAX_ATTEMPTS", "5"))
+
+# Run tag that bypasses the change probes and always re-fetches
+FORCE_REFRESH_TAG = "hass/force_refresh"
+
 
-def fetch_datasette_data(table_name, partition_date: str = None, partition_col: str = None, context=None):
+def _datasette_get(url: str, params: dict | None = None, stats: dict | None = None) -> dict:
     """
-    Fetch data from Datasette JSON endpoint for a specific table and date.
-    Handles pagination to retrieve all rows.
+    GET a Datasette JSON endpoint and return the decoded body.
+
+    Every request waits for the shared rate limiter and reports its latency
+    and status back to it. Overload responses and connection errors are
+    retried after the limiter's backoff.
+
+    If `stats` is given it receives the `latency` (excluding time spent
+    waiting for the limiter) and payload `bytes` of the successful response.
+    """
+    for attempt in range(1, DATASETTE_MAX_ATTEMPTS + 1):
+        datasette_rate_limiter.acquire()
+        start = time.monotonic()
+        try:
+            response = requests.get(url, params=params, timeout=(10, 300))
+        except (requests.ConnectionError, requests.Timeout):
+            datasette_rate_limiter.record(time.monotonic() - start, status=None)
+            if attempt == DATASETTE_MAX_ATTEMPTS:
+                raise
+            continue
+
+        retry_after = response.headers.get("Retry-After")
+        datasette_rate_limiter.record(
+            time.monotonic() - start,
+            status=response.status_code,
+            retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None,
+        )
+        if response.status_code in BACKOFF_STATUSES and attempt < DATASETTE_MAX_ATTEMPTS:
+            continue
+
+        response.raise_for_status()
+        if stats is not None:
+            stats.update({"latency": time.monotonic() - start, "bytes": len(response.content)})
+        return response.json()
+
+
+def datasette_max_page_rows(context=None) -> int:
+    """
+    Largest page Datasette will return, its `max_returned_rows` setting.
+
+    Falls back to Datasette's default of 1000 if the settings can't be read.
+    """
+    parts = urlsplit(DATASETTE_BASE_URL)
+    try:
+        settings = _datasette_get(urlunsplit((parts.scheme, parts.netloc, "/-/settings.json", "", "")))
+        return int(settings.get("max_returned_rows", 1000))
+    except (requests.RequestException, ValueError) as e:
+        if context:
+            context.log.warning(f"Could not read Datasette settings, assuming 1000 rows per page: {e}")
+        return 1000
+
+
+def _read_page_sizes() -> dict:
+    try:
+        return json.loads(PAGE_SIZE_FILE.read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_page_size(table_name: str, page_size: int) -> None:
+    # Best effort, a lost update only costs a few pages of adaptation
+    try:
+        sizes = _read_page_sizes()
+        sizes[table_name] = page_size
+        PAGE_SIZE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = PAGE_SIZE_FILE.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(sizes))
+        os.replace(tmp_path, PAGE_SIZE_FILE)
+    except OSError:
+        pass
+
+
+def next_page_size(rows: int, latency: float, payload_bytes: int, current: int, max_rows: int) -> int:
+    """
+    Page size that brings the next page towards the latency and payload targets.
+
+    Growth is limited to doubling per page so one fast page can't overshoot.
+    """
+    if rows <= 0 or latency <= 0:
+        return current
+    target = rows * DATASETTE_PAGE_SECONDS / latency
+    if payload_bytes > 0:
+        target = min(target, rows * DATASETTE_PAGE_BYTES / payload_bytes)
+    return int(max(DATASETTE_MIN_PAGE_ROWS, min(max_rows, current * 2, target)))
+
+
+def _with_page_size(url: str, page_size: int) -> str:
+    """
+    Replace the `_size` parameter of a Datasette `next_url`.
+    """
+    parts = urlsplit(url)
+    query = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True) if key != "_size"]
+    query.append(("_size", str(page_size)))
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def query_datasette(sql: str, params: dict | None = None, context=None) -> pd.DataFrame:
+    """
+    Run a read-only SQL query through Datasette's database endpoint.
+
+    Args:
+        sql: SQLite query, may reference `:name` parameters
+        params: Values for the named parameters
+        context: Optional AssetExecutionContext for logging
+
+    Returns:
+        DataFrame with the query result
+    """
+    if context:
+        context.log.debug(f"Querying Datasette: {sql} {params or {}}")
+
+    data = _datasette_get(DATASETTE_QUERY_URL, params={"sql": sql, "_shape": "arrays", **(params or {})})
+    if data.get("truncated"):
+        raise ValueError(f"Datasette truncated the result of: {sql}")
+
+    return pd.DataFrame(data["rows"], columns=data["columns"])
+
+
+def probe_datasette_table(table_name: str, pk: str, context=None) -> dict:
+    """
+    Cheap change probe for a dimension table: row count and max primary key.
+
+    Args:
+        table_name: Name of the table to probe
+        pk: Primary key column
+        context: Optional AssetExecutionContext for logging
+
+    Returns:
+        Dict with `row_count` and `max_id`
+    """
+    df = query_datasette(
+        f"select count(*) as row_count, max({pk}) as max_id from {table_name}",
+        context=context,
+    )
+    probe = {
+        "row_count": int(df["row_count"].iloc[0]),
+        "max_id": None if pd.isna(df["max_id"].iloc[0]) else int(df["max_id"].iloc[0]),
+    }
+    if context:
+        context.log.info(f"Probed {table_name}: {probe}")
+    return probe
+
+
+def build_partitions_def(start_date: datetime) -> DailyPartitionsDefinition | HourlyPartitionsDefinition:
+    """
+    Partitions of the time-partitioned assets, at the grain set by HASS_PARTITION_GRAIN.
+
+    Hourly partitions split heavy days into slices that run in parallel; the
+    raw tables are the same either way, only the fetched ranges get smaller.
+    """
+    if HASS_PARTITION_GRAIN == "hourly":
+        return HourlyPartitionsDefinition(
+            start_date=start_date.strftime(HOURLY_KEY_FORMAT),
+            timezone='America/Los_Angeles',
+        )
+    return DailyPartitionsDefinition(
+        start_date=start_date,
+        timezone='America/Los_Angeles',
+        hour_offset=0,
+        minute_offset=15
+    )
+
+
+def partition_bounds(partition_date: str) -> tuple[int, int]:
+    """
+    Unix timestamp bounds [start, end) of a daily or hourly partition.
+    """
+    if len(partition_date) > 10:
+        date_obj = datetime.strptime(partition_date, HOURLY_KEY_FORMAT)
+        return int(date_obj.timestamp()), int((date_obj + timedelta(hours=1)).timestamp())
+
+    date_obj = datetime.strptime(partition_date, "%Y-%m-%d")
+    next_day = date_obj + timedelta(days=1)
+    return int(date_obj.timestamp()), int(next_day.timestamp())
+
+
+def fingerprint_partition(table_name: str, pk: str, partition_col: str, partition_date: str, context=None) -> dict:
+    """
+    Content fingerprint of one (daily or hourly) partition, computed by SQLite in one query.
+
+    Besides row count and min/max id, integer checksums over the ids and the
+    millisecond timestamps catch rows that were replaced without changing the
+    count. Only exact integer arithmetic is used so the result doesn't depend
+    on SQLite's scan order.
+
+    Args:
+        table_name: Name of the partitioned table
+        pk: Primary key column
+        partition_col: Timestamp column the table is partitioned on
+        partition_date: Partition key to fingerprint, a day or an hour
+        context: Optional AssetExecutionContext for logging
+
+    Returns:
+        Dict with `row_count`, `min_id`, `max_id` and `data_version`
+    """
+    start_timestamp, end_timestamp = partition_bounds(partition_date)
+    df = query_datasette(
+        f"""
+        select
+            count(*) as row_count
+            , min({pk}) as min_id
+            , max({pk}) as max_id
+            , sum({pk}) as id_sum
+            , sum(cast({partition_col} * 1000 as integer) % 2147483647) as ts_sum
+            , sum(({pk} * 1000003 + cast({partition_col} * 1000 as integer)) % 2147483647) as mixed_sum
+        from {table_name}
+        where {partition_col} >= :start and {partition_col} < :end
+        """,
+        params={"start": start_timestamp, "end": end_timestamp},
+        context=context,
+    )
+    row = {col: (None if pd.isna(val) else int(val)) for col, val in df.iloc[0].items()}
+    data_version = hashlib.sha256(
+        ":".join(str(row[col]) for col in df.columns).encode()
+    ).hexdigest()[:16]
+
+    fingerprint = {
+        "row_count": row["row_count"],
+        "min_id": row["min_id"],
+        "max_id": row["max_id"],
+        "data_version": data_version,
+    }
+    if context:
+        context.log.info(f"Fingerprint of {table_name} on {partition_date}: {fingerprint}")
+    return fingerprint
+
+
+def source_unchanged(context: AssetExecutionContext, probe: dict) -> bool:
+    """
+    Compare a probe with the metadata of the asset's last materialization.
+
+    For partitioned assets the last materialization of the current partition is
+    used. Records an AssetObservation carrying the probe when nothing changed, so
+    the check is visible on the asset even though no materialization happens.
+
+    Args:
+        context: AssetExecutionContext of the asset being materialized
+        probe: Result of `probe_datasette_table` or `fingerprint_partition`
+
+    Returns:
+        True if the source is unchanged and the fetch can be skipped
+    """
+    if context.run.tags.get(FORCE_REFRESH_TAG) == "true":
+        context.log.info(f"{FORCE_REFRESH_TAG} is set, skipping change probe")
+        return False
+
+    partition_key = context.partition_key if context.has_partition_key else None
+    if partition_key:
+        records = context.instance.fetch_materializations(
+            AssetRecordsFilter(asset_key=context.asset_key, asset_partitions=[partition_key]),
+            limit=1,
+        ).records
+        event = records[0].event_log_entry if records else None
+    else:
+        event = context.instance.get_latest_materialization_event(context.asset_key)
+    if event is None or event.asset_materialization is None:
+        return False
+
+    last_metadata = event.asset_materialization.metadata
+    if not all(key in last_metadata and last_metadata[key].value == value for key, value in probe.items()):
+        return False
+
+    context.log.info(f"{context.asset_key.to_user_string()} unchanged since run {event.run_id}, skipping fetch")
+    context.log_event(
+        AssetObservation(
+            asset_key=context.asset_key,
+            partition=partition_key,
+            metadata={**probe, "unchanged_since_run": event.run_id},
+        )
+    )
+    return True
+
+
+def _to_string(val: Any) -> str:
+    if pd.isna(val):
+        return ''
+
+    if isinstance(val, (dict, list)):
+        try:
+            return json.dumps(val, ensure_ascii=False)
+        except (TypeError, ValueError):
+            # Fallback if object isn’t JSON-serialisable
+            return str(val)
+
+    # pandas.Timestamp or datetime
+    if isinstance(val, (pd.Timestamp, datetime)):
+        # Normalise to UTC
+        if val.tzinfo is None:
+            val = val.replace(tzinfo=UTC)
+        else:
+            val = val.astimezone(UTC)
+        # Seconds → milliseconds, keep as int then str
+        return str(int(val.timestamp() * 1000))
+
+    # Pure date (exclude datetimes, which are already handled)
+    if isinstance(val, date) and not isinstance(val, datetime):
+        return val.isoformat()
+
+    # Everything else
+    return str(val)
+
+
+def normalize_rows(rows: list, columns: list, loaded_at: float) -> pd.DataFrame:
+    """
+    Turn raw Datasette rows into the all-String frame written to ClickHouse.
+
+    Args:
+        rows: Row lists as returned by Datasette
+        columns: Column names of the rows
+        loaded_at: Load timestamp, the ReplacingMergeTree version column
+
+    Returns:
+        DataFrame of strings plus a float `loaded_at` column
+    """
+    df = pd.DataFrame(rows, columns=columns).map(_to_string)
+    df["loaded_at"] = np.full(len(df), loaded_at, dtype=float)
+    return df
+
+
+def build_pushdown_query(
+    table_name: str,
+    columns: list[str],
+    partition_col: str | None = None,
+    filters: dict | None = None,
+    joins: bool = DATASETTE_PUSHDOWN_JOINS,
+) -> tuple[str, dict]:
+    """
+    Keyset-paginated SQLite query of a table, the SQL mode counterpart of a table endpoint page.
+
+    The query selects the table's own columns, plus `<column>__label` and
+    `<column>__found` (whether the key has a label, false for a dangling key
+    or without joins) per labelled foreign key. It expects `:after` (last
+    primary key of the previous page) and `:size` parameters, and
+    `:start`/`:end` with a partition column.
+
+    Returns:
+        The query and the parameters derived from `filters`
+    """
+    spec = PUSHDOWN_TABLES[table_name]
+    pk = spec["pk"]
+
+    select = [f't."{column}"' for column in columns]
+    from_clause = [f"{table_name} as t"]
+    for i, (column, (label_table, key, label_col)) in enumerate(spec["labels"].items()):
+        if label_col is None:
+            select += [f'cast(t."{column}" as text) as "{column}__label"', f'1 as "{column}__found"']
+        elif joins:
+            select += [f'l{i}."{label_col}" as "{column}__label"', f'l{i}."{key}" is not null as "{column}__found"']
+            from_clause.append(f'left join {label_table} as l{i} on l{i}."{key}" = t."{column}"')
+        else:
+            select += [f'null as "{column}__label"', f'0 as "{column}__found"']
+
+    where = [f't."{pk}" > :after']
+    if partition_col:
+        where += [f't."{partition_col}" >= :start', f't."{partition_col}" < :end']
+    params = {}
+    for i, (name, value) in enumerate((filters or {}).items()):
+        column, _, op = name.rpartition("__")
+        if op not in PUSHDOWN_FILTER_OPS or column not in columns:
+            raise ValueError(f"Unsupported filter for SQL extraction: {name}")
+        where.append(f't."{column}" {PUSHDOWN_FILTER_OPS[op]} :f{i}')
+        params[f"f{i}"] = value
+
+    sql = (
+        f"select {', '.join(select)}\n"
+        f"from {' '.join(from_clause)}\n"
+        f"where {' and '.join(where)}\n"
+        f'order by t."{pk}" limit :size'
+    )
+    return sql, params
+
+
+def _labelled_rows(rows: list, columns: list[str], labelled: list[str]) -> tuple[list, list[str]]:
+    """
+    Fold `<column>__label` columns into `{"value": ..., "label": ...}` objects like `_labels=on` returns.
+
+    Keys without a label (`<column>__found` false) stay plain values, as Datasette leaves them.
+    """
+    if not labelled:
+        return rows, columns
+    triples = [
+        (columns.index(column), columns.index(f"{column}__label"), columns.index(f"{column}__found"))
+        for column in labelled
+    ]
+    keep = [i for i, column in enumerate(columns) if not column.endswith(("__label", "__found"))]
+    out = []
+    for row in rows:
+        row = list(row)
+        for value_idx, label_idx, found_idx in triples:
+            if row[value_idx] is not None and row[found_idx]:
+                row[value_idx] = {"value": row[value_idx], "label": row[label_idx]}
+        out.append([row[i] for i in keep])
+    return out, [columns[i] for i in keep]
+
+
+def iter_sql_chunks(
+    table_name: str,
+    partition_date: str = None,
+    partition_col: str = None,
+    chunk_size: int = DATASETTE_CHUNK_ROWS,
+    metadata: dict | None = None,
+    context=None,
+    bounds: tuple[int, int] | None = None,
+    filters: dict | None = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Fetch a table through Datasette's SQL endpoint, yielding normalized chunks.
+
+    Same arguments and output as `iter_datasette_chunks`, but projection,
+    filters and label lookups run in SQLite and pages continue after the last
+    primary key instead of following `next_url`, so every page is an index
+    seek regardless of how deep into the table it is.
+    """
+    pk = PUSHDOWN_TABLES[table_name]["pk"]
+    labelled = list(PUSHDOWN_TABLES[table_name]["labels"])
+    columns = query_datasette(f"select name from pragma_table_info('{table_name}')", context=context)["name"].tolist()
+    sql, params = build_pushdown_query(table_name, columns, partition_col=partition_col, filters=filters)
+    if partition_date and partition_col:
+        params["start"], params["end"] = bounds or partition_bounds(partition_date)
+
+    # Pages are capped by max_returned_rows, Datasette truncates larger results
+    max_rows = datasette_max_page_rows(context)
+    size_key = f"{table_name}:sql"
+    page_size = min(max_rows, int(_read_page_sizes().get(size_key, 1000)))
+    page_sizes = []
+
+    # One load timestamp for the whole fetch, it versions the rows in ClickHouse
+    loaded_at = datetime.timestamp(datetime.now(UTC))
+
+    buffer = []
+    result_columns = None
+    after = -1
+    page_count = 0
+    total_rows = 0
+
+    if context:
+        context.log.info(f"Starting SQL extraction for {table_name} on {partition_date}")
+        context.log.debug(f"\tSQL: {sql}")
+
+    while True:
+        page_count += 1
+        stats = {}
+        data = _datasette_get(
+            DATASETTE_QUERY_URL,
+            params={"sql": sql, "_shape": "arrays", **params, "after": after, "size": page_size},
+            stats=stats,
+        )
+        page_sizes.append(page_size)
+        rows = data.get("rows") or []
+        if data.get("truncated"):
+            raise ValueError(f"Datasette truncated a page of {table_name}")
+
+        if rows:
+            result_rows, result_columns = _labelled_rows(rows, data["columns"], labelled)
+            after = rows[-1][data["columns"].index(pk)]
+            total_rows += len(rows)
+            buffer.extend(result_rows)
+            if context:
+                context.log.info(f"Retrieved {len(rows)} rows in page {page_count}, total rows so far: {total_rows}")
+
+        if len(buffer) >= chunk_size:
+            yield normalize_rows(buffer, result_columns, loaded_at)
+            buffer = []
+
+        # A short page is the last one
+        if len(rows) < page_size:
+            break
+        page_size = next_page_size(len(rows), stats["latency"], stats["bytes"], page_size, max_rows)
+
+    if buffer:
+        yield normalize_rows(buffer, result_columns, loaded_at)
+
+    if len(page_sizes) > 1:
+        _save_page_size(size_key, page_size)
+
+    if metadata is not None:
+        metadata.update({
+            "extract_mode": "sql",
+            "pages": page_count,
+            "fetched_rows": total_rows,
+            "max_returned_rows": max_rows,
+            "page_size_first": page_sizes[0],
+            "page_size_last": page_sizes[-1],
+            "page_size_max": max(page_sizes),
+        })
+
+
+def iter_datasette_chunks(
+    table_name,
+    partition_date: str = None,
+    partition_col: str = None,
+    chunk_size: int = DATASETTE_CHUNK_ROWS,
+    metadata: dict | None = None,
+    context=None,
+    bounds: tuple[int, int] | None = None,
+    filters: dict | None = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Fetch data from Datasette JSON endpoint for a specific table and date,
+    yielding normalized chunks of `chunk_size` rows as pages arrive.
 
     Args:
         table_name: Name of the table to fetch data from
         partition_date: Date to filter data for
         partition_col: Column to filter data on
+        chunk_size: Number of rows per yielded chunk
+        bounds: Optional [start, end) timestamps replacing the partition's bounds, e.g. a sub-range
+        filters: Optional extra Datasette filters, e.g. {"attributes_id__gt": 100}
+        metadata: Optional dict receiving fetch statistics once exhausted
         context: Optional AssetExecutionContext for logging
 
-    Returns:
-        DataFrame containing the fetched data
+    Yields:
+        DataFrames of at most `chunk_size` normalized rows
     """
     if (partition_date and not partition_col) or (not partition_date and partition_col):
         raise ValueError(
             "Both partition_date and partition_col must be provided if one is provided."
         )
 
+    if DATASETTE_EXTRACT_MODE == "sql" and table_name in PUSHDOWN_TABLES:
+        yield from iter_sql_chunks(
+            table_name, partition_date, partition_col, chunk_size, metadata, context, bounds=bounds, filters=filters
+        )
+        return
+
     # Build URL for JSON API
     url = f"{DATASETTE_BASE_URL}/{table_name}.json"
 
+    # Start from the size learned by earlier runs, within the server's limit
+    max_rows = datasette_max_page_rows(context)
+    page_size = min(max_rows, int(_read_page_sizes().get(table_name, 1000)))
+    page_sizes = []
+
     # Initial parameters
-    params = {"_size": 1000, "_labels": "on"}  # Fetch 1000 rows per page
+    params = {"_size": page_size, "_labels": "on", **(filters or {})}
 
     # For partitioned tables, filter by date using created_ts (unix timestamp)
     if partition_date and partition_col:
-        # Convert partition date to datetime
-        date_obj = datetime.strptime(partition_date, "%Y-%m-%d")
-        next_day = date_obj + timedelta(days=1)
-
-        # Convert dates to unix timestamps
-        start_timestamp = int(date_obj.timestamp())
-        end_timestamp = int(next_day.timestamp())
+        # Convert partition date to unix timestamps
+        start_timestamp, end_timestamp = bounds or partition_bounds(partition_date)
 
         params[f"{partition_col}__gte"] = start_timestamp
         params[f"{partition_col}__lt"] = end_timestamp
 
-    # Get authentication token from environment if available
-    auth_token = os.environ.get("DATASETTE_AUTH_TOKEN")
-    headers = {}
-    if auth_token:
-        headers["Authorization"] = f"Bearer {auth_token}"
-    context.log.info(f"Using headers: {headers}")
+    # One load timestamp for the whole fetch, it versions the rows in ClickHouse
+    loaded_at = datetime.timestamp(datetime.now(UTC))
 
-    # Initialize an empty DataFrame to store all results
-    all_data = pd.DataFrame()
+    # Rows waiting to be normalized and yielded as the next chunk
+    buffer = []
+    columns = None
 
     # Paginate through all results
     page_count = 0
@@ -72,36 +659,36 @@ def fetch_datasette_data(table_name, partition_date: str = None, partition_col:
             context.log.info(f"\tURL: {url}")
             context.log.info(f"\tParams: {params}")
 
-        # Make the request
-        response = requests.get(url, params=params) #, headers=headers)
-        response.raise_for_status()
-
-        # Parse JSON response
-        data = response.json()
+        # Make the request and parse JSON response
+        stats = {}
+        data = _datasette_get(url, params=params, stats=stats)
+        page_sizes.append(page_size)
         if context:
-            context.log.debug(f"\tFetched json data")
+            context.log.debug(f"\tFetched {stats['bytes']} bytes in {stats['latency']:.2f}s")
 
-        # If there are rows, add them to our DataFrame
-        rows_in_page = 0
+        # If there are rows, add them to the current chunk
+        columns = data.get("columns", columns)
         if "rows" in data.keys() and data["rows"]:
             rows_in_page = len(data["rows"])
             total_rows += rows_in_page
+            buffer.extend(data["rows"])
 
             if context:
                 context.log.info(f"Retrieved {rows_in_page} rows in page {page_count}, total rows so far: {total_rows}")
 
-            if all_data.empty:
-                all_data = pd.DataFrame(data["rows"], columns=data["columns"])
-            else:
-                new_data = pd.DataFrame(data["rows"], columns=data["columns"])
-                all_data = pd.concat([all_data, new_data], ignore_index=True)
+        if len(buffer) >= chunk_size:
+            yield normalize_rows(buffer, columns, loaded_at)
+            buffer = []
 
         # Check if there's a next page
-        context.log.debug(f"\tNext URL: {data["next_url"]}")
-        # context.log.info(data)
         if "next_url" in data.keys() and data["next_url"]:
+            # Resize the next page from how long this one took
+            page_size = next_page_size(
+                len(data.get("rows") or []), stats["latency"], stats["bytes"], page_size, max_rows
+            )
+
             # Update params with the next page token
-            url = data["next_url"]
+            url = _with_page_size(data["next_url"], page_size)
             params = {}
             if context:
                 context.log.debug(f"Moving to next page with url: {url}")
@@ -111,42 +698,222 @@ def fetch_datasette_data(table_name, partition_date: str = None, partition_col:
                 context.log.debug(f"Pagination complete for {table_name}. Total pages: {page_count}, total rows: {total_rows}")
             break
 
-    context.log.debug(f"{all_data.head().to_markdown()}")
+    if buffer:
+        yield normalize_rows(buffer, columns, loaded_at)
 
-    def _to_string(val: Any) -> str:
-        if pd.isna(val):
-            return ''
+    # Only full pages say something about the right size
+    if len(page_sizes) > 1:
+        _save_page_size(table_name, page_size)
 
-        if isinstance(val, (dict, list)):
+    if metadata is not None:
+        metadata.update({
+            "pages": page_count,
+            "fetched_rows": total_rows,
+            "max_returned_rows": max_rows,
+            "page_size_first": page_sizes[0],
+            "page_size_last": page_sizes[-1],
+            "page_size_max": max(page_sizes),
+        })
+
+
+def split_bounds(partition_date: str, parts: int) -> list[tuple[int, int]]:
+    """
+    Split a partition into `parts` contiguous [start, end) sub-ranges.
+    """
+    start, end = partition_bounds(partition_date)
+    edges = [start + (end - start) * i // parts for i in range(parts)] + [end]
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def iter_parallel_chunks(
+    table_name: str,
+    partition_date: str,
+    partition_col: str,
+    parts: int = DATASETTE_PARALLEL_RANGES,
+    metadata: dict | None = None,
+    context=None,
+    processes: int = DATASETTE_EXTRACT_PROCESSES,
+) -> Iterator[pd.DataFrame]:
+    """
+    Fetch a partition as parallel sub-ranges, yielding chunks as they complete.
+
+    Each sub-range is paginated by its own thread, all of them going through
+    the shared rate limiter, and chunks are handed over through a small
+    bounded queue so memory stays at a few chunks per thread. With
+    `processes` set the sub-ranges are fetched by worker processes instead,
+    so normalizing the rows uses several cores (see `_iter_process_chunks`).
+
+    Args:
+        table_name: Name of the table to fetch data from
+        partition_date: Partition to fetch
+        partition_col: Timestamp column the table is partitioned on
+        parts: Number of sub-ranges fetched concurrently
+        metadata: Optional dict receiving the summed fetch statistics
+        context: Optional AssetExecutionContext for logging
+        processes: Number of worker processes, 0 to use threads
+
+    Yields:
+        Normalized chunks, in no particular order
+    """
+    ranges = split_bounds(partition_date, parts)
+    if processes > 0:
+        yield from _iter_process_chunks(table_name, partition_date, partition_col, ranges, processes, metadata, context)
+        return
+
+    chunks = queue.Queue(maxsize=parts * 2)
+    stop = threading.Event()
+    done = object()
+    range_metadata = [{} for _ in ranges]
+
+    def put(item) -> bool:
+        while not stop.is_set():
             try:
-                return json.dumps(val, ensure_ascii=False)
-            except (TypeError, ValueError):
-                # Fallback if object isn’t JSON-serialisable
-                return str(val)
-
-        # pandas.Timestamp or datetime
-        if isinstance(val, (pd.Timestamp, datetime)):
-            # Normalise to UTC
-            if val.tzinfo is None:
-                val = val.replace(tzinfo=UTC)
+                chunks.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def fetch_range(index: int, bounds: tuple[int, int]):
+        try:
+            for chunk in iter_datasette_chunks(
+                table_name,
+                partition_date=partition_date,
+                partition_col=partition_col,
+                metadata=range_metadata[index],
+                bounds=bounds,
+            ):
+                if not put(chunk):
+                    return
+            put(done)
+        except Exception as e:
+            put(e)
+
+    if context:
+        context.log.info(f"Fetching {table_name} {partition_date} as {parts} parallel sub-ranges")
+
+    threads = [threading.Thread(target=fetch_range, args=(i, r), daemon=True) for i, r in enumerate(ranges)]
+    for thread in threads:
+        thread.start()
+    try:
+        remaining = len(threads)
+        while remaining:
+            item = chunks.get()
+            if item is done:
+                remaining -= 1
+            elif isinstance(item, Exception):
+                raise item
             else:
-                val = val.astimezone(UTC)
-            # Seconds → milliseconds, keep as int then str
-            return str(int(val.timestamp() * 1000))
+                yield item
+    finally:
+        # Stop the other sub-ranges if the consumer stopped or one failed
+        stop.set()
+        for thread in threads:
+            thread.join()
 
-        # Pure date (exclude datetimes, which are already handled)
-        if isinstance(val, date) and not isinstance(val, datetime):
-            return val.isoformat()
+    if metadata is not None:
+        metadata.update(_sum_range_metadata(range_metadata))
 
-        # Everything else
-        return str(val)
 
-    all_data = all_data.applymap(_to_string)
-    timestamp = datetime.timestamp(datetime.now(UTC))
-    all_data["loaded_at"] = np.array([timestamp] * len(all_data), dtype=float)
+def _sum_range_metadata(range_metadata: list[dict]) -> dict:
+    return {
+        "pages": sum(m.get("pages", 0) for m in range_metadata),
+        "fetched_rows": sum(m.get("fetched_rows", 0) for m in range_metadata),
+        "parallel_ranges": len(range_metadata),
+        "max_returned_rows": range_metadata[0].get("max_returned_rows") if range_metadata else None,
+        "page_size_max": max((m.get("page_size_max", 0) for m in range_metadata), default=0),
+    }
 
-    context.log.debug(timestamp)
-    context.log.debug(all_data.loaded_at.head(10))
 
-    return all_data
+def _fetch_range_to_parquet(table_name: str, partition_date: str, partition_col: str, bounds: tuple[int, int], path: str) -> tuple[str | None, dict]:
+    """
+    Worker process: fetch one sub-range and spill its chunks to a Parquet file.
+    """
+    metadata = {}
+    writer = None
+    try:
+        for chunk in iter_datasette_chunks(
+            table_name, partition_date=partition_date, partition_col=partition_col, metadata=metadata, bounds=bounds
+        ):
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+    return (path if writer is not None else None), metadata
+
+
+def _iter_process_chunks(
+    table_name: str,
+    partition_date: str,
+    partition_col: str,
+    ranges: list[tuple[int, int]],
+    processes: int,
+    metadata: dict | None,
+    context=None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Fetch sub-ranges in worker processes and yield their chunks as each finishes.
+
+    Workers spill to Parquet in a temporary directory rather than sending
+    DataFrames back, so the op process only holds one chunk at a time.
+    """
+    if context:
+        context.log.info(f"Fetching {table_name} {partition_date} as {len(ranges)} sub-ranges in {processes} processes")
+
+    range_metadata = []
+    with tempfile.TemporaryDirectory(prefix=f"{table_name}-") as spill_dir:
+        # Spawned workers, forking a process running Dagster's threads isn't safe
+        with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = [
+                pool.submit(
+                    _fetch_range_to_parquet, table_name, partition_date, partition_col, bounds,
+                    os.path.join(spill_dir, f"range-{i}.parquet"),
+                )
+                for i, bounds in enumerate(ranges)
+            ]
+            try:
+                for future in as_completed(futures):
+                    path, fetch_metadata = future.result()
+                    range_metadata.append(fetch_metadata)
+                    if path is None:
+                        continue
+                    for batch in pq.ParquetFile(path).iter_batches(batch_size=DATASETTE_CHUNK_ROWS):
+                        yield batch.to_pandas()
+                    os.remove(path)
+            finally:
+                for future in futures:
+                    future.cancel()
+
+    if metadata is not None:
+        metadata.update({**_sum_range_metadata(range_metadata), "extract_processes": processes})
+
+
+def fetch_datasette_data(table_name, partition_date: str = None, partition_col: str = None, metadata: dict | None = None, context=None):
+    """
+    Fetch data from Datasette JSON endpoint for a specific table and date.
+    Handles pagination to retrieve all rows.
+
+    Args:
+        table_name: Name of the table to fetch data from
+        partition_date: Date to filter data for
+        partition_col: Column to filter data on
+        metadata: Optional dict receiving fetch statistics
+        context: Optional AssetExecutionContext for logging
+
+    Returns:
+        DataFrame containing the fetched data
+    """
+    chunks = list(iter_datasette_chunks(
+        table_name,
+        partition_date=partition_date,
+        partition_col=partition_col,
+        metadata=metadata,
+        context=context
+    ))
+    if not chunks:
+        return normalize_rows([], [], datetime.timestamp(datetime.now(UTC)))
 
+    return pd.concat(chunks, ignore_index=True)
@@ -0,0 +1,151 @@
+"""
+Skip indexes and projections declared for the raw ClickHouse tables.
+
+The raw tables are ordered by their primary key, so lookups by event type,
+entity or statistic would scan every granule. The objects declared here let
+ClickHouse skip granules (bloom filter / set indexes) or read an alternate
+sort order (projections). `sql/init_tables.sql` creates them with new tables,
+the ClickHouse IO manager adds missing ones to existing tables on first write
+and `clickhouse_schema_migration_job` materializes them for data loaded before.
+
+Note that queries using `FINAL`, like the dbt staging views, can't use
+projections; they benefit from the skip indexes only.
+
+The hourly and daily rollups of `raw.statistics` are fed by materialized
+views (see `sql/init_tables.sql`). They keep one row per statistics id, so
+re-inserted rows replace their previous copy; `seed_statistics_rollups`
+fills them from rows loaded before the views existed.
+"""
+
+from typing import Callable
+
+
+def label_id(column: str) -> str:
+    """
+    Numeric id inside a Datasette `_labels=on` foreign key, e.g. {"value": 12, "label": "..."}.
+    """
+    return f"toUInt32OrZero(trim(simpleJSONExtractRaw({column}, 'value')))"
+
+
+# index name -> "<expression> type <type> granularity <n>"
+TABLE_INDEXES = {
+    "raw.events": {
+        "event_type_id_idx": f"{label_id('event_type_id')} type set(512) granularity 4",
+        "data_id_idx": f"{label_id('data_id')} type bloom_filter(0.01) granularity 4",
+    },
+    "raw.event_data": {
+        "entity_id_idx": "entity_id type bloom_filter(0.01) granularity 4",
+        "domain_idx": "domain type set(256) granularity 4",
+    },
+    "raw.statistics": {
+        "metadata_id_idx": f"{label_id('metadata_id')} type set(1024) granularity 4",
+    },
+}
+
+# projection name -> "(select ... order by ...)"
+TABLE_PROJECTIONS = {
+    "raw.statistics": {
+        "by_metadata_id": f"(select * order by {label_id('metadata_id')}, start_ts)",
+    },
+}
+
+
+def ensure_table_objects(execute: Callable[[str], object], table: str) -> list[str]:
+    """
+    Add the declared indexes and projections a table is missing.
+
+    Only new parts are indexed, see `materialize_table_objects` for existing data.
+
+    Args:
+        execute: Callable running one SQL statement, e.g. `Client.execute`
+        table: Qualified table name
+
+    Returns:
+        Statements that were issued
+    """
+    statements = [
+        f"alter table {table} add index if not exists {name} {definition}"
+        for name, definition in TABLE_INDEXES.get(table, {}).items()
+    ]
+    projections = TABLE_PROJECTIONS.get(table, {})
+    if projections:
+        # ReplacingMergeTree refuses projections unless merges rebuild them
+        statements.append(f"alter table {table} modify setting deduplicate_merge_projection_mode = 'rebuild'")
+        statements.extend(
+            f"alter table {table} add projection if not exists {name} {definition}"
+            for name, definition in projections.items()
+        )
+
+    for statement in statements:
+        execute(statement)
+    return statements
+
+
+def materialize_table_objects(execute: Callable[[str], object], table: str) -> list[str]:
+    """
+    Build the declared indexes and projections for data already in a table.
+
+    These are mutations that rewrite the table's parts in the background.
+
+    Args:
+        execute: Callable running one SQL statement
+        table: Qualified table name
+
+    Returns:
+        Statements that were issued
+    """
+    statements = [
+        f"alter table {table} materialize index {name}" for name in TABLE_INDEXES.get(table, {})
+    ] + [
+        f"alter table {table} materialize projection {name}" for name in TABLE_PROJECTIONS.get(table, {})
+    ]
+    for statement in statements:
+        execute(statement)
+    return statements
+
+
+def declared_tables() -> list[str]:
+    return sorted(set(TABLE_INDEXES) | set(TABLE_PROJECTIONS))
+
+
+# Rollup table -> (bucket column, bucket of a UTC DateTime expression `{ts}`)
+STATISTICS_ROLLUPS = {
+    "raw.statistics_hourly": ("bucket_start", "toStartOfHour({ts})"),
+    "raw.statistics_daily": ("bucket_date", "toDate({ts}, 'America/Los_Angeles')"),
+}
+
+
+def seed_statistics_rollups(execute: Callable[[str], object]) -> list[str]:
+    """
+    Copy every `raw.statistics` row into the rollups, like their materialized views do on insert.
+
+    Rows already in a rollup are replaced once merged (readers use FINAL),
+    so seeding again only resyncs them.
+
+    Args:
+        execute: Callable running one SQL statement
+
+    Returns:
+        Statements that were issued
+    """
+    ts = "toDateTime(toUInt32(toFloat64OrZero(s.start_ts)), 'UTC')"
+    statements = [
+        f"""
+            insert into {table}
+            select
+                {label_id('s.metadata_id')} as metadata_id,
+                {bucket.format(ts=ts)} as {column},
+                toUInt64OrZero(s.id) as id,
+                toFloat64OrZero(s.start_ts) as start_ts,
+                toFloat64OrNull(s.min) as min,
+                toFloat64OrNull(s.max) as max,
+                toFloat64OrNull(s.mean) as mean,
+                toFloat64OrNull(s.sum) as sum,
+                s.loaded_at as loaded_at
+            from raw.statistics as s
+        """
+        for table, (column, bucket) in STATISTICS_ROLLUPS.items()
+    ]
+    for statement in statements:
+        execute(statement)
+    return statements
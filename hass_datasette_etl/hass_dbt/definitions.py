@@ -1,43 +1,101 @@
+import os
 from pathlib import Path
 
-from dagster_dbt import DbtCliResource, DbtProject, dbt_assets, build_schedule_from_dbt_selection, DagsterDbtTranslator
+from dagster_dbt import DbtCliResource, DbtProject, dbt_assets, DagsterDbtTranslator
 import dagster as dg
 from typing import Mapping, Any, Optional
 
+from .manifest import prepare_manifest
+from .query_log import fetch_query_metrics
+
 # Points to the dbt project path
 dbt_project_directory = Path(__file__).absolute().parent
 dbt_project = DbtProject(
     project_dir=dbt_project_directory,
     profiles_dir=dbt_project_directory.parent / "profiles",
+    target_path=Path(os.getenv("DBT_TARGET_PATH", "target")),
 )
 
 # References the dbt project object
 dbt_resource = DbtCliResource(project_dir=dbt_project)
 
-# Compiles the dbt project & allow Dagster to build an asset graph
-dbt_project.prepare_if_dev()
+# Reuses the manifest prebuilt in the image, re-parses (once, under a file lock) when the project changed
+prepare_manifest(dbt_project.project_dir, dbt_project.profiles_dir, dbt_project.target_path)
+
+
+# Raw sources maintained by ClickHouse from another raw table, mapped to the asset loading that table.
+# They keep their own asset key, the models reading them depend on the parent table's asset instead.
+DERIVED_SOURCES = {
+    "statistics_hourly": "statistics",
+    "statistics_daily": "statistics",
+    "statistics_meta_dict": "statistics_meta",
+    "event_types_dict": "event_types",
+}
+
+# Models build as soon as an upstream raw partition (or model) materializes, once
+# nothing upstream is still running; raw partitions never loaded or purged don't block
+dbt_automation_condition = (
+    dg.AutomationCondition.eager()
+    .without(~dg.AutomationCondition.any_deps_missing())
+    .with_label("eager_after_raw_loads")
+)
 
 
 class CustomDagsterDbtTranslator(DagsterDbtTranslator):
     def get_asset_key(self, dbt_resource_props: Mapping[str, Any]) -> dg.AssetKey:
+        # Sources are the raw tables written by the hass assets, so models depend on them
+        if dbt_resource_props["resource_type"] == "source":
+            return dg.AssetKey(["hass", dbt_resource_props["name"]])
         return super().get_asset_key(dbt_resource_props).with_prefix("dbt")
+    def get_asset_spec(self, manifest: Mapping[str, Any], unique_id: str, project: Optional[DbtProject]) -> dg.AssetSpec:
+        # Derived sources never materialize, so point their dependents at the asset loading the parent table
+        spec = super().get_asset_spec(manifest, unique_id, project)
+        deps = {}
+        for dep in spec.deps:
+            key = dep.asset_key
+            if key.has_prefix(["hass"]) and key.path[-1] in DERIVED_SOURCES:
+                key = dg.AssetKey(["hass", DERIVED_SOURCES[key.path[-1]]])
+            deps.setdefault(key, dg.AssetDep(key, partition_mapping=dep.partition_mapping))
+        return spec.replace_attributes(deps=list(deps.values()))
     def get_group_name(self, dbt_resource_props: Mapping[str, Any]) -> Optional[str]:
         return "dbt"
+    def get_automation_condition(self, dbt_resource_props: Mapping[str, Any]) -> Optional[dg.AutomationCondition]:
+        return dbt_automation_condition
+
+
+def with_query_metrics(event, log=None):
+    """
+    Add the query_log metrics of a model to its Output/AssetMaterialization.
+
+    The event is emitted once the model finished, so its queries are in the
+    query log already and one lookup of that node is enough.
+    """
+    if not isinstance(event, (dg.Output, dg.AssetMaterialization)):
+        return event
+    metadata = event.metadata or {}
+    unique_id, invocation_id = (getattr(metadata.get(key), "value", metadata.get(key)) for key in ("unique_id", "invocation_id"))
+    if not unique_id or not invocation_id:
+        return event
+    metrics = fetch_query_metrics(invocation_id, node_id=unique_id, log=log).get(unique_id)
+    if not metrics:
+        return event
+    return event.with_metadata({**metadata, **metrics})
 
 
-# Yields Dagster events streamed from the dbt CLI
+# Yields Dagster events from the dbt CLI as they arrive, with each model's ClickHouse query cost
 @dbt_assets(manifest=dbt_project.manifest_path, dagster_dbt_translator=CustomDagsterDbtTranslator())
 def dbt_models(context: dg.AssetExecutionContext, dbt: DbtCliResource):
-    yield from dbt.cli(["build"], context=context).stream()
+    for event in dbt.cli(["build"], context=context).stream():
+        yield with_query_metrics(event, log=context.log)
 
 
-# Builds a daily refresh schedule
-dbt_schedule = build_schedule_from_dbt_selection(
-    [dbt_models],
-    job_name="materialize_dbt_models",
-    cron_schedule="30 0 * * *",
-    execution_timezone="America/Los_Angeles",
-    dbt_select="fqn:*"
+# Evaluates the models' automation conditions, requesting only the models whose inputs changed
+dbt_automation_sensor = dg.AutomationConditionSensorDefinition(
+    name="dbt_automation_sensor",
+    target=dg.AssetSelection.assets(dbt_models),
+    default_status=dg.DefaultSensorStatus.RUNNING,
+    minimum_interval_seconds=60,
+    description="Builds dbt models once the raw assets they read from have materialized",
 )
 
 
@@ -45,5 +103,5 @@ dbt_schedule = build_schedule_from_dbt_selection(
 dbt_defs = dg.Definitions(
     assets=[dbt_models],
     resources={"dbt": dbt_resource},
-    schedules=[dbt_schedule]
+    sensors=[dbt_automation_sensor]
 )
@@ -0,0 +1,9 @@
+{#- Tags every query dbt sends with the invocation and node, so their cost can
+    be looked up per model in ClickHouse's system.query_log afterwards -#}
+{% macro hass_query_comment(node) %}
+    {%- set comment = {"app": "dbt", "invocation_id": invocation_id} -%}
+    {%- if node is not none -%}
+        {%- do comment.update({"node_id": node.unique_id}) -%}
+    {%- endif -%}
+    {{- return(tojson(comment)) -}}
+{% endmacro %}
@@ -0,0 +1,133 @@
+"""
+Prebuilt dbt manifest with change detection.
+
+The manifest is parsed when the image is built (`python manifest.py`) and
+stored next to a fingerprint of the files it was parsed from. Code-location
+loads reuse it, and re-parse the project only when there's no manifest yet
+(e.g. a fresh local checkout) or the fingerprint changed (e.g. models edited
+in the mounted source tree). The parse holds a file lock and re-checks the
+fingerprint once it has it, so concurrent processes loading the code
+location parse a changed project once.
+
+This module is imported by `definitions.py` and also runs as a standalone script
+during `docker build`, so it only depends on the standard library and filelock.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import subprocess
+from importlib.metadata import PackageNotFoundError, version
+from pathlib import Path
+
+from filelock import FileLock
+
+logger = logging.getLogger(__name__)
+
+FINGERPRINT_FILE = "manifest.fingerprint.json"
+LOCK_FILE = "manifest.lock"
+
+# Everything `dbt parse` reads that can change the manifest
+FINGERPRINT_DIRS = ("models", "macros", "seeds", "snapshots", "tests", "analyses")
+FINGERPRINT_FILES = ("dbt_project.yml", "packages.yml", "dependencies.yml")
+
+
+def compute_fingerprint(project_dir: Path, profiles_dir: Path) -> str:
+    """
+    Hash the dbt project files, the profile and the dbt version.
+
+    Args:
+        project_dir: dbt project directory
+        profiles_dir: Directory containing profiles.yml
+
+    Returns:
+        Hex digest identifying the inputs of `dbt parse`
+    """
+    project_dir = Path(project_dir)
+    files = [project_dir / name for name in FINGERPRINT_FILES]
+    for dirname in FINGERPRINT_DIRS:
+        files.extend(p for p in (project_dir / dirname).rglob("*") if p.is_file())
+    files.append(Path(profiles_dir) / "profiles.yml")
+
+    digest = hashlib.sha256()
+    for path in sorted(p for p in files if p.is_file()):
+        digest.update(os.path.relpath(path, project_dir).encode())
+        digest.update(b"\0")
+        digest.update(path.read_bytes())
+        digest.update(b"\0")
+
+    # The dbt version changes the manifest's format
+    try:
+        dbt_version = version("dbt-core")
+    except PackageNotFoundError:
+        dbt_version = "unknown"
+    digest.update(f"dbt-core=={dbt_version}".encode())
+
+    return digest.hexdigest()
+
+
+def read_fingerprint(target_path: Path) -> str | None:
+    """
+    Read the fingerprint stored next to a previously parsed manifest.
+    """
+    fingerprint_path = Path(target_path) / FINGERPRINT_FILE
+    if not (Path(target_path) / "manifest.json").exists() or not fingerprint_path.exists():
+        return None
+    try:
+        return json.loads(fingerprint_path.read_text()).get("fingerprint")
+    except (OSError, ValueError):
+        return None
+
+
+def prepare_manifest(project_dir: Path, profiles_dir: Path, target_path: Path) -> Path:
+    """
+    Make sure the manifest matches the project, parsing it only if it's missing or changed.
+
+    Args:
+        project_dir: dbt project directory
+        profiles_dir: Directory containing profiles.yml
+        target_path: dbt target directory holding manifest.json, relative to the project like for dbt
+
+    Returns:
+        Path to manifest.json
+    """
+    target_path = Path(project_dir) / target_path
+    manifest_path = target_path / "manifest.json"
+    fingerprint = compute_fingerprint(project_dir, profiles_dir)
+    if read_fingerprint(target_path) == fingerprint:
+        return manifest_path
+
+    target_path.mkdir(parents=True, exist_ok=True)
+    with FileLock(target_path / LOCK_FILE):
+        # Another process may have parsed it while this one waited for the lock
+        if read_fingerprint(target_path) == fingerprint:
+            return manifest_path
+
+        logger.info(f"dbt project changed or not parsed yet, running dbt parse into {target_path}")
+        subprocess.run(
+            [
+                "dbt", "--quiet", "parse",
+                "--project-dir", str(project_dir),
+                "--profiles-dir", str(profiles_dir),
+                "--target-path", str(target_path),
+            ],
+            check=True,
+        )
+
+        # Write atomically so readers never see a half written fingerprint
+        tmp_path = target_path / f"{FINGERPRINT_FILE}.tmp"
+        tmp_path.write_text(json.dumps({"fingerprint": fingerprint}))
+        os.replace(tmp_path, target_path / FINGERPRINT_FILE)
+
+    return manifest_path
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    project_dir = Path(__file__).absolute().parent
+    prepare_manifest(
+        project_dir=project_dir,
+        profiles_dir=Path(os.getenv("DBT_PROFILES_DIR", project_dir.parent / "profiles")),
+        target_path=Path(os.getenv("DBT_TARGET_PATH", "target")),
+    )
@@ -1,7 +1,11 @@
+-- depends_on: {{ source('raw', 'event_types_dict') }}
+{{ config(pre_hook="system reload dictionary raw.event_types_dict") }}
+
 select
     e.time_fired_at_local as event_time
 
-    , et.event_type
+    -- denormalized at extraction, the dictionary only resolves rows loaded before
+    , if(e.event_type is null, dictGetOrNull('raw.event_types_dict', 'event_type', assumeNotNull(e.event_type_id)), e.event_type) as event_type
 
     , ed.domain
     , ed.service
@@ -16,7 +20,4 @@ select
 from {{ ref('stg_events') }} as e
 
 left outer join {{ ref('stg_event_data') }} as ed
-on e.data_id = ed.id
-
-left outer join {{ ref('stg_event_types') }} as et
-on e.event_type_id = et.id
\ No newline at end of file
+on e.data_id = ed.id
\ No newline at end of file
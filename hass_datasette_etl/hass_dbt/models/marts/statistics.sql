@@ -1,8 +1,12 @@
+-- depends_on: {{ source('raw', 'statistics_meta_dict') }}
+{{ config(pre_hook="system reload dictionary raw.statistics_meta_dict") }}
+
 select
     s.id
     , s.created_at_local as created_at
-    , m.entity_id
-    , m.uom
+    -- denormalized at extraction, the dictionary only resolves rows loaded before
+    , if(s.entity_id is null, dictGetOrNull('raw.statistics_meta_dict', 'entity_id', assumeNotNull(s.metadata_id)), s.entity_id) as entity_id
+    , if(s.uom is null, dictGetOrNull('raw.statistics_meta_dict', 'uom', assumeNotNull(s.metadata_id)), s.uom) as uom
     , s.start_at_local as start_at
     , s.mean
     , s.min
@@ -11,7 +15,4 @@ select
     , s.last_reset_at_local as last_reset_at
     , s.state
 
-from {{ ref('int_statistics') }} as s
-
-left outer join {{ ref('int_statistics_meta') }} as m
-on s.metadata_id = m.id
\ No newline at end of file
+from {{ ref('int_statistics') }} as s
\ No newline at end of file
@@ -0,0 +1,15 @@
+-- depends_on: {{ source('raw', 'statistics_meta_dict') }}
+{{ config(materialized='view') }}
+
+select
+    r.metadata_id
+    , dictGetOrNull('raw.statistics_meta_dict', 'entity_id', r.metadata_id) as entity_id
+    , dictGetOrNull('raw.statistics_meta_dict', 'uom', r.metadata_id) as uom
+    , toTimezone(r.bucket_start, 'America/Los_Angeles') as hour_start
+    , r.samples
+    , r.min
+    , r.max
+    , r.mean
+    , r.last_sum
+
+from {{ ref('stg_statistics_hourly') }} as r
\ No newline at end of file
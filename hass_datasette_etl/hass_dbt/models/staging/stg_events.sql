@@ -5,6 +5,7 @@ select
     , toTimezone(time_fired_at_utc, 'America/Los_Angeles') as time_fired_at_local
     , toUInt32OrNull(trim(simpleJSONExtractRaw(e.data_id, 'value'))) as data_id
     , toUInt32OrNull(trim(simpleJSONExtractRaw(e.event_type_id, 'value'))) as event_type_id
+    , nullIf(e.event_type, '') as event_type
     , e.loaded_at
 
 from {{ source('raw', 'events') }} as e
@@ -15,6 +15,8 @@ select
     , toTimezone(last_reset_at_utc, 'America/Los_Angeles') as last_reset_at_local
     , toFloat64OrNull(s.state) as state
     , toFloat64OrNull(s.sum) as sum
+    , nullIf(s.entity_id, '') as entity_id
+    , nullIf(s.uom, '') as uom
     , s.loaded_at
 
 from {{ source('raw', 'statistics') }} as s
@@ -0,0 +1,14 @@
+select
+    r.metadata_id
+    , r.bucket_start
+    , count() as samples
+    , min(r.min) as min
+    , max(r.max) as max
+    , avg(r.mean) as mean
+    , argMax(r.sum, r.start_ts) as last_sum
+
+from {{ source('raw', 'statistics_hourly') }} as r
+
+final
+
+group by r.metadata_id, r.bucket_start
\ No newline at end of file
@@ -0,0 +1,65 @@
+"""
+Per-model query cost from ClickHouse's `system.query_log`.
+
+Every query dbt sends carries a comment with the invocation id and the node's
+unique id (see `macros/query_comment.sql`). As soon as a model finishes, the
+finished queries of that node in the invocation are summed and attached to
+the model's materialization, so regressions show up as metadata plots on the
+dbt assets.
+"""
+
+from ..io_managers import get_clickhouse_client, get_clickhouse_config
+
+# Cost of the finished queries of one invocation per node, memory is the peak of any query
+QUERY_METRICS_SQL = """
+select
+    extract(query, '"node_id": *"([^"]+)"') as node_id
+    , count() as queries
+    , sum(query_duration_ms) as query_duration_ms
+    , sum(read_rows) as read_rows
+    , sum(read_bytes) as read_bytes
+    , sum(written_rows) as written_rows
+    , max(memory_usage) as peak_memory_usage
+from system.query_log
+where type = 'QueryFinish'
+    and event_date >= yesterday()
+    and position(query, %(invocation_id)s) > 0
+    and node_id != ''
+    and (%(node_id)s = '' or node_id = %(node_id)s)
+group by node_id
+"""
+
+
+def fetch_query_metrics(invocation_id: str, node_id: str | None = None, log=None) -> dict[str, dict]:
+    """
+    Cost of every node's queries in one dbt invocation, or of one node's.
+
+    Args:
+        invocation_id: dbt invocation id, from the event metadata or run_results.json
+        node_id: Only this node's queries, e.g. `model.hass_dbt.statistics`
+        log: Optional logger, failures are logged rather than raised
+
+    Returns:
+        Dict of node unique id to `clickhouse/<metric>` metadata
+    """
+    client = get_clickhouse_client(get_clickhouse_config())
+    try:
+        # The query log is written asynchronously, make sure the build's queries are in
+        client.execute("system flush logs")
+        rows, columns = client.execute(
+            QUERY_METRICS_SQL, {"invocation_id": invocation_id, "node_id": node_id or ""}, with_column_types=True
+        )
+    except Exception as e:
+        if log:
+            log.warning(f"Could not read query metrics from system.query_log: {e}")
+        return {}
+    finally:
+        client.disconnect()
+
+    names = [name for name, _ in columns]
+    metrics = {}
+    for row in rows:
+        record = dict(zip(names, row))
+        node_id = record.pop("node_id")
+        metrics[node_id] = {f"clickhouse/{key}": int(value) for key, value in record.items()}
+    return metrics
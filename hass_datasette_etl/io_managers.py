@@ -1,7 +1,25 @@
 import os
+import time
+import queue
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, ClassVar
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import snowflake.connector
+from clickhouse_driver import Client
+from dagster import Failure, InitResourceContext, InputContext, IOManager, OutputContext, io_manager
 from clickhouse_io_manager import ClickHousePandasIOManager, ClickHouseConfig
 from dagster_snowflake_pandas import SnowflakePandasIOManager
 
+from .clickhouse_schema import ensure_table_objects
+from .snowflake_stage import SnowflakeStageLoader
+from .streaming import ChunkStream
+
 # ---------------------------------------------------------------------
 # ClickHouse IO manager
 # ---------------------------------------------------------------------
@@ -17,7 +35,90 @@ def get_clickhouse_config():
         database=os.getenv("CLICKHOUSE_DB", "default"),
     )
 
-clickhouse_io_manager = ClickHousePandasIOManager(
+
+def get_clickhouse_client(config: ClickHouseConfig) -> Client:
+    """
+    Create a native ClickHouse client from a ClickHouse config.
+    """
+    return Client(
+        host=config.host,
+        port=config.port,
+        user=config.user,
+        password=config.password,
+        database=config.database,
+    )
+
+
+def insert_chunk(client: Client, table: str, chunk: pd.DataFrame) -> int:
+    """
+    Insert one chunk into a ClickHouse table, naming the columns explicitly.
+
+    Returns:
+        Number of rows inserted
+    """
+    if chunk.empty:
+        return 0
+    columns = ", ".join(f"`{col}`" for col in chunk.columns)
+    client.execute(f"INSERT INTO {table} ({columns}) VALUES", chunk.itertuples(index=False, name=None))
+    return len(chunk)
+
+
+class ClickHouseStreamingIOManager(ClickHousePandasIOManager):
+    """
+    ClickHouse IO manager that also accepts a ChunkStream.
+
+    DataFrames go through the regular pandas IO manager. A ChunkStream is
+    inserted chunk by chunk as it is produced, so memory stays flat however
+    large the partition is. Re-inserted rows are collapsed by the
+    ReplacingMergeTree tables, there's no delete of the partition first.
+    """
+
+    supports_streaming: ClassVar[bool] = True
+
+    def handle_output(self, context: OutputContext, obj) -> None:
+        metadata = context.definition_metadata or {}
+        table = f"{metadata.get('schema', self.config.database)}.{metadata.get('table', context.asset_key.path[-1])}"
+
+        if not isinstance(obj, ChunkStream):
+            super().handle_output(context, obj)
+            self._ensure_table_objects(context, table)
+            return
+
+        client = get_clickhouse_client(self.config)
+        try:
+            for chunk in obj:
+                insert_chunk(client, table, chunk)
+                context.log.debug(f"Inserted {len(chunk)} rows into {table}, {obj.num_rows} so far")
+        finally:
+            client.disconnect()
+
+        self._ensure_table_objects(context, table)
+        context.add_output_metadata({**obj.metadata, "destination_table": table})
+
+    def _ensure_table_objects(self, context: OutputContext, table: str) -> None:
+        """
+        Add the skip indexes and projections declared for the table, once per process.
+        """
+        if table in _ensured_tables:
+            return
+        client = get_clickhouse_client(self.config)
+        try:
+            statements = ensure_table_objects(client.execute, table)
+            if statements:
+                context.log.debug(f"Ensured indexes and projections of {table}")
+        except Exception as e:
+            # Only an optimization, never fail the load over it
+            context.log.warning(f"Could not add indexes/projections to {table}: {e}")
+        finally:
+            client.disconnect()
+        _ensured_tables.add(table)
+
+
+# Tables whose declared indexes and projections were checked by this process
+_ensured_tables = set()
+
+
+clickhouse_io_manager = ClickHouseStreamingIOManager(
     config=get_clickhouse_config()
 )
 
@@ -32,4 +133,363 @@ snowflake_io_manager = SnowflakePandasIOManager(
     schema=os.getenv("SNOWFLAKE_SCHEMA", "raw"),
     warehouse=os.getenv("SNOWFLAKE_WAREHOUSE"),
     role=os.getenv("SNOWFLAKE_ROLE"),
-)
\ No newline at end of file
+)
+
+# ---------------------------------------------------------------------
+# Snowflake stage-and-COPY IO manager
+# ---------------------------------------------------------------------
+# Run tag Dagster sets on every run launched by a backfill
+BACKFILL_TAG = "dagster/backfill"
+
+
+def get_snowflake_connection():
+    """
+    Open a Snowflake connection using environment variables.
+    """
+    return snowflake.connector.connect(
+        account=os.getenv("SNOWFLAKE_ACCOUNT"),
+        user=os.getenv("SNOWFLAKE_USER"),
+        password=os.getenv("SNOWFLAKE_PASSWORD"),
+        database=os.getenv("SNOWFLAKE_DATABASE"),
+        schema=os.getenv("SNOWFLAKE_SCHEMA", "raw"),
+        warehouse=os.getenv("SNOWFLAKE_WAREHOUSE"),
+        role=os.getenv("SNOWFLAKE_ROLE"),
+    )
+
+
+snowflake_stage_loader = SnowflakeStageLoader(
+    connect=get_snowflake_connection,
+    spool_dir=Path(os.getenv("SNOWFLAKE_SPOOL_DIR", Path(os.getenv("DAGSTER_HOME", "/app/dagster_home")) / "snowflake_spool")),
+    batch_files=int(os.getenv("SNOWFLAKE_COPY_BATCH_FILES", "50")),
+)
+
+
+class SnowflakeStageIOManager(IOManager):
+    """
+    Spools outputs as Parquet and bulk loads them with PUT + COPY INTO.
+
+    Runs outside a backfill flush right away. Backfill runs only spool, and a
+    table is flushed once `batch_files` partitions are pending or the oldest
+    has waited `max_pending_age`. Anything left at the end of a backfill is
+    loaded by the next run or `snowflake_stage_flush_job`. Loads append, rows
+    are deduplicated downstream by id/loaded_at as for ClickHouse.
+
+    Write-only: pending rows may not be loaded yet, so the fan-out IO manager
+    serves inputs from another destination.
+    """
+
+    supports_streaming = True
+    write_only = True
+
+    def __init__(self, loader: SnowflakeStageLoader):
+        self.loader = loader
+
+    def handle_output(self, context: OutputContext, obj: pd.DataFrame | ChunkStream) -> None:
+        schema = (context.definition_metadata or {}).get("schema", os.getenv("SNOWFLAKE_SCHEMA", "raw"))
+        table = context.asset_key.path[-1]
+        partition_key = context.partition_key if context.has_partition_key else None
+
+        chunks = obj if isinstance(obj, ChunkStream) else [obj]
+        path, num_rows = self.loader.spool_chunks(chunks, schema, table, partition_key)
+        metadata = {"num_rows": num_rows, "spooled_file": str(path)}
+
+        in_backfill = BACKFILL_TAG in context.step_context.dagster_run.tags
+        if partition_key is None or not in_backfill or self.loader.should_flush(schema, table):
+            result = self.loader.flush(schema, table, log=context.log)
+            metadata.update({"flushed_files": result["files"], "rows_loaded": result["rows_loaded"]})
+        else:
+            metadata["pending_files"] = len(self.loader.pending(schema, table))
+
+        context.add_output_metadata(metadata)
+
+    def load_input(self, context: InputContext):
+        raise Failure(
+            description=(
+                f"snowflake_stage_io_manager is write-only and can't load {context.asset_key.to_user_string()}: "
+                "spooled partitions may not be copied into Snowflake yet. Use it through warehouse_io_manager "
+                "with a readable destination (e.g. clickhouse_io_manager) in WAREHOUSE_DESTINATIONS, "
+                "or read the table with the snowflake resource."
+            )
+        )
+
+
+@io_manager
+def snowflake_stage_io_manager(init_context: InitResourceContext) -> SnowflakeStageIOManager:
+    """
+    Batched stage-and-COPY Snowflake destination, for use in WAREHOUSE_DESTINATIONS.
+    """
+    return SnowflakeStageIOManager(snowflake_stage_loader)
+
+# ---------------------------------------------------------------------
+# Fan-out IO manager
+# ---------------------------------------------------------------------
+# IO manager resource keys every extracted frame is written to, the first
+# readable (not write-only) one also serves downstream loads
+WAREHOUSE_DESTINATIONS = [
+    key.strip() for key in os.getenv("WAREHOUSE_DESTINATIONS", "clickhouse_io_manager").split(",") if key.strip()
+]
+
+
+class _DestinationOutputContext:
+    """
+    OutputContext proxy that keeps a destination's output metadata separate,
+    so destinations writing concurrently can't clash on the same keys.
+    """
+
+    def __init__(self, context: OutputContext):
+        self._context = context
+        self.metadata = {}
+
+    def add_output_metadata(self, metadata: dict) -> None:
+        self.metadata.update(metadata)
+
+    def __getattr__(self, name):
+        return getattr(self._context, name)
+
+
+class _QueueChunks:
+    """
+    Iterable over the chunks a fan-out producer puts on one destination's queue.
+    """
+
+    _DONE = object()
+
+    def __init__(self, maxsize: int = 2):
+        self.queue = queue.Queue(maxsize=maxsize)
+        # Set once the destination stopped consuming, the producer then skips it
+        self.closed = threading.Event()
+
+    def put(self, item) -> None:
+        while not self.closed.is_set():
+            try:
+                self.queue.put(item, timeout=1)
+                return
+            except queue.Full:
+                continue
+
+    def finish(self, error: BaseException | None = None) -> None:
+        self.put(error if error is not None else self._DONE)
+
+    def __iter__(self):
+        while True:
+            item = self.queue.get()
+            if item is self._DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+
+class _StreamSpool:
+    """
+    Second copy of a fan-out stream, failed destinations are retried from it.
+
+    Streams that can replay themselves (`ChunkStream.replay`, e.g. from the
+    landing zone) aren't copied, the others are appended to a temporary zstd
+    Parquet file while they are teed. Replays wait until the source is
+    exhausted, and raise the source's error if it failed.
+    """
+
+    SPOOL_FILE = "spool.parquet"
+
+    def __init__(self, replay: Callable | None = None):
+        self._replay = replay
+        self._dir = None if replay is not None else Path(tempfile.mkdtemp(prefix="hass-fanout-"))
+        self._writer = None
+        self._error = None
+        self._done = threading.Event()
+
+    def write(self, chunk: pd.DataFrame) -> None:
+        if self._dir is None or self._error is not None:
+            return
+        try:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self._dir / self.SPOOL_FILE, table.schema, compression="zstd")
+            self._writer.write_table(table)
+        except Exception as e:
+            # Losing the spool only loses the retries, the first attempt carries on
+            self._error = e
+
+    def finish(self, error: BaseException | None = None) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        if error is not None:
+            self._error = error
+        self._done.set()
+
+    def replay(self) -> ChunkStream:
+        self._done.wait()
+        if self._error is not None:
+            raise self._error
+        if self._replay is not None:
+            return ChunkStream(self._replay())
+        path = self._dir / self.SPOOL_FILE
+        if not path.exists():
+            return ChunkStream([])
+        # One row group per spooled chunk, so the replay has the original chunks
+        parquet_file = pq.ParquetFile(path)
+        return ChunkStream(parquet_file.read_row_group(i).to_pandas() for i in range(parquet_file.num_row_groups))
+
+    def cleanup(self) -> None:
+        if self._dir is not None:
+            shutil.rmtree(self._dir, ignore_errors=True)
+
+
+class FanOutIOManager(IOManager):
+    """
+    Writes one asset output to several IO managers concurrently.
+
+    The asset extracts from Datasette once and every destination receives the
+    same frame. Each destination is retried on its own, and its status, latency,
+    attempts and own metadata are recorded under a `<destination>/` prefix.
+
+    A ChunkStream is teed through small bounded queues, so destinations consume
+    the chunks in lockstep and memory stays flat. Destinations that can't
+    stream receive the concatenated frame. A destination failing mid-stream is
+    retried once the source is exhausted, from the stream's replay (the landed
+    partition) or else from a local spool written while teeing, so a transient
+    error doesn't re-fetch the partition.
+
+    Inputs are loaded from the first destination that isn't write-only.
+    """
+
+    def __init__(self, destinations: dict[str, IOManager], max_retries: int = 2, retry_delay: float = 5.0):
+        if not destinations:
+            raise ValueError("FanOutIOManager needs at least one destination")
+        self.destinations = destinations
+        self.input_destination = next(
+            (name for name, manager in destinations.items() if not getattr(manager, "write_only", False)), None
+        )
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+
+    def _write(self, name: str, manager: IOManager, context: OutputContext, obj, retry: Callable | None = None) -> dict:
+        """
+        Write to one destination, getting the object of each retry from `retry` (no retries without it).
+        """
+        attempts = 0
+        start = time.monotonic()
+        while True:
+            attempts += 1
+            destination_context = _DestinationOutputContext(context)
+            try:
+                if isinstance(obj, _QueueChunks):
+                    try:
+                        self._handle_stream(manager, destination_context, ChunkStream(obj))
+                    finally:
+                        obj.closed.set()
+                elif isinstance(obj, ChunkStream):
+                    self._handle_stream(manager, destination_context, obj)
+                else:
+                    # Shallow copy so a destination renaming/adding columns can't affect the others
+                    manager.handle_output(destination_context, obj.copy(deep=False) if isinstance(obj, pd.DataFrame) else obj)
+                return {
+                    "status": "success",
+                    "attempts": attempts,
+                    "latency_s": round(time.monotonic() - start, 3),
+                    "metadata": destination_context.metadata,
+                }
+            except Exception as e:
+                if attempts > self.max_retries or retry is None:
+                    context.log.error(f"Writing to {name} failed after {attempts} attempts: {e}")
+                    return {
+                        "status": "failed",
+                        "attempts": attempts,
+                        "latency_s": round(time.monotonic() - start, 3),
+                        "error": repr(e),
+                        "metadata": destination_context.metadata,
+                    }
+                delay = self.retry_delay * 2 ** (attempts - 1)
+                context.log.warning(f"Writing to {name} failed (attempt {attempts}), retrying in {delay}s: {e}")
+                time.sleep(delay)
+                try:
+                    obj = retry()
+                except Exception as replay_error:
+                    context.log.error(f"Can't retry writing to {name}, the output can't be replayed: {replay_error}")
+                    return {
+                        "status": "failed",
+                        "attempts": attempts,
+                        "latency_s": round(time.monotonic() - start, 3),
+                        "error": repr(e),
+                        "metadata": destination_context.metadata,
+                    }
+
+    @staticmethod
+    def _handle_stream(manager: IOManager, context: _DestinationOutputContext, stream: ChunkStream) -> None:
+        manager.handle_output(context, stream if getattr(manager, "supports_streaming", False) else stream.to_frame())
+
+    def handle_output(self, context: OutputContext, obj) -> None:
+        source_error = None
+        spool = None
+        with ThreadPoolExecutor(max_workers=len(self.destinations)) as pool:
+            if isinstance(obj, ChunkStream):
+                spool = _StreamSpool(obj.replay) if self.max_retries > 0 else None
+                feeds = {name: _QueueChunks() for name in self.destinations}
+                futures = {
+                    name: pool.submit(
+                        self._write, name, manager, context, feeds[name], spool.replay if spool else None
+                    )
+                    for name, manager in self.destinations.items()
+                }
+                # Pull each chunk from the source once and hand it to every destination (and the spool)
+                try:
+                    for chunk in obj:
+                        if spool:
+                            spool.write(chunk)
+                        for feed in feeds.values():
+                            feed.put(chunk)
+                except Exception as e:
+                    source_error = e
+                if spool:
+                    spool.finish(source_error)
+                for feed in feeds.values():
+                    feed.finish(source_error)
+            else:
+                futures = {
+                    name: pool.submit(self._write, name, manager, context, obj, lambda: obj)
+                    for name, manager in self.destinations.items()
+                }
+            try:
+                results = {name: future.result() for name, future in futures.items()}
+            finally:
+                if spool:
+                    spool.cleanup()
+
+        if source_error is not None:
+            raise source_error
+
+        metadata = dict(obj.metadata) if isinstance(obj, ChunkStream) else {}
+        for name, result in results.items():
+            metadata[f"{name}/status"] = result["status"]
+            metadata[f"{name}/latency_s"] = result["latency_s"]
+            metadata[f"{name}/attempts"] = result["attempts"]
+            if "error" in result:
+                metadata[f"{name}/error"] = result["error"]
+            metadata.update({f"{name}/{key}": value for key, value in result["metadata"].items()})
+        context.add_output_metadata(metadata)
+
+        failed = [name for name, result in results.items() if result["status"] != "success"]
+        if failed:
+            raise Failure(description=f"Writing to {', '.join(failed)} failed", metadata=metadata)
+
+    def load_input(self, context: InputContext):
+        if self.input_destination is None:
+            raise Failure(
+                description=(
+                    f"Every destination of warehouse_io_manager ({', '.join(self.destinations)}) is write-only, "
+                    f"add a readable one to WAREHOUSE_DESTINATIONS to load {context.asset_key.to_user_string()}"
+                )
+            )
+        return self.destinations[self.input_destination].load_input(context)
+
+
+@io_manager(required_resource_keys=set(WAREHOUSE_DESTINATIONS))
+def warehouse_io_manager(init_context: InitResourceContext) -> FanOutIOManager:
+    """
+    Fan-out IO manager writing to every IO manager listed in WAREHOUSE_DESTINATIONS.
+    """
+    return FanOutIOManager(
+        destinations={key: getattr(init_context.resources, key) for key in WAREHOUSE_DESTINATIONS},
+        max_retries=int(os.getenv("WAREHOUSE_MAX_RETRIES", "2")),
+    )
@@ -0,0 +1,162 @@
+"""
+Maintenance jobs for the warehouse destinations.
+"""
+
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from dagster import AssetObservation, AssetRecordsFilter, OpExecutionContext, ScheduleDefinition, job, op
+
+from .assets.events import events
+from .assets.statistics import statistics
+from .assets.states import states
+from .assets.utils import HASS_PARTITION_GRAIN
+from .clickhouse_schema import declared_tables, ensure_table_objects, materialize_table_objects, seed_statistics_rollups
+from .io_managers import get_clickhouse_client, get_clickhouse_config, snowflake_stage_loader
+
+
+@op
+def flush_snowflake_stage(context: OpExecutionContext):
+    """
+    Load every file still pending in the Snowflake spool with one COPY INTO per table.
+    """
+    results = snowflake_stage_loader.flush_all(log=context.log)
+    context.add_output_metadata({
+        "tables": len(results),
+        "files": sum(result["files"] for result in results.values()),
+        "rows_loaded": sum(result["rows_loaded"] for result in results.values()),
+    })
+
+
+##### snowflake stage flush job and schedule
+@job(description="Flushes partitions spooled for Snowflake, e.g. the tail of a backfill")
+def snowflake_stage_flush_job():
+    flush_snowflake_stage()
+
+
+snowflake_stage_flush_schedule = ScheduleDefinition(
+    name="hourly_snowflake_stage_flush_schedule",
+    cron_schedule="45 * * * *",
+    job=snowflake_stage_flush_job,
+    execution_timezone="America/Los_Angeles",
+    description="Hourly flush of the Snowflake spool, enable when snowflake_stage_io_manager is a destination"
+)
+
+@op
+def migrate_clickhouse_schema(context: OpExecutionContext):
+    """
+    Add the declared skip indexes and projections to the raw tables and build
+    them for the data already loaded.
+    """
+    client = get_clickhouse_client(get_clickhouse_config())
+    try:
+        statements = []
+        for table in declared_tables():
+            statements += ensure_table_objects(client.execute, table)
+            statements += materialize_table_objects(client.execute, table)
+            context.log.info(f"Scheduled index/projection materialization on {table}")
+    finally:
+        client.disconnect()
+
+    # Materializations are mutations, progress is in system.mutations
+    context.add_output_metadata({
+        "tables": len(declared_tables()),
+        "statements": "\n".join(statements),
+    })
+
+
+##### clickhouse schema migration job, run after changing clickhouse_schema.py
+@job(description="Adds and materializes the skip indexes and projections declared for the raw ClickHouse tables")
+def clickhouse_schema_migration_job():
+    migrate_clickhouse_schema()
+
+
+@op
+def reseed_statistics_rollups(context: OpExecutionContext):
+    """
+    Copy the raw statistics rows loaded before the rollup views existed into the rollups.
+    """
+    client = get_clickhouse_client(get_clickhouse_config())
+    try:
+        statements = seed_statistics_rollups(client.execute)
+    finally:
+        client.disconnect()
+    context.log.info(f"Seeded {len(statements)} statistics rollup tables")
+
+
+##### statistics rollup rebuild job, run to seed new rollup tables or resync them
+@job(description="Seeds the hourly/daily statistics rollups from all raw statistics rows")
+def statistics_rollup_rebuild_job():
+    reseed_statistics_rollups()
+
+
+# How each hourly metadata entry rolls up into the day, entries not listed are skipped
+ROLLUP_METADATA = {
+    "num_rows": sum,
+    "fetched_rows": sum,
+    "pages": sum,
+    "num_chunks": sum,
+    "min_id": min,
+    "max_id": max,
+    "page_size_max": max,
+}
+
+
+@op
+def rollup_partition_metadata(context: OpExecutionContext):
+    """
+    Roll up yesterday's hourly materialization metadata of the partitioned
+    assets into one `day/*` observation on the day's last partition.
+    """
+    day = (datetime.now(ZoneInfo("America/Los_Angeles")) - timedelta(days=1)).strftime("%Y-%m-%d")
+    for asset in (statistics, events, states):
+        partition_keys = [key for key in asset.partitions_def.get_partition_keys() if key.startswith(day)]
+        if not partition_keys:
+            continue
+        records = context.instance.fetch_materializations(
+            AssetRecordsFilter(asset_key=asset.key, asset_partitions=partition_keys),
+            limit=len(partition_keys) * 10,
+        ).records
+
+        # Newest first, only the latest materialization of a partition counts
+        values, seen = {}, set()
+        for record in records:
+            materialization = record.asset_materialization
+            if materialization is None or materialization.partition in seen:
+                continue
+            seen.add(materialization.partition)
+            for name, value in materialization.metadata.items():
+                if name in ROLLUP_METADATA and isinstance(value.value, (int, float)) and not isinstance(value.value, bool):
+                    values.setdefault(name, []).append(value.value)
+        totals = {f"day/{name}": ROLLUP_METADATA[name](entries) for name, entries in values.items()}
+
+        context.log_event(
+            AssetObservation(
+                asset_key=asset.key,
+                partition=partition_keys[-1],
+                metadata={"day/date": day, "day/partitions": len(seen), **totals},
+            )
+        )
+        context.log.info(f"Rolled up {len(seen)}/{len(partition_keys)} partitions of {asset.key.to_user_string()} for {day}")
+
+
+##### partition metadata rollup job and schedule, scheduled with hourly partitions only
+@job(description="Rolls up a day's hourly partition metadata into one observation per asset")
+def partition_metadata_rollup_job():
+    rollup_partition_metadata()
+
+
+partition_metadata_rollup_schedule = ScheduleDefinition(
+    name="daily_partition_metadata_rollup_schedule",
+    cron_schedule="30 1 * * *",
+    job=partition_metadata_rollup_job,
+    execution_timezone="America/Los_Angeles",
+    description="Daily rollup of yesterday's hourly partition metadata"
+)
+
+
+# Group jobs and schedules for export
+maintenance_jobs = [snowflake_stage_flush_job, clickhouse_schema_migration_job, statistics_rollup_rebuild_job, partition_metadata_rollup_job]
+maintenance_schedules = [snowflake_stage_flush_schedule]
+if HASS_PARTITION_GRAIN == "hourly":
+    maintenance_schedules.append(partition_metadata_rollup_schedule)
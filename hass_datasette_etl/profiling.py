@@ -0,0 +1,172 @@
+"""
+Opt-in sampling profiler for asset runs.
+
+Tag a run with `hass/profile=true` and every asset decorated with `profiled`
+samples the stacks of all threads of its process (the Datasette fetch
+threads included) while it runs, and saves a speedscope profile
+(https://www.speedscope.app) under `<DAGSTER_HOME>/storage/profiles/<run id>/`.
+The file's path is added to the materialization metadata as `profile`.
+
+Without the tag the decorator only reads the tag and calls the asset, so
+there's no overhead. Only the standard library is used, so standalone tools
+like `utils/sqlite_to_clickhouse.py` can load this file directly.
+"""
+
+import functools
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+
+# Run tag that turns the profiler on
+PROFILE_TAG = "hass/profile"
+
+# Seconds between samples
+PROFILE_INTERVAL = float(os.environ.get("HASS_PROFILE_INTERVAL", "0.005"))
+
+
+class SamplingProfiler:
+    """
+    Samples the Python stacks of all threads from a background thread.
+
+    Identical stacks are counted rather than stored, so memory depends on the
+    number of distinct stacks and not on how long the profiled code runs.
+
+    Args:
+        interval: Seconds between samples
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self._frames = {}
+        self._stacks = defaultdict(Counter)
+        self._thread_names = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self.started = None
+        self.duration = 0.0
+
+    def _frame_index(self, code) -> int:
+        key = (code.co_name, code.co_filename, code.co_firstlineno)
+        if key not in self._frames:
+            self._frames[key] = len(self._frames)
+        return self._frames[key]
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(self._frame_index(frame.f_code))
+                    frame = frame.f_back
+                self._stacks[thread_id][tuple(reversed(stack))] += 1
+            for thread in threading.enumerate():
+                self._thread_names.setdefault(thread.ident, thread.name)
+
+    def start(self) -> "SamplingProfiler":
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="hass-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self.started
+
+    @property
+    def num_samples(self) -> int:
+        return sum(sum(stacks.values()) for stacks in self._stacks.values())
+
+    def write_speedscope(self, path: Path, name: str) -> Path:
+        """
+        Save the samples as a speedscope file, one profile per thread.
+        """
+        frames = [
+            {"name": func, "file": file, "line": line}
+            for (func, file, line), _ in sorted(self._frames.items(), key=lambda item: item[1])
+        ]
+        profiles = []
+        for thread_id, stacks in sorted(self._stacks.items(), key=lambda item: -sum(item[1].values())):
+            weights = [count * self.interval for count in stacks.values()]
+            profiles.append({
+                "type": "sampled",
+                "name": self._thread_names.get(thread_id, str(thread_id)),
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": [list(stack) for stack in stacks],
+                "weights": weights,
+            })
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps({
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "hass_datasette_etl.profiling",
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": profiles,
+        }))
+        return path
+
+
+def profile_path(context) -> Path:
+    """
+    Where the profile of an asset run is saved, under the instance's storage directory.
+    """
+    name = context.asset_key.path[-1]
+    if context.has_partition_key:
+        name = f"{name}_{re.sub(r'[^0-9A-Za-z._-]', '_', context.partition_key)}"
+    return Path(context.instance.storage_directory()) / "profiles" / context.run_id / f"{name}.speedscope.json"
+
+
+def profiled(fn):
+    """
+    Profile an asset when its run is tagged with `hass/profile=true`.
+
+    Works for assets that return a value and for generator assets. For
+    generators, the IO manager's work on a yielded output (e.g. consuming a
+    ChunkStream) runs before the generator resumes and is profiled too.
+    """
+    @functools.wraps(fn)
+    def wrapper(context, *args, **kwargs):
+        if context.run.tags.get(PROFILE_TAG) != "true":
+            return fn(context, *args, **kwargs)
+
+        path = profile_path(context)
+        context.add_output_metadata({"profile": str(path)})
+        profiler = SamplingProfiler().start()
+        try:
+            result = fn(context, *args, **kwargs)
+        except BaseException:
+            _save_profile(profiler, path, context)
+            raise
+        if not hasattr(result, "__next__"):
+            _save_profile(profiler, path, context)
+            return result
+        return _profile_generator(result, profiler, path, context)
+
+    return wrapper
+
+
+def _profile_generator(generator, profiler: SamplingProfiler, path: Path, context):
+    try:
+        yield from generator
+    finally:
+        _save_profile(profiler, path, context)
+
+
+def _save_profile(profiler: SamplingProfiler, path: Path, context) -> None:
+    profiler.stop()
+    profiler.write_speedscope(path, name=f"{context.asset_key.to_user_string()} {context.run_id}")
+    context.log.info(
+        f"Saved profile of {profiler.num_samples} samples over {profiler.duration:.1f}s to {path}"
+    )
@@ -0,0 +1,255 @@
+"""
+Partition reconciliation between Datasette and ClickHouse.
+
+Instead of re-downloading partitions to check them, row count and min/max id
+are aggregated per hour on both sides and rolled up into the daily (or
+hourly) partitions with the same bounds the assets fetch with. Datasette is
+queried once per month, ClickHouse once per table for all months, so a pass
+reads each raw table once.
+
+`partition_reconciliation_job` compares every table and records the
+mismatched partitions in its output metadata. Once it succeeds,
+`reconciliation_repair_sensor` re-materializes only those partitions, tagged
+to bypass the change probe.
+
+Home Assistant purges old recorder rows, so only days Datasette still fully
+holds are compared; history kept only in ClickHouse is left alone.
+"""
+
+from collections import defaultdict
+import numpy as np
+import pandas as pd
+from dagster import (
+    DagsterEventType,
+    DagsterRunStatus,
+    DefaultSensorStatus,
+    MetadataValue,
+    OpExecutionContext,
+    RunRequest,
+    RunStatusSensorContext,
+    ScheduleDefinition,
+    job,
+    op,
+    run_status_sensor,
+)
+
+from .assets.events import events, events_job
+from .assets.statistics import statistics, statistics_job
+from .assets.states import states, states_job
+from .assets.utils import FORCE_REFRESH_TAG, partition_bounds, query_datasette
+from .io_managers import get_clickhouse_client, get_clickhouse_config
+
+# Partitioned tables to reconcile, with the job that repairs them
+RECONCILED_TABLES = [
+    {"asset": statistics, "job": statistics_job, "table": "statistics", "pk": "id", "partition_col": "created_ts"},
+    {"asset": events, "job": events_job, "table": "events", "pk": "event_id", "partition_col": "time_fired_ts"},
+    {"asset": states, "job": states_job, "table": "states", "pk": "state_id", "partition_col": "last_updated_ts"},
+]
+
+
+def datasette_hourly_aggregates(table: str, pk: str, partition_col: str, start: int, end: int, context=None) -> pd.DataFrame:
+    """
+    Row count and min/max id per UTC hour of a time range, computed by SQLite.
+    """
+    return query_datasette(
+        f"""
+        select
+            cast({partition_col} / 3600 as integer) as hour
+            , count(*) as row_count
+            , min({pk}) as min_id
+            , max({pk}) as max_id
+        from {table}
+        where {partition_col} >= :start and {partition_col} < :end
+        group by hour
+        """,
+        params={"start": start, "end": end},
+        context=context,
+    )
+
+
+def clickhouse_hourly_aggregates(client, table: str, pk: str, partition_col: str, start: int, end: int) -> pd.DataFrame:
+    """
+    Row count and min/max id per UTC hour of a time range, from the deduplicated raw table.
+    """
+    rows = client.execute(
+        f"""
+        select
+            intDiv(toUInt64(toFloat64OrZero({partition_col})), 3600) as hour
+            , count() as row_count
+            , min(toUInt64OrZero({pk})) as min_id
+            , max(toUInt64OrZero({pk})) as max_id
+        from raw.{table} final
+        where toFloat64OrZero({partition_col}) >= %(start)s and toFloat64OrZero({partition_col}) < %(end)s
+        group by hour
+        """,
+        {"start": start, "end": end},
+    )
+    return pd.DataFrame(rows, columns=["hour", "row_count", "min_id", "max_id"])
+
+
+def partition_aggregates(hourly: pd.DataFrame, partition_keys: list[str]) -> dict[str, tuple]:
+    """
+    Roll hourly aggregates up into the (daily or hourly) partitions.
+
+    Partitions are contiguous, so every hour is assigned to its partition with
+    one binary search instead of filtering the frame once per partition.
+
+    Returns:
+        Dict of partition key to (row_count, min_id, max_id), only for partitions with rows
+    """
+    if hourly.empty or not partition_keys:
+        return {}
+    hourly = hourly.astype({"hour": "int64", "row_count": "int64", "min_id": "int64", "max_id": "int64"})
+
+    bounds = [partition_bounds(partition_key) for partition_key in partition_keys]
+    starts = np.array([start for start, _ in bounds])
+    seconds = hourly["hour"].to_numpy() * 3600
+    index = np.searchsorted(starts, seconds, side="right") - 1
+    in_range = (index >= 0) & (seconds < bounds[-1][1])
+
+    grouped = hourly[in_range].groupby(index[in_range]).agg(
+        row_count=("row_count", "sum"), min_id=("min_id", "min"), max_id=("max_id", "max")
+    )
+    return {
+        partition_keys[i]: (int(row.row_count), int(row.min_id), int(row.max_id))
+        for i, row in zip(grouped.index, grouped.itertuples(index=False))
+    }
+
+
+def reconciled_months(spec: dict, partition_keys: list[str], context=None) -> dict[str, list[str]]:
+    """
+    Partition keys of the days Datasette still fully holds, grouped by month.
+    """
+    partition_col = spec["partition_col"]
+
+    # Older days are purged and the oldest remaining day is usually cut off by the purge
+    bounds = query_datasette(
+        f"select min({partition_col}) as first_ts, max({partition_col}) as last_ts from {spec['table']}", context=context
+    ).iloc[0]
+    if pd.isna(bounds["first_ts"]):
+        return {}
+
+    months = defaultdict(list)
+    for partition_key in partition_keys:
+        partition_start, partition_end = partition_bounds(partition_key)
+        if partition_start >= bounds["first_ts"] and partition_start <= bounds["last_ts"]:
+            months[partition_key[:7]].append(partition_key)
+    return dict(months)
+
+
+def reconcile_table(spec: dict, months: dict[str, list[str]], client, context=None) -> dict[str, dict]:
+    """
+    Compare the partition aggregates of a table on both sides.
+
+    ClickHouse aggregates all months in one query, Datasette one month per
+    query so SQLite stays within Datasette's time limit.
+
+    Args:
+        spec: Entry of RECONCILED_TABLES
+        months: Partition keys to compare by month, from `reconciled_months`
+        client: ClickHouse client
+
+    Returns:
+        Dict of mismatched partition key to the aggregates on both sides
+    """
+    partition_keys = sorted(key for month_keys in months.values() for key in month_keys)
+    if not partition_keys:
+        return {}
+    table, pk, partition_col = spec["table"], spec["pk"], spec["partition_col"]
+
+    # Hour buckets add up to whole partitions, they start on full hours in every time zone we use
+    start, end = partition_bounds(partition_keys[0])[0], partition_bounds(partition_keys[-1])[1]
+    clickhouse = partition_aggregates(
+        clickhouse_hourly_aggregates(client, table, pk, partition_col, start, end), partition_keys
+    )
+    datasette = {}
+    for month in sorted(months):
+        month_start, month_end = partition_bounds(months[month][0])[0], partition_bounds(months[month][-1])[1]
+        datasette.update(partition_aggregates(
+            datasette_hourly_aggregates(table, pk, partition_col, month_start, month_end, context=context), months[month]
+        ))
+
+    mismatches = {}
+    for partition_key, source in datasette.items():
+        loaded = clickhouse.get(partition_key, (0, None, None))
+        if source != loaded:
+            mismatches[partition_key] = {"datasette": source, "clickhouse": loaded}
+    return mismatches
+
+
+@op
+def reconcile_partitions(context: OpExecutionContext) -> dict:
+    """
+    Compare every reconciled table, the mismatches are recorded as the `mismatches` output metadata.
+    """
+    mismatches = {}
+    client = get_clickhouse_client(get_clickhouse_config())
+    try:
+        for spec in RECONCILED_TABLES:
+            partition_keys = spec["asset"].partitions_def.get_partition_keys(dynamic_partitions_store=context.instance)
+            months = reconciled_months(spec, partition_keys, context=context)
+            table_mismatches = reconcile_table(spec, months, client, context=context)
+            context.log.info(
+                f"Reconciled {sum(len(keys) for keys in months.values())} partitions of {spec['table']} "
+                f"in {len(months)} months, {len(table_mismatches)} mismatched"
+            )
+            for partition_key, detail in table_mismatches.items():
+                context.log.info(f"{spec['table']} {partition_key}: {detail}")
+            mismatches[spec["table"]] = table_mismatches
+    finally:
+        client.disconnect()
+
+    context.add_output_metadata({
+        **{f"{table}/mismatched": len(table_mismatches) for table, table_mismatches in mismatches.items()},
+        "mismatches": MetadataValue.json(mismatches),
+    })
+    return mismatches
+
+
+##### reconciliation job and schedule, enable the schedule to reconcile daily
+@job(description="Compares per-partition counts and min/max ids of Datasette and ClickHouse")
+def partition_reconciliation_job():
+    reconcile_partitions()
+
+
+partition_reconciliation_schedule = ScheduleDefinition(
+    name="daily_partition_reconciliation_schedule",
+    cron_schedule="0 3 * * *",
+    job=partition_reconciliation_job,
+    execution_timezone="America/Los_Angeles",
+    description="Daily reconciliation of the partitioned raw tables"
+)
+
+
+@run_status_sensor(
+    run_status=DagsterRunStatus.SUCCESS,
+    monitored_jobs=[partition_reconciliation_job],
+    request_jobs=[spec["job"] for spec in RECONCILED_TABLES],
+    default_status=DefaultSensorStatus.RUNNING,
+    description="Re-materializes the partitions a partition_reconciliation_job run found mismatched",
+)
+def reconciliation_repair_sensor(context: RunStatusSensorContext):
+    records = context.instance.get_records_for_run(
+        context.dagster_run.run_id, of_type=DagsterEventType.STEP_OUTPUT
+    ).records
+    jobs = {spec["table"]: spec["job"] for spec in RECONCILED_TABLES}
+    for record in records:
+        metadata = record.event_log_entry.dagster_event.step_output_data.metadata
+        if "mismatches" not in metadata:
+            continue
+        for table, table_mismatches in metadata["mismatches"].value.items():
+            for partition_key, detail in table_mismatches.items():
+                count, min_id, max_id = detail["datasette"]
+                yield RunRequest(
+                    # The same mismatch is only repaired once
+                    run_key=f"reconcile-{table}-{partition_key}-{count}-{min_id}-{max_id}",
+                    job_name=jobs[table].name,
+                    partition_key=partition_key,
+                    tags={FORCE_REFRESH_TAG: "true"},
+                )
+
+
+# Group jobs, schedules and sensors for export
+reconciliation_jobs = [partition_reconciliation_job]
+reconciliation_schedules = [partition_reconciliation_schedule]
+reconciliation_sensors = [reconciliation_repair_sensor]
@@ -0,0 +1,191 @@
+"""
+Bulk stage-and-COPY loading for Snowflake.
+
+Outputs (DataFrames or chunk streams) are spooled locally as zstd Parquet
+files, one per partition. A flush
+moves everything pending for a table into a batch, uploads it with a single
+`PUT` to a named internal stage and loads it with a single `COPY INTO`. The
+table is created from the staged files' schema on its first load (a table
+stage only exists once its table does, hence the named stage). So a backfill
+of hundreds of partitions wakes the warehouse a handful of times instead of
+once per partition.
+
+The loader only needs a DB-API style connection factory, which makes it easy
+to exercise offline against a stand-in connection (see
+`utils/snowflake_stage_check.py`).
+"""
+
+import os
+import time
+import uuid
+import shutil
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pathlib import Path
+from typing import Any, Callable, Iterable
+
+# Named file format and internal stage created next to the loaded tables
+PARQUET_FILE_FORMAT = "hass_parquet"
+PARQUET_STAGE = "hass_etl_stage"
+
+
+class SnowflakeStageLoader:
+    """
+    Spools DataFrames as Parquet and loads them into Snowflake in batches.
+
+    Args:
+        connect: Callable returning a DB-API connection to Snowflake
+        spool_dir: Local directory holding pending Parquet files
+        batch_files: Number of pending files of a table that triggers a flush
+        max_pending_age: Seconds after which pending files are flushed regardless
+    """
+
+    def __init__(self, connect: Callable[[], Any], spool_dir: Path, batch_files: int = 50, max_pending_age: float = 900):
+        self.connect = connect
+        self.spool_dir = Path(spool_dir)
+        self.batch_files = batch_files
+        self.max_pending_age = max_pending_age
+
+    def table_dir(self, schema: str, table: str) -> Path:
+        return self.spool_dir / f"{schema}.{table}".lower()
+
+    def spool(self, df: pd.DataFrame, schema: str, table: str, partition_key: str | None = None) -> Path:
+        """
+        Write one output to the spool, replacing a pending file of the same partition.
+        """
+        path, _ = self.spool_chunks([df], schema, table, partition_key)
+        return path
+
+    def spool_chunks(self, chunks: Iterable[pd.DataFrame], schema: str, table: str, partition_key: str | None = None) -> tuple[Path, int]:
+        """
+        Append chunks to one spooled Parquet file, keeping only a chunk in memory.
+
+        Returns:
+            Tuple of the spooled file and the number of rows written
+        """
+        table_dir = self.table_dir(schema, table)
+        table_dir.mkdir(parents=True, exist_ok=True)
+
+        name = partition_key or f"snapshot-{time.time_ns()}"
+        path = table_dir / f"{name}.parquet"
+        tmp_path = table_dir / f".{name}.parquet.tmp"
+
+        writer = None
+        rows = 0
+        try:
+            for chunk in chunks:
+                # Upper case columns, like the Snowflake pandas IO manager creates them
+                arrow_table = pa.Table.from_pandas(chunk.rename(columns=str.upper), preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(tmp_path, arrow_table.schema, compression="zstd")
+                writer.write_table(arrow_table)
+                rows += len(chunk)
+        except BaseException:
+            if writer is not None:
+                writer.close()
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+        if writer is None:
+            # Nothing to load, don't leave an empty file for COPY INTO
+            return path, 0
+        writer.close()
+        os.replace(tmp_path, path)
+        return path, rows
+
+    def pending(self, schema: str, table: str) -> list[Path]:
+        table_dir = self.table_dir(schema, table)
+        return sorted(table_dir.glob("*.parquet")) if table_dir.exists() else []
+
+    def should_flush(self, schema: str, table: str) -> bool:
+        """
+        Whether enough files are pending, or the oldest has waited long enough.
+        """
+        pending = self.pending(schema, table)
+        if not pending:
+            return False
+        if len(pending) >= self.batch_files:
+            return True
+        oldest = min(path.stat().st_mtime for path in pending)
+        return time.time() - oldest >= self.max_pending_age
+
+    def flush(self, schema: str, table: str, log=None) -> dict:
+        """
+        Load every pending file of a table with one PUT and one COPY INTO.
+
+        Returns:
+            Dict with the number of files and rows loaded
+        """
+        pending = self.pending(schema, table)
+        if not pending:
+            return {"files": 0, "rows_loaded": 0}
+
+        # Move the pending files aside first, outputs spooled meanwhile go to the next batch
+        batch_id = f"batch-{uuid.uuid4().hex[:12]}"
+        batch_dir = self.table_dir(schema, table) / batch_id
+        batch_dir.mkdir()
+        moved = []
+        for path in pending:
+            try:
+                os.replace(path, batch_dir / path.name)
+                moved.append(path)
+            except FileNotFoundError:
+                # Already claimed by a concurrent flush
+                continue
+        if not moved:
+            batch_dir.rmdir()
+            return {"files": 0, "rows_loaded": 0}
+
+        qualified = f"{schema}.{table}".upper()
+        file_format = f"{schema}.{PARQUET_FILE_FORMAT}".upper()
+        stage_name = f"{schema}.{PARQUET_STAGE}".upper()
+        stage = f"@{stage_name}/{table.lower()}/{batch_id}"
+
+        connection = self.connect()
+        try:
+            cursor = connection.cursor()
+            cursor.execute(f"create file format if not exists {file_format} type = parquet")
+            cursor.execute(f"create stage if not exists {stage_name} file_format = {file_format}")
+            cursor.execute(
+                f"put 'file://{batch_dir.as_posix()}/*.parquet' {stage} auto_compress = false overwrite = true parallel = 8"
+            )
+            cursor.execute(
+                f"create table if not exists {qualified} using template ("
+                f"select array_agg(object_construct(*)) from table(infer_schema("
+                f"location => '{stage}', file_format => '{file_format}')))"
+            )
+            cursor.execute(
+                f"copy into {qualified} from {stage} "
+                f"file_format = (format_name = '{file_format}') "
+                f"match_by_column_name = case_insensitive purge = true"
+            )
+            rows_loaded = sum(int(row[3] or 0) for row in cursor.fetchall() if len(row) > 3)
+            cursor.close()
+        except Exception:
+            # Put the files back so the next flush retries them
+            for path in batch_dir.glob("*.parquet"):
+                target = self.table_dir(schema, table) / path.name
+                if not target.exists():
+                    os.replace(path, target)
+            shutil.rmtree(batch_dir, ignore_errors=True)
+            raise
+        finally:
+            connection.close()
+
+        shutil.rmtree(batch_dir, ignore_errors=True)
+        if log:
+            log.info(f"Loaded {len(moved)} files ({rows_loaded} rows) into {qualified} with one COPY INTO")
+        return {"files": len(moved), "rows_loaded": rows_loaded}
+
+    def flush_all(self, log=None) -> dict:
+        """
+        Flush every table with pending files.
+        """
+        results = {}
+        if not self.spool_dir.exists():
+            return results
+        for table_dir in sorted(p for p in self.spool_dir.iterdir() if p.is_dir()):
+            schema, table = table_dir.name.split(".", 1)
+            results[table_dir.name] = self.flush(schema, table, log=log)
+        return results
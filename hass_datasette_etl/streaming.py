@@ -0,0 +1,58 @@
+"""
+Chunked hand-off of asset outputs to IO managers.
+
+Large partitions are returned as a `ChunkStream` instead of one DataFrame. The
+IO manager pulls chunks as they are fetched and writes each one right away, so
+peak memory is one chunk no matter how big the partition is.
+"""
+
+import pandas as pd
+from typing import Callable, Iterable, Iterator
+from dagster import MetadataValue
+
+
+class ChunkStream:
+    """
+    Single-pass stream of DataFrame chunks.
+
+    Output metadata (`num_rows`, `num_chunks`, `preview`) is computed while the
+    stream is consumed. Producers can add their own entries to the `metadata`
+    dict passed in, IO managers attach it once the stream is exhausted.
+
+    Args:
+        chunks: Iterable of DataFrames sharing the same columns
+        metadata: Optional dict the producer fills with extra output metadata
+        replay: Optional callable returning the same chunks again once the
+            stream was exhausted (e.g. from the landing zone), used to retry writes
+    """
+
+    def __init__(self, chunks: Iterable[pd.DataFrame], metadata: dict | None = None, replay: Callable[[], Iterable[pd.DataFrame]] | None = None):
+        self._chunks = chunks
+        self._consumed = False
+        self.metadata = metadata if metadata is not None else {}
+        self.replay = replay
+        self.num_rows = 0
+        self.num_chunks = 0
+
+    def __iter__(self) -> Iterator[pd.DataFrame]:
+        if self._consumed:
+            raise RuntimeError("A ChunkStream can only be consumed once")
+        self._consumed = True
+
+        for chunk in self._chunks:
+            if self.num_chunks == 0:
+                self.metadata["preview"] = MetadataValue.md(chunk.head().to_markdown())
+            self.num_rows += len(chunk)
+            self.num_chunks += 1
+            yield chunk
+
+        self.metadata.setdefault("preview", MetadataValue.md("No data"))
+        self.metadata["num_rows"] = self.num_rows
+        self.metadata["num_chunks"] = self.num_chunks
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Concatenate the whole stream, for destinations that need one DataFrame.
+        """
+        chunks = list(self)
+        return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
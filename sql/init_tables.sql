@@ -22,15 +22,28 @@ create table if not exists raw.statistics
     state              String,
     sum                String,
     mean_weight        String,
-    loaded_at          Double
+    -- denormalized from statistics_meta at extraction time, see HASS_ENRICH_FACTS
+    entity_id          String,
+    uom                String,
+    loaded_at          Double,
+    -- skip indexes and projections are declared in hass_datasette_etl/clickhouse_schema.py,
+    -- run clickhouse_schema_migration_job to add and build them on existing tables
+    index metadata_id_idx toUInt32OrZero(trim(simpleJSONExtractRaw(metadata_id, 'value'))) type set(1024) granularity 4,
+    projection by_metadata_id (select * order by toUInt32OrZero(trim(simpleJSONExtractRaw(metadata_id, 'value'))), start_ts)
 ) engine = ReplacingMergeTree(loaded_at)
 primary key (id)
 order by (id)
+settings deduplicate_merge_projection_mode = 'rebuild'
 comment 'home-assistant aggregated sensor statistics';
 
 -- (optional) sorting can help for date-range queries
 -- order by (start_ts);
 
+-- tables created before the denormalized columns existed
+alter table raw.statistics
+    add column if not exists entity_id String after mean_weight,
+    add column if not exists uom String after entity_id;
+
 ------------------------------------------------------------------------
 -- statistics_meta table
 ------------------------------------------------------------------------
@@ -70,7 +83,9 @@ create table if not exists raw.events
     context_user_id_bin  String,
     context_parent_id_bin String,
     event_type_id        String,
-    loaded_at            Double
+    loaded_at            Double,
+    index event_type_id_idx toUInt32OrZero(trim(simpleJSONExtractRaw(event_type_id, 'value'))) type set(512) granularity 4,
+    index data_id_idx toUInt32OrZero(trim(simpleJSONExtractRaw(data_id, 'value'))) type bloom_filter(0.01) granularity 4
 ) engine = ReplacingMergeTree(loaded_at)
 primary key (event_id)
 order by (event_id)
@@ -84,12 +99,33 @@ create table if not exists raw.event_data
     data_id     String not null,
     hash        String,
     shared_data String,
-    loaded_at   Double
+    loaded_at   Double,
+    -- parsed once on insert (and merge) instead of on every scan
+    domain       String materialized simpleJSONExtractString(shared_data, 'domain'),
+    service      String materialized simpleJSONExtractString(shared_data, 'service'),
+    service_data String materialized simpleJSONExtractRaw(shared_data, 'service_data'),
+    entity_id    String materialized simpleJSONExtractString(simpleJSONExtractRaw(shared_data, 'service_data'), 'entity_id'),
+    index entity_id_idx entity_id type bloom_filter(0.01) granularity 4,
+    index domain_idx domain type set(256) granularity 4
 ) engine = ReplacingMergeTree(loaded_at)
 primary key (data_id)
 order by (data_id)
 comment 'event data shared payloads';
 
+-- tables created before the materialized columns existed
+alter table raw.event_data
+    add column if not exists domain String materialized simpleJSONExtractString(shared_data, 'domain'),
+    add column if not exists service String materialized simpleJSONExtractString(shared_data, 'service'),
+    add column if not exists service_data String materialized simpleJSONExtractRaw(shared_data, 'service_data'),
+    add column if not exists entity_id String materialized simpleJSONExtractString(simpleJSONExtractRaw(shared_data, 'service_data'), 'entity_id');
+
+-- new columns are only computed for parts written after the alter, to
+-- backfill rows loaded before it run once:
+-- alter table raw.event_data materialize column domain;
+-- alter table raw.event_data materialize column service;
+-- alter table raw.event_data materialize column service_data;
+-- alter table raw.event_data materialize column entity_id;
+
 ------------------------------------------------------------------------
 -- event_types table
 ------------------------------------------------------------------------
@@ -101,3 +137,175 @@ create table if not exists raw.event_types  (
 primary key (event_type_id)
 order by (event_type_id)
 comment 'event types';
+
+
+------------------------------------------------------------------------
+-- states table
+-- partitioned by month of last_updated_ts and sorted by entity, so
+-- per-entity history reads a narrow range of a few partitions
+------------------------------------------------------------------------
+create table if not exists raw.states
+(
+    state_id              String not null,
+    entity_id             String,
+    state                 String,
+    attributes            String,
+    event_id              String,
+    last_changed          String,
+    last_changed_ts       String,
+    last_reported_ts      String,
+    last_updated          String,
+    last_updated_ts       String not null,
+    old_state_id          String,
+    attributes_id         String,
+    context_id            String,
+    context_user_id       String,
+    context_parent_id     String,
+    origin_idx            String,
+    context_id_bin        String,
+    context_user_id_bin   String,
+    context_parent_id_bin String,
+    metadata_id           String,
+    loaded_at             Double
+) engine = ReplacingMergeTree(loaded_at)
+partition by toYYYYMM(toDateTime(toUInt32(toFloat64OrZero(last_updated_ts)), 'UTC'))
+order by (toUInt32OrZero(trim(simpleJSONExtractRaw(metadata_id, 'value'))), last_updated_ts, state_id)
+comment 'every state change recorded by home-assistant';
+
+------------------------------------------------------------------------
+-- state_attributes table
+------------------------------------------------------------------------
+create table if not exists raw.state_attributes
+(
+    attributes_id   String not null,
+    hash            String,
+    shared_attrs    String,
+    loaded_at       Double
+) engine = ReplacingMergeTree(loaded_at)
+primary key (attributes_id)
+order by (attributes_id)
+comment 'shared state attribute payloads, loaded incrementally by attributes_id';
+
+------------------------------------------------------------------------
+-- states_meta table
+------------------------------------------------------------------------
+create table if not exists raw.states_meta
+(
+    metadata_id     String not null,
+    entity_id       String,
+    loaded_at       Double
+) engine = ReplacingMergeTree(loaded_at)
+primary key (metadata_id)
+order by (metadata_id)
+comment 'entity ids of the states table';
+
+
+------------------------------------------------------------------------
+-- dimension dictionaries
+-- in-memory hashed lookups of the deduplicated dimension tables, the
+-- marts use dictGet instead of joining the staging views. dbt reloads
+-- them before building the marts, the lifetime only bounds staleness for
+-- ad-hoc queries. the sources connect through the hass_raw named
+-- collection (clickhouse/named_collections.xml), which holds the
+-- CLICKHOUSE_USER/CLICKHOUSE_PASSWORD credentials.
+------------------------------------------------------------------------
+create dictionary if not exists raw.event_types_dict
+(
+    id          UInt64,
+    event_type  String
+)
+primary key id
+source(clickhouse(name hass_raw query 'select toUInt64(event_type_id) as id, event_type from raw.event_types final'))
+layout(hashed())
+lifetime(min 300 max 900);
+
+create dictionary if not exists raw.statistics_meta_dict
+(
+    id          UInt64,
+    entity_id   String,
+    uom         String
+)
+primary key id
+source(clickhouse(name hass_raw query 'select toUInt64(id) as id, statistic_id as entity_id, unit_of_measurement as uom from raw.statistics_meta final'))
+layout(hashed())
+lifetime(min 300 max 900);
+
+
+------------------------------------------------------------------------
+-- statistics rollups
+-- hourly / daily buckets per metadata_id, kept up to date by materialized
+-- views on every insert into raw.statistics, whichever loader inserts.
+-- the rollup tables keep one typed row per raw statistics id, so a
+-- re-inserted row (replays, force refreshes, reconciliation repairs)
+-- replaces its previous copy instead of being counted twice. raw
+-- statistics are hourly already, a bucket holds a handful of rows; the
+-- staging views aggregate them with final.
+--
+-- tables created by the former views or rebuilds have other columns,
+-- drop them once before applying this file:
+--   drop view if exists raw.statistics_hourly_mv;
+--   drop view if exists raw.statistics_daily_mv;
+--   drop table if exists raw.statistics_hourly;
+--   drop table if exists raw.statistics_daily;
+-- then seed them from the rows loaded before the views existed with
+-- statistics_rollup_rebuild_job (also the fix for rollups out of sync).
+------------------------------------------------------------------------
+create table if not exists raw.statistics_hourly
+(
+    metadata_id     UInt32,
+    bucket_start    DateTime('UTC'),
+    id              UInt64,
+    start_ts        Float64,
+    min             Nullable(Float64),
+    max             Nullable(Float64),
+    mean            Nullable(Float64),
+    sum             Nullable(Float64),
+    loaded_at       Float64
+) engine = ReplacingMergeTree(loaded_at)
+partition by toYYYYMM(bucket_start)
+order by (metadata_id, bucket_start, id)
+comment 'hourly rollup of raw.statistics per metadata_id, one row per statistics id';
+
+create materialized view if not exists raw.statistics_hourly_mv
+to raw.statistics_hourly
+as select
+    toUInt32OrZero(trim(simpleJSONExtractRaw(s.metadata_id, 'value'))) as metadata_id,
+    toStartOfHour(toDateTime(toUInt32(toFloat64OrZero(s.start_ts)), 'UTC')) as bucket_start,
+    toUInt64OrZero(s.id) as id,
+    toFloat64OrZero(s.start_ts) as start_ts,
+    toFloat64OrNull(s.min) as min,
+    toFloat64OrNull(s.max) as max,
+    toFloat64OrNull(s.mean) as mean,
+    toFloat64OrNull(s.sum) as sum,
+    s.loaded_at as loaded_at
+from raw.statistics as s;
+
+create table if not exists raw.statistics_daily
+(
+    metadata_id     UInt32,
+    bucket_date     Date,
+    id              UInt64,
+    start_ts        Float64,
+    min             Nullable(Float64),
+    max             Nullable(Float64),
+    mean            Nullable(Float64),
+    sum             Nullable(Float64),
+    loaded_at       Float64
+) engine = ReplacingMergeTree(loaded_at)
+partition by toYYYYMM(bucket_date)
+order by (metadata_id, bucket_date, id)
+comment 'daily (America/Los_Angeles) rollup of raw.statistics per metadata_id, one row per statistics id';
+
+create materialized view if not exists raw.statistics_daily_mv
+to raw.statistics_daily
+as select
+    toUInt32OrZero(trim(simpleJSONExtractRaw(s.metadata_id, 'value'))) as metadata_id,
+    toDate(toDateTime(toUInt32(toFloat64OrZero(s.start_ts)), 'America/Los_Angeles')) as bucket_date,
+    toUInt64OrZero(s.id) as id,
+    toFloat64OrZero(s.start_ts) as start_ts,
+    toFloat64OrNull(s.min) as min,
+    toFloat64OrNull(s.max) as max,
+    toFloat64OrNull(s.mean) as mean,
+    toFloat64OrNull(s.sum) as sum,
+    s.loaded_at as loaded_at
+from raw.statistics as s;
@@ -0,0 +1,61 @@
+"""
+Tests for the code location definitions.
+
+Loads the merged Definitions like `dagster dev` does, which parses the dbt
+project if no manifest was built yet.
+"""
+
+import os
+import sys
+from unittest import mock
+
+from dagster import AssetCheckResult, AssetKey, Output
+
+# Add the project directory to the Python path
+sys.path.insert(0, os.path.abspath("."))
+
+from hass_datasette_etl import defs
+from hass_datasette_etl.hass_dbt import definitions as dbt_definitions
+
+
+def test_definitions_load():
+    """The code location loads, every dbt source has its own asset key."""
+    repository = defs.get_repository_def()
+    assert repository.get_all_jobs()
+
+
+def test_derived_sources_depend_on_parent_table():
+    """Models reading a rollup or dictionary depend on the raw asset loading its parent table."""
+    asset_graph = defs.get_repository_def().asset_graph
+    parents = asset_graph.get(AssetKey(["dbt", "stg_statistics_hourly"])).parent_keys
+    assert parents == {AssetKey(["hass", "statistics"])}
+
+    parents = asset_graph.get(AssetKey(["dbt", "events"])).parent_keys
+    assert AssetKey(["hass", "event_types"]) in parents
+    assert AssetKey(["hass", "event_types_dict"]) not in parents
+
+
+def test_query_metrics_added_per_model():
+    """A model's Output gets its own query_log metrics, looked up when it arrives."""
+    metrics = {"model.hass_dbt.statistics": {"clickhouse/read_rows": 1200}}
+    output = Output(None, output_name="statistics", metadata={
+        "unique_id": "model.hass_dbt.statistics", "invocation_id": "abc",
+    })
+
+    with mock.patch.object(dbt_definitions, "fetch_query_metrics", return_value=metrics) as fetch:
+        event = dbt_definitions.with_query_metrics(output)
+        fetch.assert_called_once_with("abc", node_id="model.hass_dbt.statistics", log=None)
+    assert event.metadata["clickhouse/read_rows"].value == 1200
+    assert event.metadata["unique_id"].value == "model.hass_dbt.statistics"
+
+    check = AssetCheckResult(passed=True, asset_key=AssetKey(["dbt", "statistics"]), check_name="not_null")
+    with mock.patch.object(dbt_definitions, "fetch_query_metrics", return_value={}) as fetch:
+        assert dbt_definitions.with_query_metrics(check) is check
+        assert dbt_definitions.with_query_metrics(Output(None, metadata={"unique_id": "x"})).metadata["unique_id"].value == "x"
+        fetch.assert_not_called()
+
+
+if __name__ == "__main__":
+    test_definitions_load()
+    test_derived_sources_depend_on_parent_table()
+    test_query_metrics_added_per_model()
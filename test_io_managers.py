@@ -0,0 +1,204 @@
+"""
+Tests for the fan-out IO manager in `hass_datasette_etl.io_managers`.
+"""
+
+import os
+import sys
+
+import pandas as pd
+import pytest
+from dagster import AssetKey, Failure, IOManager, build_input_context, build_output_context
+
+# Add the project directory to the Python path
+sys.path.insert(0, os.path.abspath("."))
+
+from hass_datasette_etl.io_managers import FanOutIOManager, SnowflakeStageIOManager
+from hass_datasette_etl.streaming import ChunkStream
+
+
+class RecordingIOManager(IOManager):
+    """
+    Destination keeping what it was given, failing the first `failures` writes.
+    """
+
+    def __init__(self, failures: int = 0, supports_streaming: bool = False):
+        self.failures = failures
+        self.supports_streaming = supports_streaming
+        self.outputs = []
+
+    def handle_output(self, context, obj) -> None:
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("destination unavailable")
+        if isinstance(obj, ChunkStream):
+            obj = [len(chunk) for chunk in obj]
+        self.outputs.append(obj)
+        context.add_output_metadata({"written": True})
+
+    def load_input(self, context):
+        return self.outputs[-1]
+
+
+def _chunks(count: int = 3, rows: int = 2):
+    for i in range(count):
+        yield pd.DataFrame({"id": [str(i * rows + j) for j in range(rows)]})
+
+
+def _metadata(context) -> dict:
+    return {key: getattr(value, "value", value) for key, value in context.get_logged_metadata().items()}
+
+
+def test_frame_written_to_every_destination():
+    """Each destination gets the frame, its status and own metadata are prefixed with its name."""
+    first, second = RecordingIOManager(), RecordingIOManager()
+    manager = FanOutIOManager({"first": first, "second": second}, retry_delay=0)
+    context = build_output_context()
+    frame = pd.DataFrame({"id": ["1", "2"]})
+
+    manager.handle_output(context, frame)
+
+    assert first.outputs[0].equals(frame) and second.outputs[0].equals(frame)
+    metadata = _metadata(context)
+    for name in ("first", "second"):
+        assert metadata[f"{name}/status"] == "success"
+        assert metadata[f"{name}/attempts"] == 1
+        assert metadata[f"{name}/written"] is True
+        assert f"{name}/error" not in metadata
+
+
+def test_failed_destination_is_retried_then_fails_the_output():
+    """A destination failing every attempt fails the output, the others are still written."""
+    healthy, broken = RecordingIOManager(), RecordingIOManager(failures=10)
+    manager = FanOutIOManager({"healthy": healthy, "broken": broken}, max_retries=2, retry_delay=0)
+    context = build_output_context()
+
+    with pytest.raises(Failure) as failure:
+        manager.handle_output(context, pd.DataFrame({"id": ["1"]}))
+
+    assert "broken" in failure.value.description
+    assert len(healthy.outputs) == 1
+    metadata = _metadata(context)
+    assert metadata["healthy/status"] == "success"
+    assert metadata["broken/status"] == "failed"
+    assert metadata["broken/attempts"] == 3
+    assert "ConnectionError" in metadata["broken/error"]
+
+
+def test_flaky_destination_succeeds_on_retry():
+    """A destination failing once is retried and recorded with its attempts."""
+    flaky = RecordingIOManager(failures=1)
+    manager = FanOutIOManager({"flaky": flaky}, max_retries=2, retry_delay=0)
+    context = build_output_context()
+
+    manager.handle_output(context, pd.DataFrame({"id": ["1"]}))
+
+    metadata = _metadata(context)
+    assert metadata["flaky/status"] == "success"
+    assert metadata["flaky/attempts"] == 2
+
+
+def test_stream_is_teed_once_to_every_destination():
+    """A ChunkStream is read once, streaming destinations get the chunks, the others one frame."""
+    streaming, batch = RecordingIOManager(supports_streaming=True), RecordingIOManager()
+    manager = FanOutIOManager({"streaming": streaming, "batch": batch}, retry_delay=0)
+    context = build_output_context()
+
+    manager.handle_output(context, ChunkStream(_chunks(), metadata={"pages": 3}))
+
+    assert streaming.outputs == [[2, 2, 2]]
+    assert batch.outputs[0]["id"].tolist() == [str(i) for i in range(6)]
+    metadata = _metadata(context)
+    assert metadata["pages"] == 3
+    assert metadata["num_rows"] == 6
+    assert metadata["streaming/status"] == metadata["batch/status"] == "success"
+
+
+def test_stream_write_is_retried_from_spool():
+    """A destination failing mid-stream is retried from the local spool, the source is read once."""
+    reads = []
+
+    def counted_chunks():
+        reads.append(1)
+        yield from _chunks()
+
+    flaky = RecordingIOManager(failures=1, supports_streaming=True)
+    healthy, batch = RecordingIOManager(supports_streaming=True), RecordingIOManager(failures=1)
+    manager = FanOutIOManager({"flaky": flaky, "healthy": healthy, "batch": batch}, max_retries=2, retry_delay=0)
+    context = build_output_context()
+
+    manager.handle_output(context, ChunkStream(counted_chunks()))
+
+    assert reads == [1]
+    assert flaky.outputs == healthy.outputs == [[2, 2, 2]]
+    assert batch.outputs[0]["id"].tolist() == [str(i) for i in range(6)]
+    metadata = _metadata(context)
+    assert metadata["flaky/attempts"] == metadata["batch/attempts"] == 2
+    assert metadata["healthy/attempts"] == 1
+    assert metadata["flaky/status"] == "success"
+
+
+def test_stream_write_is_retried_from_replay():
+    """A stream with a replay, e.g. the landed partition, is retried from it without spooling."""
+    flaky = RecordingIOManager(failures=1, supports_streaming=True)
+    manager = FanOutIOManager({"flaky": flaky}, max_retries=2, retry_delay=0)
+
+    manager.handle_output(build_output_context(), ChunkStream(_chunks(), replay=lambda: _chunks(2, 5)))
+
+    assert flaky.outputs == [[5, 5]]
+
+
+def test_stream_write_fails_after_retries():
+    """A destination failing every attempt fails the output once its retries are used up."""
+    broken = RecordingIOManager(failures=10, supports_streaming=True)
+    healthy = RecordingIOManager(supports_streaming=True)
+    manager = FanOutIOManager({"broken": broken, "healthy": healthy}, max_retries=2, retry_delay=0)
+    context = build_output_context()
+
+    with pytest.raises(Failure):
+        manager.handle_output(context, ChunkStream(_chunks()))
+
+    assert healthy.outputs == [[2, 2, 2]]
+    metadata = _metadata(context)
+    assert metadata["broken/attempts"] == 3
+    assert metadata["broken/status"] == "failed"
+
+
+def test_source_error_is_raised():
+    """An error while extracting the stream reaches the asset, not only the destinations."""
+    def failing_chunks():
+        yield from _chunks(1)
+        raise RuntimeError("Datasette went away")
+
+    flaky = RecordingIOManager(failures=1, supports_streaming=True)
+    manager = FanOutIOManager({"first": RecordingIOManager(supports_streaming=True), "flaky": flaky}, retry_delay=0)
+    with pytest.raises(RuntimeError, match="Datasette went away"):
+        manager.handle_output(build_output_context(), ChunkStream(failing_chunks()))
+    assert not flaky.outputs
+
+
+def test_inputs_load_from_first_readable_destination():
+    """Write-only destinations are skipped for inputs, and fail with an explanation when alone."""
+    readable = RecordingIOManager()
+    readable.outputs.append("from clickhouse")
+    write_only = SnowflakeStageIOManager(loader=None)
+    context = build_input_context(asset_key=AssetKey(["hass", "statistics"]))
+
+    manager = FanOutIOManager({"snowflake_stage_io_manager": write_only, "clickhouse_io_manager": readable})
+    assert manager.load_input(context) == "from clickhouse"
+
+    with pytest.raises(Failure, match="write-only"):
+        FanOutIOManager({"snowflake_stage_io_manager": write_only}).load_input(context)
+    with pytest.raises(Failure, match="write-only"):
+        write_only.load_input(context)
+
+
+if __name__ == "__main__":
+    test_frame_written_to_every_destination()
+    test_failed_destination_is_retried_then_fails_the_output()
+    test_flaky_destination_succeeds_on_retry()
+    test_stream_is_teed_once_to_every_destination()
+    test_stream_write_is_retried_from_spool()
+    test_stream_write_is_retried_from_replay()
+    test_stream_write_fails_after_retries()
+    test_source_error_is_raised()
+    test_inputs_load_from_first_readable_destination()
@@ -0,0 +1,93 @@
+"""
+Tests for the fact row enrichment in `hass_datasette_etl.assets.lookups`.
+"""
+
+import os
+import sys
+from unittest import mock
+
+import pandas as pd
+
+# Add the project directory to the Python path
+sys.path.insert(0, os.path.abspath("."))
+
+from hass_datasette_etl.assets import lookups
+from hass_datasette_etl.assets.lookups import DimensionCache, enrich_chunk, label_ids
+
+
+def _datasette(rows: list[dict]):
+    """Patch the Datasette query of cache misses to answer with `rows`, whatever the ids asked."""
+    return mock.patch.object(lookups, "query_datasette", return_value=pd.DataFrame(rows))
+
+
+def _statistics_meta_cache(max_size: int = 100) -> DimensionCache:
+    cache = DimensionCache("statistics_meta", max_size=max_size)
+    cache._put(1, {"statistic_id": "sensor.power", "unit_of_measurement": "W"})
+    return cache
+
+
+def test_label_ids():
+    """Ids are read from labelled objects and plain values, anything else is NaN."""
+    values = pd.Series(['{"value": 12, "label": "sensor.power"}', "7", "", '{"value": 3, "label": null}', "abc"])
+    assert label_ids(values).tolist()[:2] == [12, 7]
+    assert label_ids(values).isna().tolist() == [False, False, True, False, True]
+    assert label_ids(values)[3] == 3
+
+
+def test_enrich_chunk_with_dangling_keys():
+    """Cached, fetched, dangling and empty keys; dangling keys get empty columns and are looked up once."""
+    cache = _statistics_meta_cache()
+    chunk = pd.DataFrame({
+        "id": ["1", "2", "3", "4"],
+        "metadata_id": ['{"value": 1, "label": "Power"}', "2", "9", ""],
+    })
+
+    with _datasette([{"id": 2, "statistic_id": "sensor.energy", "unit_of_measurement": None}]) as query:
+        enriched = enrich_chunk(chunk, "statistics", cache)
+        assert query.call_count == 1
+        ids = query.call_args.args[0].rsplit("in (", 1)[1].rstrip(")")
+        assert sorted(ids.split(", ")) == ["2", "9"]
+
+    assert enriched["entity_id"].tolist() == ["sensor.power", "sensor.energy", "", ""]
+    assert enriched["uom"].tolist() == ["W", "", "", ""]
+
+    # Both misses are cached now, the dangling one as None
+    with _datasette([]) as query:
+        enrich_chunk(pd.DataFrame({"id": ["5"], "metadata_id": ["9"]}), "statistics", cache)
+        assert query.call_count == 0
+    assert cache.stats["hits"] == 2 and cache.stats["misses"] == 2
+
+
+def test_enrich_chunk_keeps_existing_values():
+    """Rows that already carry a denormalized value keep it, empty ones are filled."""
+    cache = _statistics_meta_cache()
+    chunk = pd.DataFrame({
+        "metadata_id": ["1", "1"],
+        "entity_id": ["sensor.renamed", ""],
+        "uom": ["kW", ""],
+    })
+
+    enriched = enrich_chunk(chunk, "statistics", cache)
+
+    assert enriched["entity_id"].tolist() == ["sensor.renamed", "sensor.power"]
+    assert enriched["uom"].tolist() == ["kW", "W"]
+
+
+def test_cache_evicts_least_recently_used():
+    """Past max_size the least recently used id is evicted and fetched again when needed."""
+    cache = _statistics_meta_cache(max_size=2)
+    cache._put(2, {"statistic_id": "sensor.energy", "unit_of_measurement": "kWh"})
+    cache.lookup([1])
+    cache._put(3, {"statistic_id": "sensor.temperature", "unit_of_measurement": "°C"})
+
+    assert cache.stats["evictions"] == 1
+    with _datasette([{"id": 2, "statistic_id": "sensor.energy", "unit_of_measurement": "kWh"}]) as query:
+        assert cache.lookup([1, 2])[2]["statistic_id"] == "sensor.energy"
+        assert query.call_count == 1
+
+
+if __name__ == "__main__":
+    test_label_ids()
+    test_enrich_chunk_with_dangling_keys()
+    test_enrich_chunk_keeps_existing_values()
+    test_cache_evicts_least_recently_used()
@@ -0,0 +1,84 @@
+"""
+Tests for the shared Datasette rate limiter in `hass_datasette_etl.assets.ratelimit`.
+"""
+
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Add the project directory to the Python path
+sys.path.insert(0, os.path.abspath("."))
+
+from hass_datasette_etl.assets.ratelimit import DatasetteRateLimiter
+
+
+def _limiter(path: Path, **kwargs) -> DatasetteRateLimiter:
+    options = {"min_rate": 0.5, "max_rate": 4.0, "target_latency": 1.0, "increase": 0.5, "decrease": 0.5}
+    return DatasetteRateLimiter(path, **{**options, **kwargs})
+
+
+def test_rate_increases_additively_up_to_max():
+    """Responses under the target latency add `increase` to the rate, up to max_rate."""
+    with tempfile.TemporaryDirectory() as tmp:
+        limiter = _limiter(Path(tmp) / "ratelimit.json")
+        assert limiter.record(0.1, 200) == 2.5
+        assert limiter.record(0.1, 200) == 3.0
+        for _ in range(5):
+            rate = limiter.record(0.1, 200)
+        assert rate == 4.0
+
+
+def test_rate_decreases_multiplicatively_on_slow_responses():
+    """Responses over the target latency multiply the rate by `decrease`, down to min_rate."""
+    with tempfile.TemporaryDirectory() as tmp:
+        limiter = _limiter(Path(tmp) / "ratelimit.json")
+        assert limiter.record(2.0, 200) == 1.0
+        assert limiter.record(2.0, 200) == 0.5
+        assert limiter.record(2.0, 200) == 0.5
+
+
+def test_overload_halves_rate_and_pauses():
+    """429/5xx and failed requests halve the rate, empty the bucket and pause every process."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "ratelimit.json"
+        limiter = _limiter(path, decrease=0.8)
+        assert limiter.record(0.1, 429, retry_after=30) == 1.0
+        state = json.loads(path.read_text())
+        assert state["tokens"] <= 0
+        assert state["paused_until"] >= state["updated"] + 29
+
+        assert limiter.record(0.1, None) == 0.5
+        assert limiter.record(0.1, 503) == 0.5
+
+
+def test_state_is_shared_through_the_file():
+    """Limiters on the same file, like separate run processes, share one rate and bucket."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "ratelimit.json"
+        first, second = _limiter(path, burst=2.0), _limiter(path, burst=2.0)
+        first.record(2.0, 200)
+        assert second.record(0.1, 200) == 1.5
+
+        # The burst is spent without waiting, whichever limiter takes the tokens
+        assert first.acquire() < 0.1
+        assert second.acquire() < 0.1
+        assert json.loads(path.read_text())["tokens"] < 1
+
+
+def test_acquire_waits_for_refill():
+    """With the bucket empty, acquire waits about one token at the current rate."""
+    with tempfile.TemporaryDirectory() as tmp:
+        limiter = _limiter(Path(tmp) / "ratelimit.json", min_rate=10.0, max_rate=20.0, burst=1.0)
+        assert limiter.acquire() < 0.05
+        waited = limiter.acquire()
+        assert 0.03 < waited < 1.0
+
+
+if __name__ == "__main__":
+    test_rate_increases_additively_up_to_max()
+    test_rate_decreases_multiplicatively_on_slow_responses()
+    test_overload_halves_rate_and_pauses()
+    test_state_is_shared_through_the_file()
+    test_acquire_waits_for_refill()
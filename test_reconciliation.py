@@ -0,0 +1,101 @@
+"""
+Tests for rolling hourly aggregates up into partitions in `hass_datasette_etl.reconciliation`.
+"""
+
+import os
+import sys
+
+from unittest import mock
+
+import pandas as pd
+
+# Add the project directory to the Python path
+sys.path.insert(0, os.path.abspath("."))
+
+from hass_datasette_etl.assets.utils import partition_bounds
+from hass_datasette_etl import reconciliation
+from hass_datasette_etl.reconciliation import RECONCILED_TABLES, partition_aggregates, reconcile_table
+
+
+def _hour(partition_key: str, offset: int = 0) -> int:
+    """Hour number (unix time / 3600) of an hour of a partition, like the aggregate queries return."""
+    # First whole hour starting in the partition, local time may be offset by half an hour
+    return -(-partition_bounds(partition_key)[0] // 3600) + offset
+
+
+def _hourly(rows: list[tuple]) -> pd.DataFrame:
+    return pd.DataFrame(rows, columns=["hour", "row_count", "min_id", "max_id"])
+
+
+def test_daily_partitions():
+    """Hours are summed into their day, hours outside the partitions and empty days are left out."""
+    keys = ["2025-06-07", "2025-06-08", "2025-06-09"]
+    hourly = _hourly([
+        (_hour("2025-06-07", -1), 5, 1, 5),
+        (_hour("2025-06-07"), 10, 6, 15),
+        (_hour("2025-06-07", 23), 20, 16, 35),
+        (_hour("2025-06-09", 12), 7, 40, 46),
+        (_hour("2025-06-09", 24), 3, 47, 49),
+    ])
+
+    assert partition_aggregates(hourly, keys) == {
+        "2025-06-07": (30, 6, 35),
+        "2025-06-09": (7, 40, 46),
+    }
+
+
+def test_hourly_partitions():
+    """Hourly partition keys get one hour each."""
+    keys = ["2025-06-07-00:00", "2025-06-07-01:00"]
+    hourly = _hourly([
+        (_hour("2025-06-07-00:00"), 4, 1, 4),
+        (_hour("2025-06-07-01:00"), 2, 5, 6),
+    ])
+
+    assert partition_aggregates(hourly, keys) == {
+        "2025-06-07-00:00": (4, 1, 4),
+        "2025-06-07-01:00": (2, 5, 6),
+    }
+
+
+def test_string_aggregates_and_empty_input():
+    """Aggregates read back as strings are converted, empty inputs give no partitions."""
+    hourly = _hourly([(str(_hour("2025-06-07", 3)), "8", "100", "107")])
+    assert partition_aggregates(hourly, ["2025-06-07"]) == {"2025-06-07": (8, 100, 107)}
+
+    assert partition_aggregates(_hourly([]), ["2025-06-07"]) == {}
+    assert partition_aggregates(hourly, []) == {}
+
+
+def test_reconcile_table_queries_clickhouse_once():
+    """All months are compared with one ClickHouse query and one Datasette query per month."""
+    months = {"2025-05": ["2025-05-31"], "2025-06": ["2025-06-01", "2025-06-02"]}
+    client = mock.Mock()
+    client.execute.return_value = [
+        (_hour("2025-05-31", 2), 10, 1, 10),
+        (_hour("2025-06-01", 5), 4, 11, 14),
+    ]
+    datasette = [
+        _hourly([(_hour("2025-05-31", 2), 10, 1, 10)]),
+        _hourly([(_hour("2025-06-01", 5), 5, 11, 15), (_hour("2025-06-02", 1), 2, 16, 17)]),
+    ]
+
+    with mock.patch.object(reconciliation, "query_datasette", side_effect=datasette) as query:
+        mismatches = reconcile_table(RECONCILED_TABLES[0], months, client)
+
+    assert client.execute.call_count == 1
+    assert client.execute.call_args.args[1] == {
+        "start": partition_bounds("2025-05-31")[0], "end": partition_bounds("2025-06-02")[1]
+    }
+    assert query.call_count == 2
+    assert mismatches == {
+        "2025-06-01": {"datasette": (5, 11, 15), "clickhouse": (4, 11, 14)},
+        "2025-06-02": {"datasette": (2, 16, 17), "clickhouse": (0, None, None)},
+    }
+
+
+if __name__ == "__main__":
+    test_daily_partitions()
+    test_hourly_partitions()
+    test_string_aggregates_and_empty_input()
+    test_reconcile_table_queries_clickhouse_once()
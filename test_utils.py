@@ -0,0 +1,193 @@
+"""
+Tests for the Datasette extraction helpers in `hass_datasette_etl.assets.utils`.
+"""
+
+import os
+import sqlite3
+import sys
+
+import pytest
+from dagster import DagsterInstance, Output, StaticPartitionsDefinition, asset, materialize
+
+# Add the project directory to the Python path
+sys.path.insert(0, os.path.abspath("."))
+
+from hass_datasette_etl.assets import utils
+from hass_datasette_etl.assets.utils import FORCE_REFRESH_TAG, _labelled_rows, build_pushdown_query, next_page_size, source_unchanged
+
+
+def test_next_page_size_keeps_size_without_measurement():
+    """An empty page or a zero latency says nothing about the right size."""
+    assert next_page_size(0, 0.5, 1000, current=800, max_rows=5000) == 800
+    assert next_page_size(500, 0.0, 1000, current=800, max_rows=5000) == 800
+
+
+def test_next_page_size_at_most_doubles():
+    """A fast page grows the size, but no more than twice the current one."""
+    assert next_page_size(1000, utils.DATASETTE_PAGE_SECONDS / 100, 1000, current=1000, max_rows=50_000) == 2000
+
+
+def test_next_page_size_follows_latency_target():
+    """A slow page shrinks the size towards the target latency."""
+    latency = utils.DATASETTE_PAGE_SECONDS * 4
+    assert next_page_size(1000, latency, 1000, current=1000, max_rows=50_000) == max(utils.DATASETTE_MIN_PAGE_ROWS, 250)
+
+
+def test_next_page_size_follows_payload_target():
+    """A page over the payload target shrinks the size even when it was fast."""
+    payload_bytes = utils.DATASETTE_PAGE_BYTES * 4
+    assert next_page_size(1000, utils.DATASETTE_PAGE_SECONDS / 2, payload_bytes, current=1000, max_rows=50_000) == max(
+        utils.DATASETTE_MIN_PAGE_ROWS, 250
+    )
+
+
+def test_next_page_size_bounds():
+    """The size stays between DATASETTE_MIN_PAGE_ROWS and the server's max rows."""
+    assert next_page_size(1000, utils.DATASETTE_PAGE_SECONDS * 1000, 1000, current=1000, max_rows=50_000) == utils.DATASETTE_MIN_PAGE_ROWS
+    assert next_page_size(1000, utils.DATASETTE_PAGE_SECONDS / 100, 1000, current=1000, max_rows=1500) == 1500
+
+
+def _recorder_db() -> sqlite3.Connection:
+    """
+    In-memory statistics/statistics_meta pair: a labelled key, a key whose
+    meta row has no name, a dangling key and a NULL key.
+    """
+    db = sqlite3.connect(":memory:")
+    db.executescript(
+        """
+        create table statistics_meta (id integer primary key, statistic_id text, name text);
+        create table statistics (id integer primary key, metadata_id integer, start_ts real, mean real);
+        insert into statistics_meta values (1, 'sensor.power', 'Power'), (2, 'sensor.energy', null);
+        insert into statistics values (1, 1, 100.0, 1.5), (2, 2, 100.0, 2.5), (3, 9, 200.0, 3.5), (4, null, 200.0, 4.5);
+        """
+    )
+    return db
+
+
+def _fetch(db: sqlite3.Connection, sql: str, params: dict) -> tuple[list, list[str]]:
+    cursor = db.execute(sql, params)
+    return [list(row) for row in cursor.fetchall()], [column[0] for column in cursor.description]
+
+
+def test_pushdown_query_labels_like_datasette():
+    """Found keys become value/label objects, dangling and NULL keys stay plain like `_labels=on`."""
+    db = _recorder_db()
+    columns = ["id", "metadata_id", "start_ts", "mean"]
+    sql, params = build_pushdown_query("statistics", columns, joins=True)
+    rows, result_columns = _labelled_rows(*_fetch(db, sql, {"after": 0, "size": 10, **params}), ["metadata_id"])
+
+    assert result_columns == columns
+    assert [row[1] for row in rows] == [
+        {"value": 1, "label": "Power"},
+        {"value": 2, "label": None},
+        9,
+        None,
+    ]
+
+
+def test_pushdown_query_labels_without_join():
+    """Keys labelled with their own id need no join, the other keys stay plain without joins."""
+    db = _recorder_db()
+    sql, _ = build_pushdown_query("statistics", ["id", "metadata_id"], joins=False)
+    assert "join" not in sql
+    rows, _ = _labelled_rows(*_fetch(db, sql, {"after": 0, "size": 10}), ["metadata_id"])
+    assert [row[1] for row in rows] == [1, 2, 9, None]
+
+    sql, _ = build_pushdown_query("events", ["event_id", "data_id"], joins=True)
+    assert "join" not in sql
+    assert '"data_id__label"' in sql
+
+
+def test_pushdown_query_pages_and_filters():
+    """Pages continue after the last primary key, within the partition and the filters."""
+    db = _recorder_db()
+    sql, params = build_pushdown_query(
+        "statistics", ["id", "metadata_id", "start_ts"], partition_col="start_ts", filters={"id__lte": 3}
+    )
+    rows, _ = _fetch(db, sql, {"after": 1, "size": 10, "start": 100, "end": 300, **params})
+    assert [row[0] for row in rows] == [2, 3]
+
+    rows, _ = _fetch(db, sql, {"after": 0, "size": 1, "start": 150, "end": 300, **params})
+    assert [row[0] for row in rows] == [3]
+
+
+def test_pushdown_query_rejects_unknown_filters():
+    """Filters SQL mode can't translate fail instead of being ignored."""
+    with pytest.raises(ValueError):
+        build_pushdown_query("statistics", ["id", "start_ts"], filters={"id__like": "1%"})
+    with pytest.raises(ValueError):
+        build_pushdown_query("statistics", ["id", "start_ts"], filters={"mean__gt": 1})
+
+
+def _probed_asset(probe: dict, partitions_def=None):
+    """
+    Asset that skips its output when `source_unchanged` says so, like the extraction assets.
+    """
+    @asset(name="probed", partitions_def=partitions_def, output_required=False)
+    def probed(context):
+        if source_unchanged(context, probe):
+            return
+        yield Output(1, metadata=probe)
+
+    return probed
+
+
+def test_source_unchanged_skips_matching_probe():
+    """A probe equal to the last materialization's metadata skips and records an observation."""
+    instance = DagsterInstance.ephemeral()
+    probe = {"row_count": 10, "max_id": 42}
+
+    first = materialize([_probed_asset(probe)], instance=instance)
+    assert len(first.get_asset_materialization_events()) == 1
+    assert not first.get_asset_observation_events()
+
+    second = materialize([_probed_asset(probe)], instance=instance)
+    assert not second.get_asset_materialization_events()
+    observations = second.get_asset_observation_events()
+    assert len(observations) == 1
+    metadata = observations[0].asset_observation_data.asset_observation.metadata
+    assert metadata["max_id"].value == 42
+    assert metadata["unchanged_since_run"].value == first.run_id
+
+
+def test_source_unchanged_fetches_changed_probe():
+    """Any changed value, or the force refresh tag, fetches again."""
+    instance = DagsterInstance.ephemeral()
+    materialize([_probed_asset({"row_count": 10, "max_id": 42})], instance=instance)
+
+    changed = materialize([_probed_asset({"row_count": 11, "max_id": 42})], instance=instance)
+    assert len(changed.get_asset_materialization_events()) == 1
+
+    forced = materialize(
+        [_probed_asset({"row_count": 11, "max_id": 42})], instance=instance, tags={FORCE_REFRESH_TAG: "true"}
+    )
+    assert len(forced.get_asset_materialization_events()) == 1
+
+
+def test_source_unchanged_compares_the_same_partition():
+    """A partition is only compared with its own last materialization."""
+    instance = DagsterInstance.ephemeral()
+    partitions_def = StaticPartitionsDefinition(["2025-06-07", "2025-06-08"])
+    probe = {"row_count": 10, "max_id": 42}
+
+    materialize([_probed_asset(probe, partitions_def)], instance=instance, partition_key="2025-06-07")
+    other = materialize([_probed_asset(probe, partitions_def)], instance=instance, partition_key="2025-06-08")
+    assert len(other.get_asset_materialization_events()) == 1
+
+    again = materialize([_probed_asset(probe, partitions_def)], instance=instance, partition_key="2025-06-07")
+    assert not again.get_asset_materialization_events()
+
+
+if __name__ == "__main__":
+    test_next_page_size_keeps_size_without_measurement()
+    test_next_page_size_at_most_doubles()
+    test_next_page_size_follows_latency_target()
+    test_next_page_size_follows_payload_target()
+    test_next_page_size_bounds()
+    test_pushdown_query_labels_like_datasette()
+    test_pushdown_query_labels_without_join()
+    test_pushdown_query_pages_and_filters()
+    test_pushdown_query_rejects_unknown_filters()
+    test_source_unchanged_skips_matching_probe()
+    test_source_unchanged_fetches_changed_probe()
+    test_source_unchanged_compares_the_same_partition()
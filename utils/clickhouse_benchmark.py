@@ -0,0 +1,243 @@
+# /// script
+# requires-python = ">=3.12"
+# dependencies = [
+#     "clickhouse-connect",
+#     "python-dotenv",
+#     "typer",
+# ]
+# ///
+
+#!/usr/bin/env python3
+"""
+ClickHouse benchmarks
+
+`marts` builds the marts the way dbt does (`create table ... as select`) in a
+scratch table, once with the previous hash joins against the dimension views
+and once with dictionary lookups. Needs the dbt staging/intermediate views
+(`dbt build` once) and the dictionaries from `sql/init_tables.sql`.
+
+`queries` runs typical lookups on the raw tables (statistics of one sensor,
+events of one type, event data of one entity) with skip indexes and
+projections disabled and enabled. Run `clickhouse_schema_migration_job` first.
+
+Both report wall time plus server side duration, memory and rows read from
+`system.query_log`.
+
+Usage:
+    uv run utils/clickhouse_benchmark.py marts [OPTIONS]
+    uv run utils/clickhouse_benchmark.py queries [--runs N] [--dotenv-path TEXT]
+
+Options (marts):
+    --schema TEXT      dbt schema holding the staging views (defaults to DBT_SCHEMA env var or 'hass')
+    --runs INTEGER     Builds per variant, the median is reported (default 3)
+    --mart TEXT        Only benchmark this mart (events or statistics)
+    --dotenv-path TEXT Path to the .env file (defaults to .env in the current directory)
+    --help             Show this message and exit.
+"""
+
+import os
+import time
+import uuid
+import statistics
+from typing import Optional
+
+import typer
+import clickhouse_connect
+from clickhouse_connect import driver
+from dotenv import load_dotenv
+
+app = typer.Typer(help="Benchmark ClickHouse mart builds and raw table lookups")
+
+# Numeric id inside a Datasette `_labels=on` foreign key column
+LABEL_ID = "toUInt32OrZero(trim(simpleJSONExtractRaw({column}, 'value')))"
+
+# Raw table lookups; the value looked up is picked from the data with `pick`
+LOOKUPS = {
+    "statistics by metadata_id": {
+        "pick": f"select {LABEL_ID.format(column='metadata_id')} from raw.statistics limit 1",
+        "query": f"""
+            select count(), avg(toFloat64OrNull(mean)) from raw.statistics
+            where {LABEL_ID.format(column='metadata_id')} = {{value}}
+        """,
+    },
+    "events by event type": {
+        "pick": f"select {LABEL_ID.format(column='event_type_id')} from raw.events limit 1",
+        "query": f"""
+            select count() from raw.events
+            where {LABEL_ID.format(column='event_type_id')} = {{value}}
+        """,
+    },
+    "event_data by entity_id": {
+        "pick": "select entity_id from raw.event_data where entity_id != '' limit 1",
+        "query": "select count() from raw.event_data where entity_id = '{value}'",
+    },
+}
+
+# Settings that make ClickHouse ignore the skip indexes and projections
+WITHOUT_INDEXES = {"use_skip_indexes": 0, "optimize_use_projections": 0}
+
+# Mart select statements, before (hash joins) and after (dictionaries)
+MART_VARIANTS = {
+    "events": {
+        "join": """
+            select e.time_fired_at_local as event_time, et.event_type,
+                ed.domain, ed.service, ed.service_data, ed.entity_id, ed.shared_data,
+                e.id as event_id, e.data_id as event_data_id, e.event_type_id
+            from {schema}.stg_events as e
+            left outer join {schema}.stg_event_data as ed on e.data_id = ed.id
+            left outer join {schema}.stg_event_types as et on e.event_type_id = et.id
+        """,
+        "dictionary": """
+            select e.time_fired_at_local as event_time,
+                dictGetOrNull('raw.event_types_dict', 'event_type', assumeNotNull(e.event_type_id)) as event_type,
+                ed.domain, ed.service, ed.service_data, ed.entity_id, ed.shared_data,
+                e.id as event_id, e.data_id as event_data_id, e.event_type_id
+            from {schema}.stg_events as e
+            left outer join {schema}.stg_event_data as ed on e.data_id = ed.id
+        """,
+    },
+    "statistics": {
+        "join": """
+            select s.id, s.created_at_local as created_at, m.entity_id, m.uom,
+                s.start_at_local as start_at, s.mean, s.min, s.max, s.sum,
+                s.last_reset_at_local as last_reset_at, s.state
+            from {schema}.int_statistics as s
+            left outer join {schema}.int_statistics_meta as m on s.metadata_id = m.id
+        """,
+        "dictionary": """
+            select s.id, s.created_at_local as created_at,
+                dictGetOrNull('raw.statistics_meta_dict', 'entity_id', assumeNotNull(s.metadata_id)) as entity_id,
+                dictGetOrNull('raw.statistics_meta_dict', 'uom', assumeNotNull(s.metadata_id)) as uom,
+                s.start_at_local as start_at, s.mean, s.min, s.max, s.sum,
+                s.last_reset_at_local as last_reset_at, s.state
+            from {schema}.int_statistics as s
+        """,
+    },
+}
+
+
+def get_clickhouse_client(dotenv_path: Optional[str] = None) -> driver.Client:
+    """
+    Create a ClickHouse client from the CLICKHOUSE_* environment variables.
+    """
+    load_dotenv(dotenv_path=dotenv_path)
+
+    return clickhouse_connect.get_client(
+        host=os.getenv("CLICKHOUSE_HOST", "localhost"),
+        port=int(os.getenv("CLICKHOUSE_PORT", "8143")),
+        username=os.getenv("CLICKHOUSE_USER", "default"),
+        password=os.getenv("CLICKHOUSE_PASSWORD", ""),
+        database=os.getenv("CLICKHOUSE_DB", "default"),
+    )
+
+
+def timed_command(client: driver.Client, sql: str, settings: Optional[dict] = None) -> dict:
+    """
+    Run one statement and collect its wall time and query_log statistics.
+    """
+    query_id = f"benchmark-{uuid.uuid4()}"
+    start = time.perf_counter()
+    client.command(sql, settings={**(settings or {}), "query_id": query_id})
+    wall_s = time.perf_counter() - start
+
+    client.command("system flush logs")
+    row = client.query(
+        "select query_duration_ms, memory_usage, read_rows from system.query_log "
+        "where query_id = {query_id:String} and type = 'QueryFinish'",
+        parameters={"query_id": query_id},
+    ).first_row
+    duration_ms, memory, read_rows = row if row else (None, None, None)
+    return {"wall_s": wall_s, "duration_ms": duration_ms, "memory": memory, "read_rows": read_rows}
+
+
+def build_once(client: driver.Client, schema: str, mart: str, variant: str) -> dict:
+    """
+    Build a mart variant into a scratch table and drop it again.
+    """
+    table = f"{schema}.__benchmark_{mart}_{variant}"
+    select = MART_VARIANTS[mart][variant].format(schema=schema)
+    client.command(f"drop table if exists {table}")
+    try:
+        return timed_command(client, f"create table {table} engine = MergeTree order by tuple() as {select}")
+    finally:
+        client.command(f"drop table if exists {table}")
+
+
+@app.callback()
+def main() -> None:
+    """
+    Benchmark ClickHouse mart builds and raw table lookups.
+    """
+
+
+def median(results: list[dict], key: str):
+    values = [r[key] for r in results if r[key] is not None]
+    return statistics.median(values) if values else None
+
+
+@app.command()
+def marts(
+    schema: str = typer.Option(os.getenv("DBT_SCHEMA", "hass"), help="dbt schema holding the staging views"),
+    runs: int = typer.Option(3, help="Builds per variant, the median is reported"),
+    mart: Optional[str] = typer.Option(None, help="Only benchmark this mart (events or statistics)"),
+    dotenv_path: Optional[str] = typer.Option(None, help="Path to the .env file (defaults to .env in the current directory)"),
+) -> None:
+    """
+    Compare mart build times with hash joins and with dictionary lookups.
+    """
+    client = get_clickhouse_client(dotenv_path)
+    client.command("system reload dictionaries")
+
+    marts_to_run = [mart] if mart else list(MART_VARIANTS)
+    typer.echo(f"{'mart':<12}{'variant':<12}{'wall s':>10}{'server ms':>12}{'memory MiB':>12}{'rows read':>14}")
+    for name in marts_to_run:
+        for variant in MART_VARIANTS[name]:
+            # One untimed build to warm caches, so both variants start equal
+            build_once(client, schema, name, variant)
+            results = [build_once(client, schema, name, variant) for _ in range(runs)]
+
+            memory = median(results, "memory")
+            duration = median(results, "duration_ms")
+            read_rows = median(results, "read_rows")
+            typer.echo(
+                f"{name:<12}{variant:<12}{median(results, 'wall_s'):>10.2f}"
+                f"{duration if duration is not None else '-':>12}"
+                f"{f'{memory / 2**20:.1f}' if memory is not None else '-':>12}"
+                f"{read_rows if read_rows is not None else '-':>14}"
+            )
+
+
+@app.command()
+def queries(
+    runs: int = typer.Option(3, help="Runs per variant, the median is reported"),
+    dotenv_path: Optional[str] = typer.Option(None, help="Path to the .env file (defaults to .env in the current directory)"),
+) -> None:
+    """
+    Compare raw table lookups without and with skip indexes/projections.
+    """
+    client = get_clickhouse_client(dotenv_path)
+
+    typer.echo(f"{'lookup':<28}{'variant':<12}{'wall s':>10}{'server ms':>12}{'memory MiB':>12}{'rows read':>14}")
+    for name, lookup in LOOKUPS.items():
+        row = client.query(lookup["pick"]).first_row
+        if not row:
+            typer.echo(f"{name:<28}no data, skipped")
+            continue
+        sql = lookup["query"].format(value=row[0])
+
+        for variant, settings in (("full scan", WITHOUT_INDEXES), ("indexed", {})):
+            results = [timed_command(client, sql, settings) for _ in range(runs)]
+
+            memory = median(results, "memory")
+            duration = median(results, "duration_ms")
+            read_rows = median(results, "read_rows")
+            typer.echo(
+                f"{name:<28}{variant:<12}{median(results, 'wall_s'):>10.2f}"
+                f"{duration if duration is not None else '-':>12}"
+                f"{f'{memory / 2**20:.1f}' if memory is not None else '-':>12}"
+                f"{read_rows if read_rows is not None else '-':>14}"
+            )
+
+
+if __name__ == "__main__":
+    app()
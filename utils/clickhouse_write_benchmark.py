@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+Offline ClickHouse write path benchmark
+
+Runs against an embedded ClickHouse (chDB), no server or network needed:
+
+1. applies `sql/init_tables.sql` (raw tables, rollup views, dictionaries)
+2. generates synthetic partitions shaped like Datasette `_labels=on` pages,
+   normalizes them with the assets' `normalize_rows` and inserts them chunk
+   by chunk with the IO manager's `insert_chunk`, the statistics insert time
+   includes the rollup views. `state_attributes` is
+   loaded above a high-water mark, only the attribute sets new that day
+3. optionally re-inserts some days, like a replay or refresh does, so the
+   ReplacingMergeTree tables hold duplicates for `FINAL` to collapse
+4. creates the dbt staging/intermediate views, builds the marts and times
+   every staging view with and without `FINAL`, and the history of one
+   entity from `raw.states`
+
+It reports insert rows/s, on-disk and uncompressed bytes per table and query
+latencies, so schema and load path changes can be compared run to run.
+
+The script imports the project's load path, so it runs in the project
+environment with chDB added:
+
+Usage:
+    uv run --with chdb utils/clickhouse_write_benchmark.py [OPTIONS]
+
+Options:
+    --days INTEGER             Daily partitions to generate (default 3)
+    --statistics-rows INTEGER  statistics rows per day (default 100000)
+    --events-rows INTEGER      events rows per day (default 20000)
+    --states-rows INTEGER      states rows per day (default 100000)
+    --attributes-rows INTEGER  New state_attributes rows per day (default 2000)
+    --sensors INTEGER          Distinct statistics_meta rows (default 500)
+    --entities INTEGER         Distinct states_meta rows (default 500)
+    --duplicate-days INTEGER   Days inserted a second time (default 1)
+    --chunk-rows INTEGER       Rows per inserted chunk (defaults to DATASETTE_CHUNK_ROWS)
+    --runs INTEGER             Runs per query, the median is reported (default 3)
+    --path TEXT                chDB data directory (defaults to a temporary directory)
+    --help                     Show this message and exit.
+"""
+
+import re
+import sys
+import json
+import time
+import types
+import random
+import hashlib
+import tempfile
+import statistics
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+import typer
+from chdb.session import Session
+
+ROOT = Path(__file__).resolve().parent.parent
+DBT_MODELS = ROOT / "hass_datasette_etl" / "hass_dbt" / "models"
+DBT_SCHEMA = "bench"
+
+# Import the load path without running the package __init__ (Dagster definitions, dbt parse)
+for package in ("hass_datasette_etl", "hass_datasette_etl.assets"):
+    module = types.ModuleType(package)
+    module.__path__ = [str(ROOT / package.replace(".", "/"))]
+    sys.modules.setdefault(package, module)
+
+from hass_datasette_etl.io_managers import insert_chunk  # noqa: E402
+from hass_datasette_etl.assets.utils import DATASETTE_CHUNK_ROWS, normalize_rows  # noqa: E402
+
+app = typer.Typer(help="Benchmark the ClickHouse write path on an embedded chDB")
+
+DOMAINS = {"light": ["turn_on", "turn_off"], "switch": ["toggle"], "climate": ["set_temperature"], "cover": ["open_cover"]}
+EVENT_TYPES = ["state_changed", "call_service", "automation_triggered", "script_started", "homeassistant_start"]
+
+
+class ChdbClient:
+    """
+    The part of clickhouse_driver's Client that `insert_chunk` uses, on a chDB session.
+
+    `INSERT ... VALUES` with rows becomes an `INSERT ... SELECT` from the rows
+    as a DataFrame, the in-process equivalent of a native block insert.
+    """
+
+    def __init__(self, session: Session):
+        self.session = session
+
+    def execute(self, sql: str, params=None):
+        if params is None:
+            return self.session.query(sql)
+        match = re.match(r"\s*INSERT INTO (\S+) \((.*)\) VALUES\s*$", sql, re.IGNORECASE | re.DOTALL)
+        if not match:
+            raise ValueError(f"Unsupported statement with data: {sql}")
+        table, columns = match.groups()
+        chunk = pd.DataFrame(list(params), columns=[column.strip(" `") for column in columns.split(",")])  # noqa: F841
+        return self.session.query(f"INSERT INTO {table} ({columns}) SELECT * FROM Python(chunk)")
+
+
+def sql_statements(path: Path) -> list[str]:
+    """
+    Statements of a SQL file, with `--` comments removed.
+    """
+    text = "\n".join(re.sub(r"--.*$", "", line) for line in path.read_text().splitlines())
+    return [statement.strip() for statement in text.split(";") if statement.strip()]
+
+
+def render_model(sql: str) -> str:
+    """
+    Render the little Jinja the dbt models use: config, source and ref.
+    """
+    sql = re.sub(r"\{\{\s*config\(.*?\)\s*\}\}", "", sql, flags=re.DOTALL)
+    sql = re.sub(r"\{\{\s*source\('(\w+)',\s*'(\w+)'\)\s*\}\}", r"\1.\2", sql)
+    return re.sub(r"\{\{\s*ref\('(\w+)'\)\s*\}\}", rf"{DBT_SCHEMA}.\1", sql)
+
+
+def load_models() -> dict[str, dict]:
+    """
+    dbt models in dependency order, with their rendered SQL and materialization.
+    """
+    models = {}
+    for path in sorted(DBT_MODELS.glob("*/*.sql")):
+        raw = path.read_text()
+        materialized = re.search(r"materialized\s*=\s*'(\w+)'", raw)
+        models[path.stem] = {
+            "sql": render_model(raw),
+            "refs": re.findall(r"ref\('(\w+)'\)", raw),
+            "materialized": materialized.group(1) if materialized else ("table" if path.parent.name == "marts" else "view"),
+            "pre_hook": re.findall(r'pre_hook="([^"]+)"', raw),
+        }
+
+    ordered = {}
+    while len(ordered) < len(models):
+        for name, model in models.items():
+            if name not in ordered and all(ref in ordered for ref in model["refs"]):
+                ordered[name] = model
+    return ordered
+
+
+def statistics_meta_rows(sensors: int) -> list[list]:
+    return [
+        [i, f"sensor.synthetic_{i}", "recorder", random.choice(["W", "kWh", "°C", "%"]), 1, i % 2, None, 1]
+        for i in range(1, sensors + 1)
+    ]
+
+
+def statistics_rows(day_start: float, rows: int, sensors: int, first_id: int) -> list[list]:
+    out = []
+    for i in range(rows):
+        sensor = i % sensors + 1
+        start_ts = day_start + (i // sensors) * 300.0
+        mean = random.uniform(0, 100)
+        out.append([
+            first_id + i, None, start_ts + 300.0 + random.random(),
+            {"value": sensor, "label": f"sensor.synthetic_{sensor}"},
+            None, start_ts, mean, mean - random.uniform(0, 5), mean + random.uniform(0, 5),
+            None, None, round(mean, 2), round(i * 0.01, 3), None,
+        ])
+    return out
+
+
+def event_rows(day_start: float, rows: int, first_id: int) -> tuple[list[list], list[list]]:
+    events, event_data = [], []
+    for i in range(rows):
+        domain = random.choice(list(DOMAINS))
+        shared = json.dumps({
+            "domain": domain,
+            "service": random.choice(DOMAINS[domain]),
+            "service_data": {"entity_id": f"{domain}.synthetic_{i % 50}"},
+        })
+        data_id = first_id + i
+        event_data.append([data_id, int(hashlib.md5(shared.encode()).hexdigest()[:8], 16), shared])
+        type_id = random.randrange(len(EVENT_TYPES)) + 1
+        events.append([
+            data_id, None, None, None, 0, None, day_start + i * 86400.0 / rows,
+            None, None, None, {"value": data_id, "label": str(data_id)},
+            {"$base64": True, "encoded": "c3ludGhldGlj"}, None, None,
+            {"value": type_id, "label": EVENT_TYPES[type_id - 1]},
+        ])
+    return events, event_data
+
+
+def state_attributes_rows(first_id: int, rows: int) -> list[list]:
+    out = []
+    for attributes_id in range(first_id, first_id + rows):
+        shared = json.dumps({
+            "friendly_name": f"Synthetic {attributes_id % 500}",
+            "unit_of_measurement": random.choice(["W", "kWh", "°C", "%"]),
+            "brightness": random.randrange(256),
+        })
+        out.append([attributes_id, int(hashlib.md5(shared.encode()).hexdigest()[:8], 16), shared])
+    return out
+
+
+def state_rows(day_start: float, rows: int, entities: int, first_id: int, max_attributes_id: int) -> list[list]:
+    out = []
+    for i in range(rows):
+        state_id = first_id + i
+        entity = i % entities + 1
+        old_state_id = state_id - entities if i >= entities else None
+        attributes_id = random.randint(1, max_attributes_id)
+        updated_ts = day_start + i * 86400.0 / rows
+        out.append([
+            state_id, None, str(round(random.uniform(0, 100), 1)), None, None, None, None, None, None,
+            updated_ts, {"value": old_state_id, "label": str(old_state_id)} if old_state_id else None,
+            {"value": attributes_id, "label": str(attributes_id)},
+            None, None, None, 0, {"$base64": True, "encoded": "c3ludGhldGlj"}, None, None,
+            {"value": entity, "label": str(entity)},
+        ])
+    return out
+
+
+COLUMNS = {
+    "statistics_meta": ["id", "statistic_id", "source", "unit_of_measurement", "has_mean", "has_sum", "name", "mean_type"],
+    "statistics": [
+        "id", "created", "created_ts", "metadata_id", "start", "start_ts", "mean", "min", "max",
+        "last_reset", "last_reset_ts", "state", "sum", "mean_weight",
+    ],
+    "events": [
+        "event_id", "event_type", "event_data", "origin", "origin_idx", "time_fired", "time_fired_ts",
+        "context_id", "context_user_id", "context_parent_id", "data_id",
+        "context_id_bin", "context_user_id_bin", "context_parent_id_bin", "event_type_id",
+    ],
+    "event_data": ["data_id", "hash", "shared_data"],
+    "event_types": ["event_type_id", "event_type"],
+    "states_meta": ["metadata_id", "entity_id"],
+    "states": [
+        "state_id", "entity_id", "state", "attributes", "event_id", "last_changed", "last_changed_ts",
+        "last_reported_ts", "last_updated", "last_updated_ts", "old_state_id", "attributes_id",
+        "context_id", "context_user_id", "context_parent_id", "origin_idx",
+        "context_id_bin", "context_user_id_bin", "context_parent_id_bin", "metadata_id",
+    ],
+    "state_attributes": ["attributes_id", "hash", "shared_attrs"],
+}
+
+
+def load_table(client: ChdbClient, table: str, rows: list[list], chunk_rows: int, totals: dict) -> None:
+    """
+    Normalize and insert rows the way the streaming IO manager does, timing both steps.
+    """
+    loaded_at = time.time()
+    total = totals.setdefault(table, {"rows": 0, "normalize_s": 0.0, "insert_s": 0.0})
+    for offset in range(0, len(rows), chunk_rows):
+        start = time.perf_counter()
+        chunk = normalize_rows(rows[offset:offset + chunk_rows], COLUMNS[table], loaded_at)
+        normalized = time.perf_counter()
+        insert_chunk(client, f"raw.{table}", chunk)
+        inserted = time.perf_counter()
+
+        total["rows"] += len(chunk)
+        total["normalize_s"] += normalized - start
+        total["insert_s"] += inserted - normalized
+
+
+def timed_query(session: Session, sql: str, runs: int) -> dict:
+    """
+    Median wall time and rows read of a query.
+    """
+    results = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = session.query(sql)
+        results.append((time.perf_counter() - start, result.storage_rows_read()))
+    return {"wall_s": statistics.median(r[0] for r in results), "rows_read": statistics.median(r[1] for r in results)}
+
+
+def report_storage(session: Session) -> None:
+    """
+    Rows, on-disk and uncompressed bytes of the raw tables after merging.
+    """
+    # Merge what can be merged so on-disk sizes are comparable between runs
+    for table in COLUMNS:
+        session.query(f"optimize table raw.{table}")
+    parts = session.query(
+        """
+        select table, sum(rows), sum(bytes_on_disk), sum(data_uncompressed_bytes)
+        from system.parts where database = 'raw' and active
+        group by table order by table
+        """,
+        "TabSeparated",
+    ).bytes().decode()
+    typer.echo(f"\n{'table':<18}{'rows':>10}{'on disk MiB':>13}{'raw MiB':>10}{'ratio':>8}{'bytes/row':>11}")
+    for line in parts.splitlines():
+        table, rows, on_disk, uncompressed = line.split("\t")
+        rows, on_disk, uncompressed = int(rows), int(on_disk), int(uncompressed)
+        typer.echo(
+            f"{table:<18}{rows:>10}{on_disk / 2**20:>13.2f}{uncompressed / 2**20:>10.2f}"
+            f"{uncompressed / on_disk if on_disk else 0:>8.1f}{on_disk / rows if rows else 0:>11.1f}"
+        )
+
+
+@app.command()
+def main(
+    days: int = typer.Option(3, help="Daily partitions to generate"),
+    statistics_rows_per_day: int = typer.Option(100_000, "--statistics-rows", help="statistics rows per day"),
+    events_rows_per_day: int = typer.Option(20_000, "--events-rows", help="events rows per day"),
+    states_rows_per_day: int = typer.Option(100_000, "--states-rows", help="states rows per day"),
+    attributes_rows_per_day: int = typer.Option(2_000, "--attributes-rows", help="New state_attributes rows per day"),
+    sensors: int = typer.Option(500, help="Distinct statistics_meta rows"),
+    entities: int = typer.Option(500, help="Distinct states_meta rows"),
+    duplicate_days: int = typer.Option(1, help="Days inserted a second time"),
+    chunk_rows: int = typer.Option(DATASETTE_CHUNK_ROWS, help="Rows per inserted chunk"),
+    runs: int = typer.Option(3, help="Runs per query, the median is reported"),
+    path: Optional[str] = typer.Option(None, help="chDB data directory (defaults to a temporary directory)"),
+) -> None:
+    """
+    Load synthetic partitions into an embedded ClickHouse and time the write and query path.
+    """
+    random.seed(42)
+    data_dir = path or tempfile.mkdtemp(prefix="clickhouse-write-benchmark-")
+    session = Session(data_dir)
+    client = ChdbClient(session)
+    typer.echo(f"chDB data directory: {data_dir}")
+
+    # The dictionaries' connection, clickhouse/named_collections.xml on a server
+    session.query(
+        "create named collection if not exists hass_raw as "
+        "host = 'localhost', port = 9000, user = 'default', password = '', db = 'raw'"
+    )
+    for statement in sql_statements(ROOT / "sql" / "init_tables.sql"):
+        session.query(statement)
+
+    # Dimensions once, facts per day; duplicated days are re-inserted with a later loaded_at
+    totals = {}
+    load_table(client, "statistics_meta", statistics_meta_rows(sensors), chunk_rows, totals)
+    load_table(client, "event_types", [[i + 1, name] for i, name in enumerate(EVENT_TYPES)], chunk_rows, totals)
+    load_table(client, "states_meta", [[i, f"sensor.synthetic_{i}"] for i in range(1, entities + 1)], chunk_rows, totals)
+
+    first_day = pd.Timestamp("2025-06-07", tz="America/Los_Angeles").timestamp()
+    high_water_mark = 0
+    for day in list(range(days)) + list(range(min(duplicate_days, days))):
+        day_start = first_day + day * 86400
+        load_table(
+            client, "statistics",
+            statistics_rows(day_start, statistics_rows_per_day, sensors, 1 + day * statistics_rows_per_day),
+            chunk_rows, totals,
+        )
+        events, event_data = event_rows(day_start, events_rows_per_day, 1 + day * events_rows_per_day)
+        load_table(client, "event_data", event_data, chunk_rows, totals)
+        load_table(client, "events", events, chunk_rows, totals)
+
+        # Only attribute sets above the high-water mark are loaded, states reference any set seen so far
+        day_max_attributes_id = (day + 1) * attributes_rows_per_day
+        if day_max_attributes_id > high_water_mark:
+            load_table(
+                client, "state_attributes",
+                state_attributes_rows(high_water_mark + 1, day_max_attributes_id - high_water_mark),
+                chunk_rows, totals,
+            )
+            high_water_mark = day_max_attributes_id
+        load_table(
+            client, "states",
+            state_rows(day_start, states_rows_per_day, entities, 1 + day * states_rows_per_day, day_max_attributes_id),
+            chunk_rows, totals,
+        )
+
+    typer.echo(f"\n{'table':<18}{'rows':>10}{'normalize s':>13}{'insert s':>10}{'insert rows/s':>15}")
+    for table, total in totals.items():
+        rate = total["rows"] / total["insert_s"] if total["insert_s"] else 0
+        typer.echo(f"{table:<18}{total['rows']:>10}{total['normalize_s']:>13.2f}{total['insert_s']:>10.2f}{rate:>15,.0f}")
+
+    # dbt models, views first so the marts can be built on them
+    session.query(f"create database if not exists {DBT_SCHEMA}")
+    models = load_models()
+    typer.echo(f"\n{'query':<40}{'wall s':>10}{'rows read':>14}")
+    for name, model in models.items():
+        for hook in model["pre_hook"]:
+            session.query(hook)
+        if model["materialized"] == "view":
+            session.query(f"create or replace view {DBT_SCHEMA}.{name} as {model['sql']}")
+            if re.search(r"\bfinal\s*$", model["sql"]):
+                without_final = re.sub(r"\bfinal\s*$", "", model["sql"])
+                for label, sql in (("final", model["sql"]), ("no final", without_final)):
+                    # ignore(*) makes ClickHouse read every column instead of answering count() from metadata
+                    result = timed_query(session, f"select count() from ({sql}) where not ignore(*)", runs)
+                    typer.echo(f"{f'{name} ({label})':<40}{result['wall_s']:>10.3f}{result['rows_read']:>14,.0f}")
+            continue
+
+        result = timed_query(
+            session,
+            f"create or replace table {DBT_SCHEMA}.{name} engine = MergeTree order by tuple() as {model['sql']}",
+            runs,
+        )
+        built = session.query(f"select count() from {DBT_SCHEMA}.{name}", "TabSeparated").bytes().decode().strip()
+        typer.echo(f"{f'{name} (build, {built} rows)':<40}{result['wall_s']:>10.3f}{'-':>14}")
+
+    # Per-entity history, the leading column of the states sort key
+    for label, sql in (
+        ("one entity", "select * from raw.states final where toUInt32OrZero(trim(simpleJSONExtractRaw(metadata_id, 'value'))) = 1"),
+        ("all entities", "select * from raw.states final"),
+    ):
+        result = timed_query(session, f"select count() from ({sql}) where not ignore(*)", runs)
+        typer.echo(f"{f'states history ({label})':<40}{result['wall_s']:>10.3f}{result['rows_read']:>14,.0f}")
+
+    # Last, the queries above should still see the duplicated days unmerged
+    report_storage(session)
+
+
+if __name__ == "__main__":
+    app()
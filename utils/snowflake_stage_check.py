@@ -0,0 +1,166 @@
+# /// script
+# requires-python = ">=3.12"
+# dependencies = [
+#     "pandas",
+#     "pyarrow",
+# ]
+# ///
+
+#!/usr/bin/env python3
+"""
+Offline check of the Snowflake stage-and-COPY loader.
+
+Runs `SnowflakeStageLoader` against a local stand-in for the Snowflake
+connector: PUT copies files into a local stage directory, COPY INTO reads the
+staged Parquet files back and purges them. Like Snowflake, the stand-in only
+accepts stages that exist: a named stage once created, a table stage
+(`@schema.%table`) once its table is. Spools a synthetic backfill into a new
+table and verifies every row arrives with one PUT + COPY per batch.
+
+Usage:
+    uv run utils/snowflake_stage_check.py [partitions] [batch_files]
+"""
+
+import re
+import sys
+import shutil
+import tempfile
+import importlib.util
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Load the loader module directly, it has no project dependencies
+_spec = importlib.util.spec_from_file_location(
+    "snowflake_stage", Path(__file__).absolute().parents[1] / "hass_datasette_etl" / "snowflake_stage.py"
+)
+snowflake_stage = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(snowflake_stage)
+
+
+class LocalSnowflakeCursor:
+    """
+    Understands the handful of statements the loader issues.
+    """
+
+    def __init__(self, connection: "LocalSnowflakeConnection"):
+        self.connection = connection
+        self._result = []
+
+    def execute(self, sql: str):
+        self.connection.statements.append(sql)
+        statement = sql.strip().lower()
+        self._result = []
+
+        if statement.startswith("put"):
+            source, stage = re.match(r"put 'file://(.+)/\*\.parquet' (\S+)", sql, re.IGNORECASE).groups()
+            self.connection.check_stage(stage)
+            target = self.connection.stage_dir / stage.lstrip("@").lower()
+            target.mkdir(parents=True, exist_ok=True)
+            for path in Path(source).glob("*.parquet"):
+                shutil.copy(path, target / path.name)
+        elif statement.startswith("create stage"):
+            self.connection.stages.add(re.match(r"create stage if not exists (\S+)", statement).group(1))
+        elif statement.startswith("create table"):
+            table = re.match(r"create table if not exists (\S+)", statement).group(1)
+            for stage in re.findall(r"location => '([^']+)'", sql):
+                self.connection.check_stage(stage)
+            self.connection.created_tables.add(table)
+        elif statement.startswith("copy into"):
+            table, stage = re.match(r"copy into (\S+) from (\S+)", sql, re.IGNORECASE).groups()
+            self.connection.check_stage(stage)
+            if table.lower() not in self.connection.created_tables:
+                raise ValueError(f"Table {table} does not exist")
+            staged = self.connection.stage_dir / stage.lstrip("@").lower()
+            for path in sorted(staged.glob("*.parquet")):
+                df = pd.read_parquet(path)
+                self.connection.tables.setdefault(table, []).append(df)
+                self._result.append((path.name, "LOADED", len(df), len(df)))
+                path.unlink()
+        elif not statement.startswith("create"):
+            raise ValueError(f"Unexpected statement: {sql}")
+
+    def fetchall(self):
+        return self._result
+
+    def close(self):
+        pass
+
+
+class LocalSnowflakeConnection:
+    """
+    Stand-in for `snowflake.connector` connections backed by a local directory.
+    """
+
+    def __init__(self, stage_dir: Path):
+        self.stage_dir = stage_dir
+        self.statements = []
+        self.tables = {}
+        self.stages = set()
+        self.created_tables = set()
+        self.connections = 0
+
+    def __call__(self):
+        self.connections += 1
+        return self
+
+    def cursor(self):
+        return LocalSnowflakeCursor(self)
+
+    def check_stage(self, location: str) -> None:
+        """
+        Fail like Snowflake for a stage that doesn't exist (yet).
+        """
+        stage = location.lstrip("@").split("/", 1)[0].lower()
+        schema, _, name = stage.rpartition(".")
+        if name.startswith("%"):
+            if f"{schema}.{name[1:]}" not in self.created_tables:
+                raise ValueError(f"Stage {location} does not exist, table {schema}.{name[1:]} was not created yet")
+        elif stage not in self.stages:
+            raise ValueError(f"Stage {location} does not exist")
+
+    def close(self):
+        pass
+
+
+def main(partitions: int = 30, batch_files: int = 10) -> None:
+    workdir = Path(tempfile.mkdtemp())
+    try:
+        connection = LocalSnowflakeConnection(workdir / "stage")
+        loader = snowflake_stage.SnowflakeStageLoader(
+            connect=connection, spool_dir=workdir / "spool", batch_files=batch_files
+        )
+
+        expected_rows = 0
+        rng = np.random.default_rng(0)
+        for day in pd.date_range("2024-01-01", periods=partitions, freq="D"):
+            df = pd.DataFrame({
+                "id": np.arange(1000).astype(str),
+                "created_ts": str(day.timestamp()),
+                "mean": rng.random(1000).astype(str),
+                "loaded_at": float(day.timestamp()),
+            })
+            expected_rows += len(df)
+            loader.spool(df, "raw", "statistics", day.strftime("%Y-%m-%d"))
+            if loader.should_flush("raw", "statistics"):
+                loader.flush("raw", "statistics")
+        loader.flush_all()
+
+        loaded_rows = sum(len(df) for df in connection.tables.get("RAW.STATISTICS", []))
+        copies = sum(1 for sql in connection.statements if sql.lower().startswith("copy into"))
+        puts = sum(1 for sql in connection.statements if sql.lower().startswith("put"))
+
+        print(f"partitions={partitions} batch_files={batch_files}")
+        print(f"connections={connection.connections} puts={puts} copies={copies}")
+        print(f"rows expected={expected_rows} loaded={loaded_rows}")
+        assert loaded_rows == expected_rows, "rows missing after flush"
+        assert copies == -(-partitions // batch_files), "expected one COPY per batch"
+        assert not loader.pending("raw", "statistics"), "files left in the spool"
+        print("OK")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -27,11 +27,14 @@ Options:
     --clickhouse-password TEXT          ClickHouse password (defaults to CLICKHOUSE_PASSWORD env var or '')
     --clickhouse-db TEXT                ClickHouse database (defaults to CLICKHOUSE_DB env var or 'default')
     --dotenv-path TEXT                  Path to the .env file (defaults to .env in the current directory)
+    --profile PATH                      Save a speedscope sampling profile of the migration to PATH
     --help                              Show this message and exit.
 """
 
 import os
 import sqlite3
+import importlib.util
+from pathlib import Path
 from typing import Dict, List, Optional, Any
 
 import typer
@@ -41,6 +44,16 @@ from dotenv import load_dotenv
 
 app = typer.Typer(help="Migrate data from SQLite to ClickHouse")
 
+# The project's profiler is standard library only, load it without the package's dependencies
+PROFILING_MODULE = Path(__file__).resolve().parent.parent / "hass_datasette_etl" / "profiling.py"
+
+
+def load_profiling():
+    spec = importlib.util.spec_from_file_location("hass_profiling", PROFILING_MODULE)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
 
 def get_clickhouse_client(
     host: Optional[str] = None,
@@ -200,11 +213,14 @@ def migrate(
     clickhouse_user: Optional[str] = typer.Option(None, help="ClickHouse username (defaults to CLICKHOUSE_USER env var or 'default')"),
     clickhouse_password: Optional[str] = typer.Option(None, help="ClickHouse password (defaults to CLICKHOUSE_PASSWORD env var or '')"),
     clickhouse_db: Optional[str] = typer.Option(None, help="ClickHouse database (defaults to CLICKHOUSE_DB env var or 'default')"),
-    dotenv_path: Optional[str] = typer.Option(None, help="Path to the .env file (defaults to .env in the current directory)")
+    dotenv_path: Optional[str] = typer.Option(None, help="Path to the .env file (defaults to .env in the current directory)"),
+    profile: Optional[Path] = typer.Option(None, help="Save a speedscope sampling profile of the migration to PATH")
 ) -> None:
     """
     Migrate data from SQLite to ClickHouse.
     """
+    profiler = load_profiling().SamplingProfiler().start() if profile else None
+
     # Validate SQLite file exists
     if not os.path.exists(sqlite_file):
         typer.echo(f"Error: SQLite file {sqlite_file} does not exist")
@@ -282,6 +298,11 @@ def migrate(
         sqlite_conn.close()
         clickhouse_client.close()
 
+        if profiler:
+            profiler.stop()
+            profiler.write_speedscope(profile, name=f"sqlite_to_clickhouse {sqlite_file}")
+            typer.echo(f"Saved profile of {profiler.num_samples} samples to {profile}")
+
 
 if __name__ == "__main__":
     app()